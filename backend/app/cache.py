@@ -0,0 +1,260 @@
+# persistent docstring cache (SQLite, shared between uvicorn workers)
+import ast
+import hashlib
+import os
+import re
+import sqlite3
+import textwrap
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+CACHE_PATH = os.getenv("DOCSTRING_CACHE_PATH", ".docgen_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("DOCSTRING_CACHE_MAX_ENTRIES", "50000"))
+CACHE_MAX_BYTES = int(os.getenv("DOCSTRING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("DOCSTRING_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+# -------------------------------
+# Key normalization
+# -------------------------------
+_STRING_LITERAL = r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`)"""
+
+# String literals are captured (and kept); comments are dropped
+_C_LIKE_TOKENS = re.compile(_STRING_LITERAL + r"|//[^\n]*|/\*[\s\S]*?\*/")
+_PYTHON_TOKENS = re.compile(_STRING_LITERAL + r"|#[^\n]*")
+
+
+def normalize_code(language: str, code: str) -> str:
+    """
+    Reduce function source to a form that ignores formatting.
+
+    Python is normalized through ast.dump (comments, whitespace and
+    indentation disappear). Other languages drop comments and collapse
+    whitespace outside of string literals.
+    """
+    if language.lower() == "python":
+        try:
+            return ast.dump(ast.parse(textwrap.dedent(code)))
+        except SyntaxError:
+            pass
+
+    def keep_strings(match):
+        return match.group(1) or " "
+
+    tokens = _PYTHON_TOKENS if language.lower() == "python" else _C_LIKE_TOKENS
+    code = tokens.sub(keep_strings, code)
+    return re.sub(r"\s+", " ", code).strip()
+
+
+def cache_key(
+    language: str, code: str, function_format: str, model: str, prompt_version: str, context: str = ""
+) -> str:
+    """
+    `context` is anything else the prompt depends on (callee summaries);
+    empty context keeps the key of a context-free prompt.
+    """
+    h = hashlib.sha256()
+    parts = [language.lower(), function_format, model, prompt_version, normalize_code(language, code)]
+    if context:
+        parts.append(context)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# -------------------------------
+# SQLite store
+# -------------------------------
+# Hits, misses and access times are written in batches of this many lookups
+CACHE_STATS_FLUSH_EVERY = int(os.getenv("DOCSTRING_CACHE_STATS_FLUSH_EVERY", "64"))
+CACHE_STATS_FLUSH_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docstrings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_docstrings_accessed ON docstrings (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_docstrings_created ON docstrings (created_at);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+
+-- Running entry count and size, kept in the same transaction as every write
+CREATE TRIGGER IF NOT EXISTS docstrings_insert AFTER INSERT ON docstrings BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'entries';
+    UPDATE stats SET value = value + new.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS docstrings_delete AFTER DELETE ON docstrings BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'entries';
+    UPDATE stats SET value = value - old.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS docstrings_resize AFTER UPDATE OF size ON docstrings BEGIN
+    UPDATE stats SET value = value + new.size - old.size WHERE name = 'bytes';
+END;
+"""
+
+
+class DocstringCache:
+    """
+    Content-addressed docstring store with LRU + TTL eviction.
+
+    All workers open the same SQLite file (WAL mode), so entries and the
+    hit/miss counters are shared across uvicorn processes. The entry
+    count and total size are running totals in the stats table, so a put
+    only evicts when it pushed the cache over a limit. Lookups are
+    counted in memory and written in batches.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # Not yet written: hit/miss counts and key -> last access time
+        self._counts = {"hits": 0, "misses": 0}
+        self._accessed: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not be shared across fork()
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # One transaction, so no write lands between the triggers and the totals
+            conn.executescript("BEGIN IMMEDIATE;" + _SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+            if conn.execute("SELECT 1 FROM stats WHERE name = 'entries'").fetchone() is None:
+                # Cache created before the running totals: count it once
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM docstrings").fetchone()
+                conn.execute("INSERT INTO stats VALUES ('entries', ?), ('bytes', ?)", (entries, size))
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._counts = {"hits": 0, "misses": 0}
+            self._accessed = {}
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM docstrings WHERE key = ?", (key,)).fetchone()
+
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                with conn:
+                    conn.execute("DELETE FROM docstrings WHERE key = ?", (key,))
+                row = None
+
+            if row:
+                self._accessed[key] = now
+            self._counts["hits" if row else "misses"] += 1
+            if (
+                sum(self._counts.values()) >= CACHE_STATS_FLUSH_EVERY
+                or time.monotonic() - self._flushed_at >= CACHE_STATS_FLUSH_SECONDS
+            ):
+                with conn:
+                    self._flush(conn)
+        return row[0] if row else None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                # Pending access times first, so LRU eviction sees them
+                self._flush(conn)
+                conn.execute(
+                    "INSERT INTO docstrings VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                    "value = excluded.value, size = excluded.size, "
+                    "created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                    (key, value, size, now, now),
+                )
+                self._evict(conn, now)
+
+    def flush(self) -> None:
+        """Write pending hit/miss counts and access times."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._flush(conn)
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        if self._accessed:
+            conn.executemany(
+                "UPDATE docstrings SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed = {}
+        for name, count in self._counts.items():
+            if count:
+                conn.execute("UPDATE stats SET value = value + ? WHERE name = ?", (count, name))
+        self._counts = {"hits": 0, "misses": 0}
+        self._flushed_at = time.monotonic()
+
+    def _totals(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        totals = dict(conn.execute("SELECT name, value FROM stats WHERE name IN ('entries', 'bytes')").fetchall())
+        return totals.get("entries", 0), totals.get("bytes", 0)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.ttl_seconds:
+            # Indexed range: finds nothing quickly when nothing expired
+            conn.execute("DELETE FROM docstrings WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        count, total = self._totals(conn)
+
+        # Least recently used entries go first
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM docstrings WHERE key IN "
+                "(SELECT key FROM docstrings ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            count, total = self._totals(conn)
+
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            rows = conn.execute("SELECT key, size FROM docstrings ORDER BY accessed_at")
+            doomed = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((key,))
+                excess -= size
+            conn.executemany("DELETE FROM docstrings WHERE key = ?", doomed)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._flush(conn)
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "entries": counters.get("entries", 0),
+            "bytes": counters.get("bytes", 0),
+        }
+
+
+# Empty path or "off" disables caching
+docstring_cache: Optional[DocstringCache] = (
+    DocstringCache(CACHE_PATH) if CACHE_PATH and CACHE_PATH.lower() != "off" else None
+)
@@ -0,0 +1,222 @@
+# intra-file call graph (Python) and callee-first ordering of functions
+import ast
+from typing import Dict, List, Optional, Sequence
+
+
+# -------------------------------
+# Python call graph
+# -------------------------------
+_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def link_python_calls(tree: ast.AST, infos: Sequence) -> None:
+    """
+    Set `info.calls` to the start lines of the functions/classes of the same
+    file that `info` depends on.
+
+    A class depends on its methods and nested classes. A function depends
+    on what it calls by plain name (resolved through the enclosing function
+    scopes, then module level) and on methods called through `self`/`cls`
+    or a class of this file. Anything that cannot be resolved statically
+    (imports, attributes of other objects, dynamic calls) is ignored.
+    """
+    by_node = {id(info.node): info for info in infos if info.node is not None}
+    module_defs = _direct_defs(tree)
+
+    def visit(node: ast.AST, scopes: List[Dict[str, ast.AST]], owner: Optional[ast.ClassDef]) -> None:
+        for child in _child_defs(node):
+            info = by_node.get(id(child))
+            if isinstance(child, ast.ClassDef):
+                members = _direct_defs(child)
+                if info is not None:
+                    info.calls = sorted({member.lineno for member in members.values()})
+                # Class bodies are not a scope for their methods
+                visit(child, scopes, child)
+            else:
+                local = _direct_defs(child)
+                if info is not None:
+                    targets = _called_defs(child, [local] + scopes, owner, module_defs)
+                    info.calls = sorted({target.lineno for target in targets if target is not child})
+                visit(child, [local] + scopes, None)
+
+    visit(tree, [], None)
+
+
+def _child_defs(node: ast.AST) -> List[ast.AST]:
+    """Function/class definitions nested in `node`, not looking inside those."""
+    found = []
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        if isinstance(child, _DEFS):
+            found.append(child)
+        else:
+            stack.extend(ast.iter_child_nodes(child))
+    return found
+
+
+def _direct_defs(node: ast.AST) -> Dict[str, ast.AST]:
+    # The last definition of a name wins, as at runtime
+    defs: Dict[str, ast.AST] = {}
+    for child in sorted(_child_defs(node), key=lambda n: n.lineno):
+        defs[child.name] = child
+    return defs
+
+
+def _called_defs(
+    func: ast.AST,
+    scopes: List[Dict[str, ast.AST]],
+    owner: Optional[ast.ClassDef],
+    module_defs: Dict[str, ast.AST],
+) -> List[ast.AST]:
+    targets = []
+    stack = list(ast.iter_child_nodes(func))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _DEFS):
+            # Nested definitions are documented (and linked) on their own
+            continue
+        stack.extend(ast.iter_child_nodes(node))
+        if not isinstance(node, ast.Call):
+            continue
+
+        callee = node.func
+        if isinstance(callee, ast.Name):
+            target = _lookup(callee.id, scopes, module_defs)
+        elif isinstance(callee, ast.Attribute) and isinstance(callee.value, ast.Name):
+            receiver = callee.value.id
+            if receiver in ("self", "cls") and owner is not None:
+                cls = owner
+            else:
+                cls = _lookup(receiver, scopes, module_defs)
+            target = _method(cls, callee.attr, module_defs) if isinstance(cls, ast.ClassDef) else None
+        else:
+            target = None
+
+        if target is not None:
+            targets.append(target)
+    return targets
+
+
+def _lookup(name: str, scopes: List[Dict[str, ast.AST]], module_defs: Dict[str, ast.AST]) -> Optional[ast.AST]:
+    for scope in scopes:
+        if name in scope:
+            return scope[name]
+    return module_defs.get(name)
+
+
+def _method(cls: ast.ClassDef, name: str, module_defs: Dict[str, ast.AST]) -> Optional[ast.AST]:
+    """`name` on `cls` or, failing that, on its base classes defined in this file."""
+    seen = set()
+    pending = [cls]
+    while pending:
+        current = pending.pop(0)
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        target = _direct_defs(current).get(name)
+        if target is not None:
+            return target
+        for base in current.bases:
+            parent = module_defs.get(base.id) if isinstance(base, ast.Name) else None
+            if isinstance(parent, ast.ClassDef):
+                pending.append(parent)
+    return None
+
+
+# -------------------------------
+# Ordering
+# -------------------------------
+def callee_graph(infos: Sequence, leader_of: Optional[Dict[int, int]] = None) -> List[List[int]]:
+    """
+    Callee indices (into `infos`) per function, without cycles.
+
+    Callees that are not in `infos` are dropped. `leader_of` maps duplicate
+    functions to the index that is actually generated: duplicates get no
+    edges of their own, and cycles are detected between generated
+    functions. Edges inside a cycle (mutual recursion) are removed so
+    every function can be scheduled.
+    """
+    leader_of = leader_of or {}
+    index_by_line = {info.start: idx for idx, info in enumerate(infos) if info.start}
+
+    def leader(idx: int) -> int:
+        return leader_of.get(idx, idx)
+
+    graph: List[List[int]] = []
+    for idx, info in enumerate(infos):
+        callees = set()
+        if idx not in leader_of:
+            for line in getattr(info, "calls", None) or ():
+                callee = index_by_line.get(line)
+                if callee is not None and leader(callee) != idx:
+                    callees.add(callee)
+        graph.append(sorted(callees))
+
+    component = _components([sorted({leader(callee) for callee in callees}) for callees in graph])
+    return [
+        [callee for callee in callees if component[leader(callee)] != component[idx]]
+        for idx, callees in enumerate(graph)
+    ]
+
+
+def levels(graph: List[List[int]]) -> List[int]:
+    """Level per node of an acyclic graph: 0 without callees, else 1 + the deepest callee."""
+    level: List[Optional[int]] = [None] * len(graph)
+    for root in range(len(graph)):
+        stack = [root]
+        while stack:
+            node = stack[-1]
+            if level[node] is not None:
+                stack.pop()
+                continue
+            pending = [callee for callee in graph[node] if level[callee] is None]
+            if pending:
+                stack.extend(pending)
+                continue
+            level[node] = 1 + max((level[callee] for callee in graph[node]), default=-1)
+            stack.pop()
+    return level
+
+
+def _components(graph: List[List[int]]) -> List[int]:
+    """Strongly connected component id per node (iterative Tarjan)."""
+    index: List[Optional[int]] = [None] * len(graph)
+    low = [0] * len(graph)
+    component = [-1] * len(graph)
+    on_stack = [False] * len(graph)
+    stack: List[int] = []
+    counter = 0
+    count = 0
+
+    for root in range(len(graph)):
+        if index[root] is not None:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, pos = work.pop()
+            if pos == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            if pos < len(graph[node]):
+                work.append((node, pos + 1))
+                callee = graph[node][pos]
+                if index[callee] is None:
+                    work.append((callee, 0))
+                elif on_stack[callee]:
+                    low[node] = min(low[node], index[callee])
+                continue
+            for callee in graph[node]:
+                if on_stack[callee] and component[callee] == -1:
+                    low[node] = min(low[node], low[callee])
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = count
+                    if member == node:
+                        break
+                count += 1
+    return component
@@ -0,0 +1,256 @@
+# command-line interface: document a directory tree without running the API
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.incremental import missing_docstrings
+from app.languages import DEFAULT_FORMAT_BY_LANGUAGE, FORMATS_BY_LANGUAGE, detect_language
+from app.metrics import LLM_TOKENS, TEMPLATE_DOCSTRINGS
+from app.workers import (
+    PARSE_WORKERS,
+    ParseTimeout,
+    diff_in_pool,
+    parse_in_pool,
+    patch_in_pool,
+    shutdown_executor,
+    start_executor
+)
+
+logger = logging.getLogger("doc_generator")
+
+# Directories never worth walking into
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", ".tox", "build", "dist"}
+
+_LINE_BREAK = re.compile(r"\r\n|\n|\r")
+
+FORMATS = sorted({fmt for formats in FORMATS_BY_LANGUAGE.values() for fmt in formats})
+
+# Same default as the API (app.pipeline.LLM_CONCURRENCY)
+LLM_CONCURRENCY = max(1, int(os.getenv("LLM_CONCURRENCY", "8")))
+
+
+# -------------------------------
+# File discovery
+# -------------------------------
+def iter_source_files(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (path, language) for every supported file under `paths`, in a stable order."""
+    for root in paths:
+        if os.path.isfile(root):
+            language = detect_language(root)
+            if language:
+                yield root, language
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith("."))
+            for filename in sorted(filenames):
+                language = detect_language(filename)
+                if language:
+                    yield os.path.join(dirpath, filename), language
+
+
+def _read_source(path: str) -> str:
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def _display_path(path: str) -> str:
+    rel = os.path.relpath(path)
+    return path if rel.startswith("..") else rel
+
+
+# -------------------------------
+# Per-file processing
+# -------------------------------
+class Stats:
+    def __init__(self):
+        self.files = 0
+        self.changed_files = 0
+        self.failed_files = 0
+        self.functions = 0
+        self.documented = 0
+        self.missing = 0
+
+
+async def _check_file(path: str, language: str, stats: Stats) -> None:
+    """--check: report functions without a docstring; no model calls."""
+    infos, _, _ = await parse_in_pool(language, _read_source(path))
+    stats.functions += len(infos)
+    missing = missing_docstrings(infos)
+    if missing:
+        stats.changed_files += 1
+        stats.missing += len(missing)
+    for idx in missing:
+        print(f"{_display_path(path)}:{infos[idx].start or 1}: {infos[idx].name} has no docstring")
+
+
+async def _document_file(
+    path: str,
+    language: str,
+    args: argparse.Namespace,
+    llm_sem: asyncio.Semaphore,
+    stats: Stats,
+) -> Optional[str]:
+    """Document one file; returns its diff (None when writing in place or unchanged)."""
+    # Imported here so --check works without model credentials
+    from app.pipeline import collect_updates, iter_generated_docs
+
+    original = _read_source(path)
+    infos, fn_srcs, source = await parse_in_pool(language, original)
+    if source != original:
+        # Python that only parsed after normalization: its line numbers
+        # refer to a rewritten file, so edits cannot be placed in this one
+        raise SyntaxError("not valid Python as written")
+    stats.functions += len(infos)
+
+    if args.mode == "missing":
+        selected = missing_docstrings(infos)
+        infos = [infos[i] for i in selected]
+        fn_srcs = [fn_srcs[i] for i in selected]
+    if not infos:
+        return None
+
+    fmt = args.format if args.format in FORMATS_BY_LANGUAGE[language] else DEFAULT_FORMAT_BY_LANGUAGE[language]
+    async for idx, doctext in iter_generated_docs(
+        language, fmt, infos, fn_srcs, batch=args.batch, semaphore=llm_sem, fair_key=path
+    ):
+        infos[idx].generated_docstring = doctext
+
+    updates = collect_updates(infos)
+    if not updates:
+        return None
+    stats.documented += len(updates)
+    stats.changed_files += 1
+
+    if not args.write:
+        return await diff_in_pool(original, updates, language, _display_path(path))
+
+    # The same hunks the diff shows, applied to the file as it is
+    modified = apply_patches(original, await patch_in_pool(original, updates, language))
+    tmp = path + ".docgen.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        f.write(modified)
+    os.replace(tmp, path)
+    return None
+
+
+def apply_patches(original: str, patches: List[dict]) -> str:
+    """Apply line hunks (SourceDocument.patches) to `original`, keeping its line breaks."""
+    lines = original.splitlines(True)
+    first_break = _LINE_BREAK.search(original)
+    newline = first_break.group() if first_break else "\n"
+    for patch in reversed(patches):
+        start = patch["start_line"] - 1
+        if start >= len(lines) and lines and not lines[-1].endswith(("\n", "\r")):
+            lines[-1] += newline
+        lines[start:start + patch["delete_lines"]] = [line + newline for line in patch["text"].split("\n")]
+    return "".join(lines)
+
+
+async def run(args: argparse.Namespace) -> int:
+    files = list(iter_source_files(args.paths))
+    if not files:
+        print("No supported source files found", file=sys.stderr)
+        return 2
+
+    stats = Stats()
+    stats.files = len(files)
+    diffs: Dict[str, str] = {}
+
+    await start_executor(args.jobs)
+    llm_sem = asyncio.Semaphore(args.concurrency)
+    # Keep a few files parsed ahead of the model calls, like JobRunner does
+    file_sem = asyncio.Semaphore(args.jobs * 2)
+    tokens_before = LLM_TOKENS.value()
+    templated_before = TEMPLATE_DOCSTRINGS.value()
+    started = time.perf_counter()
+
+    async def one(path: str, language: str) -> None:
+        async with file_sem:
+            try:
+                if args.check:
+                    await _check_file(path, language, stats)
+                else:
+                    diff = await _document_file(path, language, args, llm_sem, stats)
+                    if diff:
+                        diffs[path] = diff
+            except (SyntaxError, UnicodeDecodeError, ParseTimeout, OSError) as e:
+                stats.failed_files += 1
+                print(f"{_display_path(path)}: skipped ({e.__class__.__name__}: {e})", file=sys.stderr)
+
+    try:
+        await asyncio.gather(*(one(path, language) for path, language in files))
+    finally:
+        shutdown_executor()
+
+    elapsed = time.perf_counter() - started
+    tokens = LLM_TOKENS.value() - tokens_before
+    templated = TEMPLATE_DOCSTRINGS.value() - templated_before
+
+    # Diffs in walk order so the output is stable between runs
+    patch = "".join(diffs[path] for path, _ in files if path in diffs)
+    if patch:
+        if args.output in (None, "-"):
+            sys.stdout.write(patch)
+        else:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(patch)
+
+    if args.check:
+        print(
+            f"{stats.missing} of {stats.functions} functions without docstring "
+            f"in {stats.changed_files} of {stats.files} files ({elapsed:.1f}s)",
+            file=sys.stderr,
+        )
+        return 1 if stats.missing else (2 if stats.failed_files else 0)
+
+    rate = elapsed or 1e-9
+    print(
+        f"Documented {stats.documented} functions in {stats.changed_files} of {stats.files} files "
+        f"in {elapsed:.1f}s ({stats.documented / rate:.1f} functions/s, "
+        f"{int(tokens)} tokens, {tokens / rate:.0f} tokens/s, {int(templated)} from templates without a model call)",
+        file=sys.stderr,
+    )
+    return 2 if stats.failed_files else 0
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="docgen",
+        description="Generate docstrings for every supported file under the given paths.",
+    )
+    parser.add_argument("paths", nargs="+", help="files or directories to document")
+    parser.add_argument("--format", choices=FORMATS, default="Google",
+                        help="docstring format; languages that do not support it use their default")
+    parser.add_argument("--mode", choices=("missing", "all"), default="missing",
+                        help="document only functions without a docstring (default) or all of them")
+    out = parser.add_mutually_exclusive_group()
+    out.add_argument("--write", action="store_true", help="modify files in place")
+    out.add_argument("--check", action="store_true",
+                     help="only list functions without a docstring; exit 1 if there are any")
+    out.add_argument("--output", metavar="FILE", help="write the unified diff to FILE instead of stdout")
+    parser.add_argument("--jobs", type=int, default=PARSE_WORKERS, help="parser processes")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY, help="concurrent model calls")
+    parser.add_argument("--batch", action="store_true", help="document several functions per model call")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.jobs = max(1, args.jobs)
+    args.concurrency = max(1, args.concurrency)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
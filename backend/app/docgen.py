@@ -3,6 +3,7 @@ import ast
 import re
 import textwrap
 from typing import List, Tuple
+from app.source import SourceDocument
 from app.utils import FunctionInfo, extract_c_functions, extract_cpp_functions, extract_java_functions, extract_js_functions, extract_python_functions, extract_ts_functions
 
 
@@ -28,30 +29,13 @@ def extract_functions_and_classes(language:str, source: str) -> List[FunctionInf
 
 
 def get_source_for_fn(language: str, source: str, info: FunctionInfo) -> str:
-    language = language.lower()
-    lines = source.splitlines()
-
-    if language == "python":
-        return ast.get_source_segment(source, info.node) or ""
-
-    if language in ("javascript", "typescript"):
-        if info.start and info.end:
-            return "\n".join(lines[info.start - 1 : info.end])
-        return ""
-
-    if language == "java":
-        if info.start:
-            return lines[info.start - 1]
-        return ""
-
-    if language in ("c++", "cpp", "c"):
-        if info.start and info.end:
-            return "\n".join(lines[info.start - 1 : info.end])
-        elif info.start:
-            return lines[info.start - 1]
-        return ""
+    """
+    One-off slice of a function's source.
 
-    return ""
+    Prefer SourceDocument.segment when slicing several functions of the
+    same file; this helper builds a fresh line index on every call.
+    """
+    return SourceDocument(language, source, parse=False).segment(info)
 
 
 def insert_docstrings_into_source(
@@ -68,63 +52,7 @@ def insert_docstrings_into_source(
     JavaScript / TypeScript / Java / C / C++:
     - Inserts block comment above function/method.
     """
-
-    lines = original_source.splitlines()
-    language = language.lower()
-
-    block_comment_languages = {
-        "javascript",
-        "typescript",
-        "java",
-        "c",
-        "c++",
-        "cpp",
-    }
-
-    for start, end, doctext in sorted(updates, key=lambda x: x[0], reverse=True):
-        if not doctext:
-            continue
-
-        def_line = lines[start - 1]
-        base_indent = def_line[: len(def_line) - len(def_line.lstrip())]
-
-        # JS / TS / Java / C / C++
-        if language in block_comment_languages:
-            doc_lines = [
-                base_indent + line.strip() if line.strip() else ""
-                for line in doctext.strip().splitlines()
-            ]
-
-            # Insert above function line
-            lines[start - 1 : start - 1] = doc_lines
-
-        # Python
-        else:
-            indent = base_indent + "    "
-            clean_doc = doctext.strip().replace('"""', '\\"""')
-
-            if clean_doc.startswith('"""') and clean_doc.endswith('"""'):
-                doc_lines = [
-                    indent + line.strip() if line.strip() else ""
-                    for line in clean_doc.splitlines()
-                ]
-            else:
-                doc_lines = [f'{indent}"""{clean_doc}"""']
-
-            next_idx = start
-
-            if next_idx < len(lines) and lines[next_idx].lstrip().startswith('"""'):
-                j = next_idx
-                while j < len(lines):
-                    if lines[j].rstrip().endswith('"""') and j != next_idx:
-                        break
-                    j += 1
-
-                lines[next_idx : j + 1] = doc_lines
-            else:
-                lines[start:start] = doc_lines
-
-    return "\n".join(lines)
+    return SourceDocument(language, original_source, parse=False).apply_docstrings(updates)
 
 
 def normalize_python_source(source: str) -> str:
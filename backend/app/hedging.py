@@ -0,0 +1,124 @@
+# tail-latency controls for model calls: hedged requests and a model cascade
+import asyncio
+import os
+import re
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+
+from app.templates import parameter_names
+
+T = TypeVar("T")
+
+# Duplicate a call still running after this percentile of recent call
+# latencies ("0" disables hedging)
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0"))
+
+# Never hedge earlier than this (seconds), and not before this many calls were timed
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Where hedges go, as "backend[:model]"; empty: the primary backend again
+HEDGE_MODEL = os.getenv("HEDGE_MODEL", "")
+
+# Models tried after the primary one when an output fails the validity
+# check, cheapest first: "groq:llama-3.3-70b-versatile,openai:default"
+CASCADE_MODELS = os.getenv("CASCADE_MODELS", "")
+
+
+# -------------------------------
+# Hedging
+# -------------------------------
+class LatencyTracker:
+    """Sliding window of call latencies."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def hedge_delay(
+        self,
+        pct: float = HEDGE_PERCENTILE,
+        min_delay: float = HEDGE_MIN_DELAY,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+    ) -> Optional[float]:
+        """Seconds after which to hedge, or None (disabled, or too few samples yet)."""
+        if pct <= 0 or len(self.samples) < min_samples:
+            return None
+        return max(min_delay, self.percentile(pct))
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[T]],
+    hedge: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> Tuple[T, str]:
+    """
+    (result, winner) of `primary()`, or of `hedge()` when started because
+    `primary()` was still running after `delay` seconds and it finished
+    first. The loser is cancelled; a failed attempt waits for the other.
+    `winner` is "primary" or "hedge".
+    """
+    first = asyncio.ensure_future(primary())
+    if delay is None:
+        return await first, "primary"
+
+    second = None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result(), "primary"
+
+        if on_hedge is not None:
+            on_hedge()
+        second = asyncio.ensure_future(hedge())
+        names = {first: "primary", second: "hedge"}
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), names[task]
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in (first, second):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+# -------------------------------
+# Cascade
+# -------------------------------
+def cascade_models(spec: str = CASCADE_MODELS) -> List[Tuple[str, Optional[str]]]:
+    """(backend, model or None) per comma-separated `backend[:model]` entry."""
+    models = []
+    for entry in spec.split(","):
+        name, _, model = entry.strip().partition(":")
+        if name:
+            models.append((name.strip().lower(), model.strip() or None))
+    return models
+
+
+def docstring_problem(language: str, code: str, docstring: str) -> Optional[str]:
+    """
+    Cheap validity check of a generated docstring: the reason it looks
+    wrong ("empty", "markdown", "parameters"), or None when it looks fine.
+    """
+    if not docstring.strip():
+        return "empty"
+    if "```" in docstring:
+        return "markdown"
+    for name in parameter_names(language, code):
+        if not re.search(rf"(?<![\w$]){re.escape(name)}(?![\w$])", docstring):
+            return "parameters"
+    return None
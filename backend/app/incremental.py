@@ -0,0 +1,104 @@
+# incremental mode: pick only functions that need (re)documentation
+import ast
+import hashlib
+import re
+import textwrap
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from app.cache import normalize_code
+from app.source import SourceDocument
+from app.utils import FunctionInfo
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+
+def missing_docstrings(infos: List[FunctionInfo]) -> List[int]:
+    """Indices of functions without an existing docstring."""
+    return [idx for idx, info in enumerate(infos) if not info.existing_docstring]
+
+
+# -------------------------------
+# Unified diff
+# -------------------------------
+def changed_lines_from_diff(diff: str) -> Set[int]:
+    """
+    New-file line numbers touched by a unified diff.
+
+    Added lines count as changed; a deletion marks the line that now sits
+    where the removed text used to be.
+    """
+    changed: Set[int] = set()
+    new_line = None
+
+    for line in diff.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            new_line = int(header.group(1))
+            continue
+        if new_line is None or line.startswith(("+++", "---", "\\")):
+            continue
+
+        if line.startswith("+"):
+            changed.add(new_line)
+            new_line += 1
+        elif line.startswith("-"):
+            changed.add(new_line)
+        else:
+            new_line += 1
+
+    return changed
+
+
+def changed_by_diff(infos: List[FunctionInfo], diff: str) -> List[int]:
+    """Indices of functions whose line range overlaps a diff hunk."""
+    changed = changed_lines_from_diff(diff)
+    selected = []
+    for idx, info in enumerate(infos):
+        if not info.start:
+            continue
+        end = info.end or info.start
+        if any(line in changed for line in range(info.start, end + 1)):
+            selected.append(idx)
+    return selected
+
+
+# -------------------------------
+# Previous version of the file
+# -------------------------------
+def body_fingerprint(language: str, code: str) -> str:
+    """Hash of the function body that ignores formatting, comments and docstrings."""
+    normalized = None
+
+    if language.lower() == "python":
+        try:
+            tree = ast.parse(textwrap.dedent(code))
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and ast.get_docstring(node) is not None:
+                    node.body = node.body[1:]
+            normalized = ast.dump(tree)
+        except SyntaxError:
+            pass
+
+    if normalized is None:
+        normalized = normalize_code(language, code)
+
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def changed_since(
+    language: str,
+    infos: List[FunctionInfo],
+    fn_srcs: List[str],
+    previous_source: str,
+) -> List[int]:
+    """Indices of functions that are new or whose body differs from `previous_source`."""
+    doc = SourceDocument(language, previous_source)
+    previous: Dict[str, Set[str]] = defaultdict(set)
+    for info in doc.functions:
+        previous[info.name].add(body_fingerprint(language, doc.segment(info)))
+
+    return [
+        idx for idx, (info, src) in enumerate(zip(infos, fn_srcs))
+        if body_fingerprint(language, src) not in previous.get(info.name, ())
+    ]
@@ -0,0 +1,397 @@
+# multi-file documentation jobs (archive upload → background processing → result archive)
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import tarfile
+import time
+import uuid
+import zipfile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from app.languages import DEFAULT_FORMAT_BY_LANGUAGE, detect_language
+from app.pipeline import document_source
+from app.utils import UPLOAD_CHUNK_BYTES, UploadRejected, sniff_encoding
+from app.workers import PARSE_WORKERS
+
+logger = logging.getLogger("doc_generator")
+
+JOBS_DIR = os.getenv("JOBS_DIR", ".docgen_jobs")
+JOB_LLM_CONCURRENCY = max(1, int(os.getenv("JOB_LLM_CONCURRENCY", "16")))
+JOB_MAX_FILES = int(os.getenv("JOB_MAX_FILES", "5000"))
+JOB_MAX_EXTRACTED_BYTES = int(os.getenv("JOB_MAX_EXTRACTED_BYTES", str(512 * 1024 * 1024)))
+
+# Files parsed/rebuilt at the same time within one job
+JOB_FILE_CONCURRENCY = PARSE_WORKERS * 2
+
+
+class JobError(ValueError):
+    """Invalid job input (bad archive, no supported files, limits exceeded)."""
+
+
+# -------------------------------
+# Job directory layout
+# -------------------------------
+#   <JOBS_DIR>/<id>/job.json        static manifest + overall status
+#   <JOBS_DIR>/<id>/input/...       extracted sources
+#   <JOBS_DIR>/<id>/output/...      documented sources
+#   <JOBS_DIR>/<id>/progress.jsonl  one line per processed file (append-only)
+#   <JOBS_DIR>/<id>/result.zip      built once the job completes
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _safe_relpath(name: str) -> Optional[str]:
+    """Normalize an archive member name; None for absolute or escaping paths."""
+    name = name.replace("\\", "/").lstrip("/")
+    norm = os.path.normpath(name)
+    if not name or norm.startswith("..") or os.path.isabs(norm) or norm == ".":
+        return None
+    return norm
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _read_progress(job_id: str) -> Dict[str, dict]:
+    path = os.path.join(job_dir(job_id), "progress.jsonl")
+    done: Dict[str, dict] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line after a crash: that file is simply redone
+                continue
+            done[entry["path"]] = entry
+    return done
+
+
+# -------------------------------
+# Job creation
+# -------------------------------
+def _iter_archive(archive: BinaryIO):
+    """Yield (member name, file object) for regular files in a zip or tar archive."""
+    if zipfile.is_zipfile(archive):
+        archive.seek(0)
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.infolist():
+                if not member.is_dir():
+                    with zf.open(member) as f:
+                        yield member.filename, f
+        return
+
+    archive.seek(0)
+    try:
+        tf = tarfile.open(fileobj=archive)
+    except tarfile.TarError:
+        raise JobError("Unsupported archive: expected a zip or tar file")
+
+    with tf:
+        for member in tf:
+            # Skip links/devices: only plain files are extracted
+            if member.isfile():
+                f = tf.extractfile(member)
+                if f is not None:
+                    yield member.name, f
+
+
+def _copy_limited(src, dst_path: str, budget: int) -> int:
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    written = 0
+    with open(dst_path, "wb") as dst:
+        while True:
+            chunk = src.read(1024 * 1024)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > budget:
+                raise JobError("Archive exceeds the extracted size limit")
+            dst.write(chunk)
+    return written
+
+
+def create_job(
+    archive: Optional[BinaryIO] = None,
+    files: Optional[List[Tuple[str, BinaryIO]]] = None,
+    formats: Optional[Dict[str, str]] = None,
+) -> dict:
+    """
+    Create a job from a zip/tar archive and/or (name, file object) pairs.
+
+    Only files with a supported extension are kept. `formats` maps language
+    to docstring format; missing languages use DEFAULT_FORMAT_BY_LANGUAGE.
+    """
+    job_id = uuid.uuid4().hex
+    root = job_dir(job_id)
+    input_dir = os.path.join(root, "input")
+    os.makedirs(input_dir)
+
+    formats = {**DEFAULT_FORMAT_BY_LANGUAGE, **(formats or {})}
+    manifest_files: Dict[str, dict] = {}
+    budget = JOB_MAX_EXTRACTED_BYTES
+
+    def add(name: str, fileobj) -> None:
+        nonlocal budget
+        rel = _safe_relpath(name)
+        language = detect_language(name)
+        if rel is None or language is None or rel in manifest_files:
+            return
+        if len(manifest_files) >= JOB_MAX_FILES:
+            raise JobError(f"Too many source files (limit {JOB_MAX_FILES})")
+        try:
+            budget -= _copy_limited(fileobj, os.path.join(input_dir, rel), budget)
+        except OSError as e:
+            # e.g. "a" and "a/b.py" in the same archive
+            raise JobError(f"Cannot extract {rel}: {e.strerror or e}") from e
+        manifest_files[rel] = {"language": language, "format": formats[language]}
+
+    try:
+        if archive is not None:
+            for name, fileobj in _iter_archive(archive):
+                add(name, fileobj)
+        for name, fileobj in files or []:
+            add(name, fileobj)
+
+        if not manifest_files:
+            raise JobError("No supported source files found")
+    except (JobError, zipfile.BadZipFile, tarfile.TarError):
+        shutil.rmtree(root, ignore_errors=True)
+        raise
+
+    manifest = {
+        "id": job_id,
+        "status": "queued",
+        "created_at": time.time(),
+        "files": manifest_files,
+    }
+    _write_json(os.path.join(root, "job.json"), manifest)
+    logger.info(f"Job {job_id} created with {len(manifest_files)} files")
+    return manifest
+
+
+# -------------------------------
+# Job status
+# -------------------------------
+def get_job_status(job_id: str) -> Optional[dict]:
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    manifest_path = os.path.join(job_dir(job_id), "job.json")
+    if not os.path.exists(manifest_path):
+        return None
+
+    manifest = _read_json(manifest_path)
+    progress = _read_progress(job_id)
+
+    return {
+        "id": job_id,
+        "status": manifest["status"],
+        "created_at": manifest["created_at"],
+        "total_files": len(manifest["files"]),
+        "processed_files": len(progress),
+        "functions_found": sum(p.get("functions", 0) for p in progress.values()),
+        "functions_documented": sum(p.get("documented", 0) for p in progress.values()),
+        "failed_files": [
+            {"path": path, "error": p["error"]}
+            for path, p in progress.items()
+            if p.get("error")
+        ],
+    }
+
+
+def result_path(job_id: str) -> Optional[str]:
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    path = os.path.join(job_dir(job_id), "result.zip")
+    return path if os.path.exists(path) else None
+
+
+# -------------------------------
+# Job execution
+# -------------------------------
+class JobRunner:
+    """
+    Runs jobs in this process.
+
+    All files of all jobs share one LLM semaphore, so a large job cannot
+    open more than JOB_LLM_CONCURRENCY model calls. A per-job flock keeps
+    several uvicorn workers from running (or resuming) the same job.
+    """
+
+    def __init__(self, llm_concurrency: int = JOB_LLM_CONCURRENCY):
+        self.llm_concurrency = llm_concurrency
+        self._llm_sem: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, job_id: str) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume_all(self) -> None:
+        """Restart unfinished jobs (e.g. after a worker restart)."""
+        for job_id in await asyncio.to_thread(self._unfinished_jobs):
+            logger.info(f"Resuming job {job_id}")
+            self.start(job_id)
+
+    @staticmethod
+    def _unfinished_jobs() -> List[str]:
+        if not os.path.isdir(JOBS_DIR):
+            return []
+        unfinished = []
+        for job_id in os.listdir(JOBS_DIR):
+            if not _JOB_ID.fullmatch(job_id):
+                continue
+            manifest_path = os.path.join(job_dir(job_id), "job.json")
+            if not os.path.exists(manifest_path):
+                continue
+            if _read_json(manifest_path)["status"] in ("queued", "running"):
+                unfinished.append(job_id)
+        return unfinished
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run(self, job_id: str) -> None:
+        root = job_dir(job_id)
+        lock_file = open(os.path.join(root, "lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.info(f"Job {job_id} is already running in another worker")
+            return
+
+        try:
+            if self._llm_sem is None:
+                self._llm_sem = asyncio.Semaphore(self.llm_concurrency)
+
+            manifest_path = os.path.join(root, "job.json")
+            manifest = await asyncio.to_thread(_read_json, manifest_path)
+            manifest["status"] = "running"
+            await asyncio.to_thread(_write_json, manifest_path, manifest)
+
+            pending = await asyncio.to_thread(self._pending_files, job_id, manifest)
+            logger.info(f"Job {job_id}: {len(pending)} of {len(manifest['files'])} files left")
+
+            file_sem = asyncio.Semaphore(JOB_FILE_CONCURRENCY)
+
+            async def run_file(path: str, spec: dict):
+                async with file_sem:
+                    await self._process_file(job_id, path, spec)
+
+            await asyncio.gather(*(run_file(path, spec) for path, spec in pending))
+
+            await asyncio.to_thread(self._build_result, job_id)
+            manifest["status"] = "completed"
+            manifest["completed_at"] = time.time()
+            await asyncio.to_thread(_write_json, manifest_path, manifest)
+            logger.info(f"Job {job_id} completed")
+        except asyncio.CancelledError:
+            # Status stays "running" so the job resumes on the next start
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            manifest_path = os.path.join(root, "job.json")
+            manifest = await asyncio.to_thread(_read_json, manifest_path)
+            manifest["status"] = "failed"
+            manifest["error"] = str(e)
+            await asyncio.to_thread(_write_json, manifest_path, manifest)
+        finally:
+            lock_file.close()
+
+    async def _process_file(self, job_id: str, path: str, spec: dict) -> None:
+        root = job_dir(job_id)
+        entry = {"path": path, "functions": 0, "documented": 0}
+        try:
+            source = await asyncio.to_thread(self._read_input, root, path)
+        except UploadRejected as e:
+            # Binary content behind a source extension: left out of the result
+            logger.error(f"Job {job_id}: {path} skipped: {e}")
+            entry["error"] = str(e)
+            await asyncio.to_thread(self._write_output, root, path, None, entry)
+            return
+
+        try:
+            modified, infos = await document_source(
+                spec["language"], spec["format"], source, semaphore=self._llm_sem, fair_key=job_id
+            )
+            entry["functions"] = len(infos)
+            entry["documented"] = sum(1 for info in infos if info.generated_docstring)
+        except Exception as e:
+            # Unparseable files are passed through unchanged
+            logger.error(f"Job {job_id}: {path} failed: {e}")
+            modified = source
+            entry["error"] = str(e) or type(e).__name__
+
+        await asyncio.to_thread(self._write_output, root, path, modified, entry)
+
+    @staticmethod
+    def _pending_files(job_id: str, manifest: dict) -> List[Tuple[str, dict]]:
+        """Files not recorded in progress.jsonl, or recorded but with their output missing."""
+        root = job_dir(job_id)
+        done = _read_progress(job_id)
+        return [
+            (path, spec) for path, spec in manifest["files"].items()
+            if path not in done
+            # Skipped binaries are recorded with an error and no output
+            or ("error" not in done[path] and not os.path.exists(os.path.join(root, "output", path)))
+        ]
+
+    @staticmethod
+    def _read_input(root: str, path: str) -> str:
+        """Decode like an upload: BOM, else UTF-8, else Latin-1; binary raises UploadRejected."""
+        with open(os.path.join(root, "input", path), "rb") as f:
+            data = f.read()
+        return data.decode(sniff_encoding(data[:UPLOAD_CHUNK_BYTES]), errors="replace")
+
+    @staticmethod
+    def _write_output(root: str, path: str, modified: Optional[str], entry: dict) -> None:
+        """Write one documented file (unless None), then record it in progress.jsonl."""
+        if modified is not None:
+            out_path = os.path.join(root, "output", path)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(modified)
+            os.replace(out_path + ".tmp", out_path)
+
+        with open(os.path.join(root, "progress.jsonl"), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def _build_result(job_id: str) -> None:
+        root = job_dir(job_id)
+        output_dir = os.path.join(root, "output")
+        tmp = os.path.join(root, "result.zip.tmp")
+
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for dirpath, _, filenames in os.walk(output_dir):
+                for filename in filenames:
+                    full = os.path.join(dirpath, filename)
+                    zf.write(full, os.path.relpath(full, output_dir))
+        os.replace(tmp, os.path.join(root, "result.zip"))
+
+
+job_runner = JobRunner()
@@ -0,0 +1,45 @@
+# file extension → language mapping and per-language defaults
+import os
+from typing import Optional
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python",
+    ".js": "JavaScript",
+    ".jsx": "JavaScript",
+    ".mjs": "JavaScript",
+    ".cjs": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".java": "Java",
+    ".c": "C",
+    ".h": "C",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".cxx": "C++",
+    ".hpp": "C++",
+    ".hh": "C++",
+}
+
+DEFAULT_FORMAT_BY_LANGUAGE = {
+    "Python": "Google",
+    "JavaScript": "JSDoc",
+    "TypeScript": "TSDoc",
+    "Java": "JavaDoc",
+    "C": "Doxygen",
+    "C++": "Doxygen",
+}
+
+# Docstring formats each language supports (first one is the default)
+FORMATS_BY_LANGUAGE = {
+    "Python": ("Google", "NumPy", "PEP-257"),
+    "JavaScript": ("JSDoc",),
+    "TypeScript": ("TSDoc", "JSDoc"),
+    "Java": ("JavaDoc",),
+    "C": ("Doxygen",),
+    "C++": ("Doxygen",),
+}
+
+
+def detect_language(path: str) -> Optional[str]:
+    """Language for a file path, or None if the extension is not supported."""
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
@@ -0,0 +1,456 @@
+# pluggable model backends (Groq, OpenAI-compatible HTTP, local fake)
+import asyncio
+import json
+import math
+import os
+import random
+import re
+from typing import AsyncIterator, List, NamedTuple, Optional
+
+
+class Completion(NamedTuple):
+    text: str                                 # a piece of the text when streamed
+    prompt_tokens: Optional[int] = None       # None when the backend does not report usage
+    completion_tokens: Optional[int] = None
+
+
+class LLMError(Exception):
+    """
+    Failed model call, normalized across backends.
+
+    `status_code` and `retry_after` drive the retry/backoff logic in
+    app.scheduler (429 → throttle, 5xx → retry, others → fail).
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMConnectionError(LLMError):
+    """Network-level failure (connection refused, timeout); always retryable."""
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMBackend:
+    """
+    Interface every backend implements: one chat completion per call.
+
+    `stop` sequences end the completion on the server side (they are not
+    part of the text).
+    """
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    async def complete(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> Completion:
+        raise NotImplementedError
+
+    async def stream(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> AsyncIterator[Completion]:
+        """
+        The completion as it is generated: text pieces, plus a piece with
+        empty text carrying the usage when the backend reports it. Closing
+        the iterator early ends generation. Backends without streaming
+        yield the whole completion at once.
+        """
+        yield await self.complete(system, prompt, max_tokens, temperature, stop)
+
+    async def aclose(self) -> None:
+        pass
+
+
+# -------------------------------
+# Groq
+# -------------------------------
+class GroqBackend(LLMBackend):
+    name = "groq"
+
+    def __init__(self, model: str, api_key: Optional[str] = None):
+        super().__init__(model)
+        self.api_key = api_key
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from groq import AsyncGroq
+
+            # Retries are handled by the scheduler so 429s feed its concurrency control
+            self._client = AsyncGroq(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    async def _create(self, system: str, prompt: str, max_tokens: int, temperature: float, stop, stream: bool):
+        import groq
+
+        options = {"stop": stop} if stop else {}
+        try:
+            return await self._get_client().chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=stream,
+                **options,
+            )
+        except groq.APIConnectionError as e:
+            raise LLMConnectionError(str(e)) from e
+        except groq.APIStatusError as e:
+            raise LLMError(
+                str(e),
+                status_code=e.status_code,
+                retry_after=_parse_retry_after(e.response.headers.get("retry-after")),
+            ) from e
+
+    async def complete(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> Completion:
+        response = await self._create(system, prompt, max_tokens, temperature, stop, stream=False)
+        usage = response.usage
+        return Completion(
+            text=response.choices[0].message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+        )
+
+    async def stream(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> AsyncIterator[Completion]:
+        import groq
+
+        response = await self._create(system, prompt, max_tokens, temperature, stop, stream=True)
+        try:
+            async for chunk in response:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    yield Completion(text)
+                # Groq reports usage on the last chunk
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                if usage is not None:
+                    yield Completion("", usage.prompt_tokens, usage.completion_tokens)
+        except groq.APIConnectionError as e:
+            raise LLMConnectionError(str(e)) from e
+        finally:
+            await response.close()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# -------------------------------
+# OpenAI-compatible HTTP (llama.cpp server, vLLM, OpenAI, ...)
+# -------------------------------
+class OpenAICompatibleBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, model: str, base_url: str, api_key: Optional[str] = None, timeout: float = 60.0):
+        super().__init__(model)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=self.timeout)
+        return self._client
+
+    def _payload(self, system: str, prompt: str, max_tokens: int, temperature: float, stop) -> dict:
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if stop:
+            payload["stop"] = stop
+        return payload
+
+    @staticmethod
+    def _status_error(response) -> LLMError:
+        return LLMError(
+            f"HTTP {response.status_code}: {response.text[:200]}",
+            status_code=response.status_code,
+            retry_after=_parse_retry_after(response.headers.get("retry-after")),
+        )
+
+    async def complete(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> Completion:
+        import httpx
+
+        payload = self._payload(system, prompt, max_tokens, temperature, stop)
+        try:
+            response = await self._get_client().post("/chat/completions", json=payload)
+        except httpx.TransportError as e:
+            raise LLMConnectionError(f"{e.__class__.__name__}: {e}") from e
+
+        if response.status_code >= 400:
+            raise self._status_error(response)
+
+        try:
+            data = response.json()
+            text = data["choices"][0]["message"]["content"] or ""
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Malformed completion response: {e}", status_code=502) from e
+
+        usage = data.get("usage") or {}
+        return Completion(text, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+    async def stream(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> AsyncIterator[Completion]:
+        import httpx
+
+        payload = self._payload(system, prompt, max_tokens, temperature, stop)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        try:
+            # Leaving the block (also when the consumer stops early) closes the connection
+            async with self._get_client().stream("POST", "/chat/completions", json=payload) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise self._status_error(response)
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        choices = chunk.get("choices") or []
+                        text = (choices[0].get("delta") or {}).get("content") if choices else None
+                    except (ValueError, AttributeError, IndexError) as e:
+                        raise LLMError(f"Malformed stream chunk: {e}", status_code=502) from e
+                    if text:
+                        yield Completion(text)
+                    usage = chunk.get("usage")
+                    if usage:
+                        yield Completion("", usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        except httpx.TransportError as e:
+            raise LLMConnectionError(f"{e.__class__.__name__}: {e}") from e
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# -------------------------------
+# Fake (load testing / offline benchmarks)
+# -------------------------------
+_FUNCTION_NAME = re.compile(r"Function name:\s*\n\s*(\S+)")
+_BATCH_HEADER = re.compile(r"### Function id=(\d+) name=(\S+)")
+_STYLE = re.compile(r"Generate an? (\S+) docstring")
+
+
+def parse_latency(spec: str):
+    """
+    Build a latency sampler from a spec string:
+
+    - "fixed:0.2"            always 0.2 s
+    - "uniform:0.1,0.5"      uniform between 0.1 and 0.5 s
+    - "normal:0.3,0.05"      mean, stddev (clamped at 0)
+    - "lognormal:0.3,0.5"    median, sigma (long right tail, like real APIs)
+    - "exp:0.3"              exponential with mean 0.3 s
+    """
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(v) for v in params.split(",")] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    kind = kind.strip().lower()
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic stand-in: no network, configurable latency and failures.
+
+    The text depends only on the prompt (function names and style), so
+    results are reproducible; latency and injected errors come from a
+    seeded RNG. Batched prompts get a valid JSON array back.
+
+    `ramble_tokens` appends that much chatter after the docstring (as
+    verbose models do) to exercise stop sequences and early stream ends.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        model: str = "fake",
+        latency: str = "fixed:0",
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: Optional[int] = None,
+        ramble_tokens: int = 0,
+    ):
+        super().__init__(model)
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.ramble_tokens = ramble_tokens
+        self.calls = 0
+
+    def _start(self, system: str, prompt: str, max_tokens: int, stop: Optional[List[str]]):
+        """(failure roll, text, prompt tokens, completion tokens) of one call."""
+        self.calls += 1
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            raise LLMError("Fake rate limit", status_code=429, retry_after=self.retry_after)
+
+        text = self._text(prompt, self.ramble_tokens)[:max_tokens * 4]
+        for sequence in stop or ():
+            cut = text.find(sequence)
+            if cut >= 0:
+                text = text[:cut]
+        prompt_tokens = (len(system) + len(prompt)) // 4 + 1
+        return roll, text, prompt_tokens, len(text) // 4 + 1
+
+    async def complete(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> Completion:
+        roll, text, prompt_tokens, completion_tokens = self._start(system, prompt, max_tokens, stop)
+
+        delay = self.sample_latency(self.rng)
+        if self.tokens_per_second:
+            delay += completion_tokens / self.tokens_per_second
+        await asyncio.sleep(delay)
+
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LLMError("Fake server error", status_code=500)
+        return Completion(text, prompt_tokens, completion_tokens)
+
+    async def stream(
+        self, system: str, prompt: str, max_tokens: int, temperature: float = 0.0, stop: Optional[List[str]] = None
+    ) -> AsyncIterator[Completion]:
+        roll, text, prompt_tokens, completion_tokens = self._start(system, prompt, max_tokens, stop)
+
+        # Latency is the time to the first piece; then tokens_per_second applies
+        await asyncio.sleep(self.sample_latency(self.rng))
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LLMError("Fake server error", status_code=500)
+
+        piece = 16      # ~4 tokens
+        for pos in range(0, len(text), piece):
+            if self.tokens_per_second and pos:
+                await asyncio.sleep(piece / 4 / self.tokens_per_second)
+            yield Completion(text[pos:pos + piece])
+        yield Completion("", prompt_tokens, completion_tokens)
+
+    @staticmethod
+    def _text(prompt: str, ramble_tokens: int = 0) -> str:
+        style_match = _STYLE.search(prompt)
+        style = style_match.group(1) if style_match else "plain"
+        comment = style in ("JSDoc", "TSDoc", "JavaDoc", "Doxygen")
+
+        def doc(name: str) -> str:
+            summary = f"{name} ({style} docstring generated by the fake backend)."
+            if comment:
+                return f"/**\n * {summary}\n */"
+            return summary
+
+        ramble = ""
+        if ramble_tokens:
+            ramble = "\n\nExplanation:" + " this docstring describes the function" * (ramble_tokens // 6 + 1)
+
+        batch = _BATCH_HEADER.findall(prompt)
+        if batch:
+            return json.dumps([{"id": int(idx), "docstring": doc(name)} for idx, name in batch]) + ramble
+
+        name_match = _FUNCTION_NAME.search(prompt)
+        text = doc(name_match.group(1) if name_match else "function")
+        if ramble and not comment:
+            # Verbose models quote the docstring before explaining it
+            text = f'"""{text}\n"""'
+        return text + ramble
+
+
+# -------------------------------
+# Configuration
+# -------------------------------
+DEFAULT_MODELS = {
+    "groq": "llama-3.1-8b-instant",
+    "openai": "default",
+    "fake": "fake",
+}
+
+
+def create_backend(name: Optional[str] = None, model: Optional[str] = None) -> LLMBackend:
+    """
+    Backend selected by LLM_BACKEND (groq, openai, fake) and its env settings.
+
+    `name`/`model` pick another one (hedge and cascade models); LLM_MODEL
+    only applies to the LLM_BACKEND default.
+    """
+    if name is None:
+        name = os.getenv("LLM_BACKEND", "groq")
+        model = model or os.getenv("LLM_MODEL")
+    name = name.strip().lower()
+    if name not in DEFAULT_MODELS:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r} (expected one of {', '.join(DEFAULT_MODELS)})")
+    model = model or DEFAULT_MODELS[name]
+
+    if name == "groq":
+        return GroqBackend(model, api_key=os.getenv("GROQ_API_KEY"))
+
+    if name == "openai":
+        return OpenAICompatibleBackend(
+            model,
+            base_url=os.getenv("LLM_BASE_URL", "http://localhost:8080/v1"),
+            api_key=os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY"),
+            timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+        )
+
+    seed = os.getenv("FAKE_LLM_SEED")
+    return FakeBackend(
+        model,
+        latency=os.getenv("FAKE_LLM_LATENCY", "fixed:0"),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+        error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+        retry_after=float(os.getenv("FAKE_LLM_RETRY_AFTER", "1")),
+        seed=int(seed) if seed else None,
+        ramble_tokens=int(os.getenv("FAKE_LLM_RAMBLE_TOKENS", "0")),
+    )
@@ -0,0 +1,278 @@
+# lightweight in-process metrics (per-stage timings, counters, Prometheus exposition)
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from app.tracing import span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Every metric registers itself here; /metrics renders the whole list
+REGISTRY: List["_Metric"] = []
+
+# (language, format) of the model calls made in the current task; set by
+# the pipeline so the scheduler and model client can label their metrics
+call_labels: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar("call_labels", default=("", ""))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with optional labels (Prometheus-style buckets)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # Per series: one counter per bucket, then +Inf count, then sum
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) per label set."""
+        with self._lock:
+            return {key: (int(series[-2]), series[-1]) for key, series in self._series.items()}
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                le = _label_text(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {_format_value(count)}"
+            inf = _label_text(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {_format_value(values[-2])}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, key)} {_format_value(values[-1])}"
+            yield f"{self.name}_count{_label_text(self.labelnames, key)} {_format_value(values[-2])}"
+
+
+class Counter(_Metric):
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value of one series, or the sum of all series if no labels are given."""
+        with self._lock:
+            if not labels:
+                return sum(self._series.values())
+            return self._series.get(self._key(labels), 0.0)
+
+    def totals(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._series)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self.totals().items()):
+            yield f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Point-in-time value; set() right before exposition for derived values."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.expose() for metric in REGISTRY) + "\n"
+
+
+# -------------------------------
+# Metrics
+# -------------------------------
+STAGE_SECONDS = Histogram(
+    "docgen_stage_seconds",
+    "Time spent per pipeline stage (parse, llm, insert).",
+    labelnames=("stage",),
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "docgen_llm_call_seconds",
+    "Duration of one model call, excluding queueing.",
+    labelnames=("language", "format"),
+)
+
+LLM_QUEUE_SECONDS = Histogram(
+    "docgen_llm_queue_wait_seconds",
+    "Time a model call waited for the scheduler (rate limits, concurrency).",
+    labelnames=("language", "format"),
+)
+
+RESPONSE_BYTES = Histogram(
+    "docgen_response_bytes",
+    "Uncompressed response body size.",
+    labelnames=("path",),
+    buckets=SIZE_BUCKETS,
+)
+
+FUNCTIONS = Counter(
+    "docgen_functions_total",
+    "Functions processed, by outcome (generated, failed, cancelled).",
+    labelnames=("language", "format", "outcome"),
+)
+
+CACHE_LOOKUPS = Counter(
+    "docgen_cache_lookups_total",
+    "Docstring cache lookups, by result (hit, miss).",
+    labelnames=("language", "format", "result"),
+)
+
+SIMILAR_LOOKUPS = Counter(
+    "docgen_similar_cache_total",
+    "Near-duplicate index lookups after an exact cache miss, by result (reused, hinted, miss).",
+    labelnames=("language", "format", "result"),
+)
+
+TEMPLATE_DOCSTRINGS = Counter(
+    "docgen_template_docstrings_total",
+    "Docstrings built by the local template path for trivial functions (model calls saved), by rule.",
+    labelnames=("language", "format", "kind"),
+)
+
+LLM_TOKENS = Counter(
+    "docgen_llm_tokens_total",
+    "Model tokens used, by kind (prompt, completion).",
+    labelnames=("kind", "language", "format"),
+)
+
+EARLY_STOPS = Counter(
+    "docgen_llm_early_stops_total",
+    "Streamed completions closed as soon as the docstring ended.",
+    labelnames=("language", "format"),
+)
+
+LLM_HEDGES = Counter(
+    "docgen_llm_hedges_total",
+    "Duplicate model calls started because the first one exceeded the hedge delay.",
+    labelnames=("language", "format"),
+)
+
+LLM_HEDGE_WINS = Counter(
+    "docgen_llm_hedge_wins_total",
+    "Hedged calls where the duplicate finished first.",
+    labelnames=("language", "format"),
+)
+
+LLM_ESCALATIONS = Counter(
+    "docgen_llm_escalations_total",
+    "Outputs that failed the validity check and went to the next cascade model, by reason.",
+    labelnames=("language", "format", "reason"),
+)
+
+FALLBACKS = Counter(
+    "docgen_fallbacks_total",
+    "Functions whose batched generation fell back to a single call.",
+    labelnames=("language", "format"),
+)
+
+REQUESTS_CANCELLED = Counter(
+    "docgen_requests_cancelled_total",
+    "Requests whose remaining model work was cancelled, by reason (deadline, disconnect).",
+    labelnames=("path", "reason"),
+)
+
+LLM_RATE_LIMITED = Counter(
+    "docgen_llm_rate_limited_total",
+    "Model calls rejected with HTTP 429.",
+    labelnames=("language", "format"),
+)
+
+LLM_CONCURRENCY = Gauge("docgen_llm_concurrency_limit", "Current adaptive concurrency limit.")
+LLM_IN_FLIGHT = Gauge("docgen_llm_in_flight", "Model calls currently running.")
+LLM_QUEUED = Gauge("docgen_llm_queued", "Model calls waiting for the scheduler.")
+
+
+def labels_for_call() -> Dict[str, str]:
+    """language/format labels of the current task (see call_labels)."""
+    language, fmt = call_labels.get()
+    return {"language": language, "format": fmt}
+
+
+class RequestTimings:
+    """Per-request stage stopwatch, mirrored into STAGE_SECONDS (and a tracing span per stage)."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            with span(f"docgen.{name}"):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header (milliseconds)."""
+        return ", ".join(f"{name};dur={secs * 1000:.1f}" for name, secs in self.stages.items())
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(secs, 4) for name, secs in self.stages.items()}
@@ -1,19 +1,128 @@
 import os
 import json
 import re
+import asyncio
 import logging
-from groq import AsyncGroq
-from dotenv import load_dotenv
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
+from app.cache import cache_key, docstring_cache
+from app.hedging import (
+    CASCADE_MODELS,
+    HEDGE_MODEL,
+    LatencyTracker,
+    cascade_models,
+    docstring_problem,
+    hedged,
+)
+from app.llm import Completion, LLMBackend, LLMConnectionError, create_backend
+from app.metrics import (
+    CACHE_LOOKUPS,
+    EARLY_STOPS,
+    FALLBACKS,
+    LLM_ESCALATIONS,
+    LLM_HEDGE_WINS,
+    LLM_HEDGES,
+    LLM_TOKENS,
+    SIMILAR_LOOKUPS,
+    TEMPLATE_DOCSTRINGS,
+    labels_for_call,
+)
+from app.prompting import (
+    PROMPT_TOKEN_BUDGET,
+    CalleeSummary,
+    callee_context,
+    callee_key,
+    compact_source,
+    completion_tokens_for,
+    estimate_tokens,
+)
+from app.scheduler import LLMScheduler
+from app.similarity import Match, similarity_index, substitute
+from app.singleflight import SingleFlight
+from app.streaming import END_CHARACTERS, STREAM_COMPLETIONS, stop_sequences, trim_docstring
+from app.templates import template_docstring
 from app.utils import indent_docstring
 
+
+def _load_env() -> None:
+    # Same lookup as dotenv.find_dotenv() (this directory upwards), but
+    # python-dotenv is only imported when there is a .env file to read
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+
 # Load env
-load_dotenv()
+_load_env()
+
+# Model backend from LLM_BACKEND (groq by default); see app/llm.py
+backend = create_backend()
+
+
+def _backend_for(spec: Tuple[str, Optional[str]]) -> LLMBackend:
+    name, model = spec
+    if name == backend.name and (model or backend.model) == backend.model:
+        return backend
+    return create_backend(name, model)
+
+
+# Slow calls are duplicated to this backend (see app/hedging.py)
+hedge_backend = _backend_for(cascade_models(HEDGE_MODEL)[0]) if HEDGE_MODEL else backend
+
+# Models escalated to, in order, when an output fails the validity check
+cascade = [_backend_for(spec) for spec in cascade_models(CASCADE_MODELS)]
+
+# Latencies of completed primary-backend attempts (not hedges or cascade
+# calls); they set the hedge delay
+call_latency = LatencyTracker()
+
+
+async def aclose_backends() -> None:
+    """Close the primary, hedge and cascade backends (each once)."""
+    for client in {id(b): b for b in [backend, hedge_backend] + cascade}.values():
+        await client.aclose()
 
-client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
 
 logger = logging.getLogger("doc_generator")
 
+MODEL = backend.model
+
+# Bump whenever the prompt changes so cached docstrings are not reused
+PROMPT_VERSION = "4"
+
+SYSTEM_PROMPT = "Return only the requested docstring/comment text. No JSON. No markdown."
+BATCH_SYSTEM_PROMPT = "Return only the requested JSON array of docstrings. No markdown."
+
+# Batched mode: prompt budget per request and max functions per request
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "3000"))
+BATCH_MAX_FUNCTIONS = int(os.getenv("BATCH_MAX_FUNCTIONS", "20"))
+MAX_COMPLETION_TOKENS = 8192
+
+# Shared by every request in this process; 0 disables a rate limit
+llm_scheduler = LLMScheduler(
+    requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")),
+    tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+    initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "4")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+    target_latency=float(os.getenv("LLM_TARGET_LATENCY", "5")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+    transient_errors=(LLMConnectionError,),
+)
+
+# Coalesces identical concurrent generations (same cache key)
+inflight = SingleFlight()
+
 
 # -------------------------------
 # JSON CLEANING HELPERS
@@ -89,8 +198,27 @@ async def generate_docstring(
     function_name: str,
     function_code: str,
     function_format: str,
-    max_tokens: int = 512,
+    max_tokens: Optional[int] = None,
+    callees: Optional[List[CalleeSummary]] = None,
+    on_text: Optional[Callable[[str], None]] = None,
 ):
+    # Getters, setters, dunders and thin wrappers need no model call
+    templated = template_docstring(function_language, function_format, function_name, function_code, callees)
+    if templated is not None:
+        TEMPLATE_DOCSTRINGS.inc(language=function_language, format=function_format, kind=templated.kind)
+        return {
+            "function_name": function_name,
+            "docstring": indent_for_code(function_code, templated.docstring),
+            "raw_docstring": templated.docstring,
+        }
+
+    # Very large functions/classes are sent as a compact skeleton; already
+    # documented callees are described by their summary line
+    prompt_code = compact_source(function_language, function_code, callees=callees)
+    if max_tokens is None:
+        max_tokens = completion_tokens_for(prompt_code)
+    context = callee_context(callees)
+
     prompt = f"""
 You are an expert {function_language} developer and documentation assistant.
 
@@ -109,30 +237,470 @@ Function name:
 {function_name}
 
 Function:
-{function_code}
+{prompt_code}
+
+{context}
 """.strip()
 
-    response = await client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {
-                "role": "system",
-                "content": "Return only the requested docstring/comment text. No JSON. No markdown.",
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.0,
-        max_tokens=max_tokens,
-    )
+    key = cache_key(function_language, function_code, function_format, MODEL, PROMPT_VERSION, callee_key(callees))
+
+    async def lookup_or_generate() -> str:
+        docstring = await _cache_get(key)
+        if docstring_cache is not None:
+            CACHE_LOOKUPS.inc(
+                language=function_language,
+                format=function_format,
+                result="miss" if docstring is None else "hit",
+            )
+        if docstring is None:
+            docstring, reused = await _similar_or_complete(
+                function_language, function_name, function_code, function_format, prompt, max_tokens, on_text
+            )
+            # Reused near-duplicates are not persisted: only model output is
+            if not reused:
+                await _cache_put(key, docstring)
+        return docstring
+
+    # Identical functions requested concurrently share one model call
+    docstring = await inflight.do(key, lookup_or_generate)
+
+    return {
+        "function_name": function_name,
+        "docstring": indent_for_code(function_code, docstring),
+        "raw_docstring": docstring,
+    }
+
+
+async def generate_docstrings_batch(
+    function_language: str,
+    functions: List[Tuple[str, str]],
+    function_format: str,
+    callees: Optional[List[List[CalleeSummary]]] = None,
+) -> List[dict]:
+    """
+    Document several (name, code) functions with a single model request.
+
+    `callees` optionally holds the callee summaries of each function (see
+    generate_docstring). Trivial functions, cached functions and
+    near-duplicates of already documented ones are answered locally. If the batched output cannot be
+    parsed (or an entry is missing), the affected functions fall back to
+    one generate_docstring call each (a failed fallback yields a None
+    docstring). Results keep the input order.
+    """
+    callees = callees or [[] for _ in functions]
+    keys = [
+        cache_key(function_language, code, function_format, MODEL, PROMPT_VERSION, callee_key(callees[idx]))
+        for idx, (_, code) in enumerate(functions)
+    ]
+    raw: Dict[int, str] = {}
+
+    for idx, (name, code) in enumerate(functions):
+        templated = template_docstring(function_language, function_format, name, code, callees[idx])
+        if templated is not None:
+            TEMPLATE_DOCSTRINGS.inc(language=function_language, format=function_format, kind=templated.kind)
+            raw[idx] = templated.docstring
+
+    for idx, key in enumerate(keys):
+        if idx in raw:
+            continue
+        cached = await _cache_get(key)
+        if cached is not None:
+            raw[idx] = cached
+        if docstring_cache is not None:
+            CACHE_LOOKUPS.inc(
+                language=function_language,
+                format=function_format,
+                result="miss" if cached is None else "hit",
+            )
+
+    scope = _similarity_scope(function_language, function_format)
+    if similarity_index is not None:
+        for idx, (name, code) in enumerate(functions):
+            if idx in raw:
+                continue
+            match = similarity_index.lookup(scope, name, code)
+            reused = _reused_docstring(function_language, name, code, match)
+            SIMILAR_LOOKUPS.inc(
+                language=function_language,
+                format=function_format,
+                result="miss" if reused is None else "reused",
+            )
+            if reused is not None:
+                raw[idx] = reused
+
+    pending = [idx for idx in range(len(functions)) if idx not in raw]
+
+    if len(pending) > 1:
+        prompt = _build_batch_prompt(function_language, function_format, functions, pending, callees)
+        max_tokens = min(
+            MAX_COMPLETION_TOKENS,
+            sum(
+                completion_tokens_for(compact_source(function_language, functions[idx][1], callees=callees[idx]))
+                for idx in pending
+            ),
+        )
+
+        try:
+            output = await _complete(prompt, max_tokens, system=BATCH_SYSTEM_PROMPT)
+            parsed = _parse_batch_output(output, pending)
+        except Exception as e:
+            logger.error(f"Batched generation failed for {len(pending)} functions: {e}")
+            parsed = None
+
+        if parsed is None:
+            logger.warning(f"Unparseable batch output, falling back to {len(pending)} single calls")
+            parsed = {}
+
+        for idx, docstring in parsed.items():
+            raw[idx] = docstring
+            await _cache_put(keys[idx], docstring)
+            if similarity_index is not None:
+                similarity_index.add(scope, functions[idx][0], functions[idx][1], docstring)
+
+    async def single(name: str, code: str, summaries: List[CalleeSummary]) -> dict:
+        try:
+            return await generate_docstring(function_language, name, code, function_format, callees=summaries)
+        except Exception as e:
+            logger.error(f"Docstring generation failed for {name}: {e}")
+            return {"function_name": name, "docstring": None}
+
+    missing = [idx for idx in range(len(functions)) if idx not in raw]
+    if missing:
+        FALLBACKS.inc(len(missing), language=function_language, format=function_format)
+    fallback = dict(zip(missing, await asyncio.gather(*(single(*functions[idx], callees[idx]) for idx in missing))))
+
+    results: List[dict] = []
+    for idx, (name, code) in enumerate(functions):
+        if idx in raw:
+            results.append({
+                "function_name": name,
+                "docstring": indent_for_code(code, raw[idx]),
+                "raw_docstring": raw[idx],
+            })
+        else:
+            results.append(fallback[idx])
+    return results
+
+
+def _similarity_scope(function_language: str, function_format: str) -> str:
+    return "\0".join((function_language.lower(), function_format, MODEL, PROMPT_VERSION))
+
+
+async def _similar_or_complete(
+    function_language: str,
+    function_name: str,
+    function_code: str,
+    function_format: str,
+    prompt: str,
+    max_tokens: int,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, bool]:
+    """
+    (docstring, reused) for a function missing from the exact cache.
+
+    A near-duplicate of an already documented function (same code, only
+    local names differ) reuses that docstring with the names substituted,
+    if the result passes docstring_problem(). A merely similar one is
+    generated with the cached docstring as an example, through a much
+    shorter prompt.
+    """
+    if similarity_index is None:
+        docstring = await _complete(
+            prompt, max_tokens, language=function_language, on_text=on_text, function_code=function_code
+        )
+        return docstring, False
+
+    scope = _similarity_scope(function_language, function_format)
+    match = similarity_index.lookup(scope, function_name, function_code)
+    reused = _reused_docstring(function_language, function_name, function_code, match)
+    if reused is not None:
+        SIMILAR_LOOKUPS.inc(language=function_language, format=function_format, result="reused")
+        return reused, True
+
+    if match is not None:
+        SIMILAR_LOOKUPS.inc(language=function_language, format=function_format, result="hinted")
+        hint_prompt = _build_hint_prompt(function_language, function_format, function_name, function_code, match)
+        hint_tokens = min(max_tokens, estimate_tokens(match.docstring) * 3 // 2 + 32)
+        docstring = await _complete(
+            hint_prompt, hint_tokens, language=function_language, on_text=on_text, function_code=function_code
+        )
+    else:
+        SIMILAR_LOOKUPS.inc(language=function_language, format=function_format, result="miss")
+        docstring = await _complete(
+            prompt, max_tokens, language=function_language, on_text=on_text, function_code=function_code
+        )
+
+    similarity_index.add(scope, function_name, function_code, docstring)
+    return docstring, False
 
-    docstring = response.choices[0].message.content.strip()
 
-    print("\n=== RAW MODEL OUTPUT ===\n", docstring, "\n========================\n")
+def _reused_docstring(
+    function_language: str, function_name: str, function_code: str, match: Optional[Match]
+) -> Optional[str]:
+    """A near-duplicate's docstring with local names substituted, when it still fits this code."""
+    if match is None or match.substitutions is None:
+        return None
+    docstring = substitute(match.docstring, match.substitutions)
+    problem = docstring_problem(function_language, function_code, docstring)
+    if problem is not None:
+        logger.debug(f"Not reusing the docstring of {match.name} for {function_name}: {problem}")
+        return None
+    logger.debug(f"Reusing the docstring of {match.name} for {function_name}")
+    return docstring
 
+
+def _build_hint_prompt(
+    function_language: str,
+    function_format: str,
+    function_name: str,
+    function_code: str,
+    match: Match,
+) -> str:
+    return f"""
+This {function_language} function is very similar to `{match.name}`, documented as:
+
+{match.docstring}
+
+Generate a {function_format} docstring for it in the same style, adapted to its names and behaviour.
+Return ONLY the docstring text (no triple quotes, no markdown).
+
+Function name:
+{function_name}
+
+Function:
+{compact_source(function_language, function_code)}
+""".strip()
+
+
+def pack_batches(
+    functions: List[Tuple[str, str]],
+    token_budget: int = BATCH_TOKEN_BUDGET,
+    max_functions: int = BATCH_MAX_FUNCTIONS,
+) -> List[List[int]]:
+    """Greedily group function indices (in source order) into token-bounded batches."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+
+    for idx, (name, code) in enumerate(functions):
+        # Oversized functions are compacted to at most PROMPT_TOKEN_BUDGET
+        cost = min(estimate_tokens(code), PROMPT_TOKEN_BUDGET) + estimate_tokens(name) + 8
+        if current and (used + cost > token_budget or len(current) >= max_functions):
+            batches.append(current)
+            current, used = [], 0
+        current.append(idx)
+        used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _build_batch_prompt(
+    function_language: str,
+    function_format: str,
+    functions: List[Tuple[str, str]],
+    indices: List[int],
+    callees: Optional[List[List[CalleeSummary]]] = None,
+) -> str:
+    parts = [f"""
+You are an expert {function_language} developer and documentation assistant.
+
+Generate a {function_format} docstring/comment for EACH function below.
+
+STRICT RULES:
+- Return ONLY a JSON array with one object per function: [{{"id": <id>, "docstring": "<text>"}}]
+- Use the id shown in each function header.
+- Escape newlines and quotes inside "docstring" so the array is valid JSON.
+- Do NOT wrap the response in markdown.
+- Do NOT add explanations.
+- For JavaScript/TypeScript, each docstring is valid JSDoc or TSDoc.
+- For Java/C/C++, each docstring is valid block comment documentation.
+- For Python, each docstring is only the docstring content without triple quotes.
+""".strip()]
+
+    for idx in indices:
+        name, code = functions[idx]
+        summaries = callees[idx] if callees else None
+        part = f"### Function id={idx} name={name}\n{compact_source(function_language, code, callees=summaries)}"
+        context = callee_context(summaries)
+        parts.append(f"{part}\n\n{context}" if context else part)
+
+    return "\n\n".join(parts)
+
+
+def _parse_batch_output(output: str, indices: List[int]) -> Optional[Dict[int, str]]:
+    match = re.search(r"\[[\s\S]*\]", output)
+    if not match:
+        return None
+
+    try:
+        items = json.loads(clean_json_string(match.group(0)))
+    except json.JSONDecodeError:
+        return None
+
+    if not isinstance(items, list):
+        return None
+
+    wanted = set(indices)
+    parsed: Dict[int, str] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        docstring = item.get("docstring")
+        if idx in wanted and isinstance(docstring, str) and docstring.strip():
+            parsed[idx] = docstring.strip()
+    return parsed
+
+
+def indent_for_code(function_code: str, docstring: str) -> str:
+    """Indent a raw docstring to match the body indentation of `function_code`."""
     indent_match = re.search(r"\n(\s+)\w", function_code)
     indent = indent_match.group(1) if indent_match else "    "
+    return indent_docstring(docstring, indent)
 
-    return {
-        "function_name": function_name,
-        "docstring": indent_docstring(docstring, indent),
-    }
\ No newline at end of file
+
+async def _complete(
+    prompt: str,
+    max_tokens: int,
+    system: str = SYSTEM_PROMPT,
+    language: Optional[str] = None,
+    on_text: Optional[Callable[[str], None]] = None,
+    function_code: Optional[str] = None,
+) -> str:
+    """
+    Run one completion through the scheduler and return its text.
+
+    With `language` the output is a single docstring: the request carries
+    stop sequences, the text is trimmed to the docstring and, with
+    STREAM_COMPLETIONS, the stream is closed as soon as the docstring is
+    complete. `on_text` then receives the docstring so far, line by line.
+
+    A call to the primary backend that runs longer than the hedge delay
+    is duplicated to `hedge_backend`, first result wins. The hedge delay
+    comes from primary-backend latencies only; cascade calls are not
+    timed. With
+    `function_code` and CASCADE_MODELS, a docstring that fails
+    docstring_problem() is generated again by the next cascade model.
+    """
+    estimated = estimate_tokens(system) + estimate_tokens(prompt) + max_tokens
+    stop = stop_sequences(language) if language else None
+    targets = [backend] + (cascade if language and function_code is not None else [])
+
+    def attempt(target: LLMBackend, text_callback) -> Awaitable[Completion]:
+        if language and STREAM_COMPLETIONS:
+            return _stream_docstring(target, language, system, prompt, max_tokens, stop, text_callback)
+        return target.complete(system, prompt, max_tokens, stop=stop)
+
+    def on_hedge() -> None:
+        LLM_HEDGES.inc(**labels_for_call())
+        llm_scheduler.charge(estimated)
+
+    async def primary() -> Completion:
+        # Only completed primary attempts are timed. The hedged wall time is
+        # the faster of both attempts and would drag the hedge delay down
+        started = time.monotonic()
+        completion = await attempt(backend, on_text)
+        call_latency.record(time.monotonic() - started)
+        return completion
+
+    async def call_primary() -> Completion:
+        completion, winner = await hedged(
+            primary,
+            lambda: attempt(hedge_backend, None),
+            call_latency.hedge_delay(),
+            on_hedge,
+        )
+        if winner == "hedge":
+            LLM_HEDGE_WINS.inc(**labels_for_call())
+        return completion
+
+    for level, target in enumerate(targets):
+        if level == 0:
+            completion = await llm_scheduler.run(call_primary, tokens=estimated)
+        else:
+            completion = await llm_scheduler.run(lambda: attempt(target, on_text), tokens=estimated)
+
+        if completion.prompt_tokens is not None and completion.completion_tokens is not None:
+            llm_scheduler.refund_tokens(estimated - completion.prompt_tokens - completion.completion_tokens)
+            labels = labels_for_call()
+            LLM_TOKENS.inc(completion.prompt_tokens, kind="prompt", **labels)
+            LLM_TOKENS.inc(completion.completion_tokens, kind="completion", **labels)
+
+        logger.debug(f"Raw model output ({target.model}):\n{completion.text}")
+
+        if not language:
+            return completion.text.strip()
+        docstring = trim_docstring(language, completion.text)[0]
+        if level == len(targets) - 1:
+            return docstring
+        problem = docstring_problem(language, function_code, docstring)
+        if problem is None:
+            return docstring
+        LLM_ESCALATIONS.inc(reason=problem, **labels_for_call())
+        logger.info(f"Output of {target.model} failed the validity check ({problem}), escalating")
+
+
+async def _stream_docstring(
+    target: LLMBackend,
+    language: str,
+    system: str,
+    prompt: str,
+    max_tokens: int,
+    stop: List[str],
+    on_text: Optional[Callable[[str], None]],
+) -> Completion:
+    """Stream one docstring completion, closing the stream once the docstring has ended."""
+    pieces: List[str] = []
+    usage: Optional[Completion] = None
+    stream = target.stream(system, prompt, max_tokens, stop=stop)
+    try:
+        async for chunk in stream:
+            if chunk.prompt_tokens is not None:
+                usage = chunk
+            if not chunk.text:
+                continue
+            pieces.append(chunk.text)
+            if END_CHARACTERS.isdisjoint(chunk.text):
+                continue
+            docstring, complete = trim_docstring(language, "".join(pieces))
+            if on_text is not None and docstring:
+                on_text(docstring)
+            if complete:
+                EARLY_STOPS.inc(**labels_for_call())
+                break
+    finally:
+        await stream.aclose()
+
+    text = "".join(pieces)
+    if usage is None:
+        # Closed before the backend reported usage: estimate what was generated
+        return Completion(text, estimate_tokens(system) + estimate_tokens(prompt), estimate_tokens(text))
+    return Completion(text, usage.prompt_tokens, usage.completion_tokens)
+
+
+# -------------------------------
+# CACHE HELPERS
+# -------------------------------
+
+async def _cache_get(key: str):
+    if docstring_cache is None:
+        return None
+    try:
+        return await asyncio.to_thread(docstring_cache.get, key)
+    except sqlite3.Error as e:
+        logger.warning(f"Docstring cache lookup failed: {e}")
+        return None
+
+
+async def _cache_put(key: str, docstring: str) -> None:
+    if docstring_cache is None or not docstring:
+        return
+    try:
+        await asyncio.to_thread(docstring_cache.put, key, docstring)
+    except sqlite3.Error as e:
+        logger.warning(f"Docstring cache write failed: {e}")
\ No newline at end of file
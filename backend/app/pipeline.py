@@ -0,0 +1,264 @@
+# shared docstring generation pipeline (used by /generate and /generate/stream)
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import textwrap
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.callgraph import callee_graph, levels
+from app.incremental import missing_docstrings
+from app.metrics import FUNCTIONS, call_labels
+from app.openai_client import generate_docstring, generate_docstrings_batch, indent_for_code, pack_batches
+from app.prompting import CalleeSummary, summary_line
+from app.scheduler import request_key
+from app.schemas import FunctionDoc
+from app.tracing import span
+from app.utils import FunctionInfo
+from app.workers import insert_in_pool, parse_in_pool
+
+logger = logging.getLogger("doc_generator")
+
+# Max number of concurrent model calls per request
+LLM_CONCURRENCY = max(1, int(os.getenv("LLM_CONCURRENCY", "8")))
+
+# Document callees before their callers and pass their summaries along
+# (Python only; "0" restores plain file order)
+CALL_GRAPH_ORDER = os.getenv("CALL_GRAPH_ORDER", "1") != "0"
+
+
+class DeadlineExceeded(Exception):
+    """Raised by iter_generated_docs when its deadline passes first."""
+
+    def __init__(self, done: int, total: int):
+        super().__init__(f"deadline exceeded after {done} of {total} functions")
+        self.done = done
+        self.total = total
+
+
+async def iter_generated_docs(
+    language: str,
+    function_format: str,
+    infos: List[FunctionInfo],
+    fn_srcs: List[str],
+    concurrency: int = LLM_CONCURRENCY,
+    batch: bool = False,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    fair_key: Optional[str] = None,
+    deadline: Optional[float] = None,
+    on_text: Optional[Callable[[int, str], None]] = None,
+) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """
+    Yield (index, docstring) pairs as soon as each function is documented.
+
+    Every function yields exactly once; failed generations yield None so a
+    single error never aborts the request. Pending work is cancelled if the
+    consumer stops iterating early. Pass `semaphore` to share one
+    concurrency limit across several calls (e.g. all files of a job).
+
+    All model calls made here are queued under `fair_key` (a fresh key per
+    call by default) in the process-wide scheduler, which serves keys
+    round-robin.
+
+    With CALL_GRAPH_ORDER, a function waits until the functions it calls
+    (FunctionInfo.calls) are documented and gets their summary lines in
+    its prompt; functions without pending callees run in parallel.
+
+    `deadline` is a time.monotonic() value. Once it passes, queued and
+    in-flight model calls are cancelled and DeadlineExceeded is raised;
+    docstrings finished before that have already been yielded.
+
+    `on_text(index, text)` receives the docstring so far while the model
+    is still writing it (single calls only, not batches or cached ones).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    sem = semaphore or asyncio.Semaphore(concurrency)
+
+    ctx = contextvars.copy_context()
+    ctx.run(request_key.set, fair_key or uuid.uuid4().hex)
+    ctx.run(call_labels.set, (language, function_format))
+
+    counted = 0
+
+    def count(doctext: Optional[str]) -> None:
+        nonlocal counted
+        counted += 1
+        outcome = "generated" if doctext else "failed"
+        FUNCTIONS.inc(language=language, format=function_format, outcome=outcome)
+
+    # Exact duplicates (ignoring indentation) are documented once; the
+    # result is re-indented for every other occurrence.
+    followers: Dict[int, List[int]] = {}
+    first_by_code: Dict[str, int] = {}
+    for idx, src in enumerate(fn_srcs):
+        code = textwrap.dedent(src).strip()
+        if code and code in first_by_code:
+            followers[first_by_code[code]].append(idx)
+            continue
+        if code:
+            first_by_code[code] = idx
+        followers[idx] = []
+
+    leader_of = {dup: idx for idx, dups in followers.items() for dup in dups}
+    graph = callee_graph(infos, leader_of) if CALL_GRAPH_ORDER else [[] for _ in infos]
+    done = {idx: asyncio.Event() for idx in followers}
+    raw_docs: Dict[int, str] = {}
+
+    async def callees_of(idx: int) -> List[CalleeSummary]:
+        for callee in graph[idx]:
+            await done[leader_of.get(callee, callee)].wait()
+        info = infos[idx]
+        summaries = []
+        for callee in graph[idx]:
+            summary = summary_line(raw_docs.get(leader_of.get(callee, callee)) or "")
+            if not summary:
+                continue
+            start = infos[callee].start
+            inside = info.start and info.end and info.start <= start <= info.end
+            summaries.append(CalleeSummary(infos[callee].name, start - info.start + 1 if inside else 0, summary))
+        return summaries
+
+    async def emit(idx: int, parsed: dict):
+        if parsed.get("raw_docstring"):
+            raw_docs[idx] = parsed["raw_docstring"]
+        done[idx].set()
+        count(parsed.get("docstring"))
+        await queue.put((idx, parsed.get("docstring")))
+        raw = parsed.get("raw_docstring")
+        for dup in followers[idx]:
+            doctext = indent_for_code(fn_srcs[dup], raw) if raw else None
+            count(doctext)
+            await queue.put((dup, doctext))
+
+    async def process(idx: int):
+        info = infos[idx]
+        parsed = {}
+        callees = await callees_of(idx)
+
+        async with sem:
+            logger.debug(f"Generating docstring for function: {info.name}")
+            try:
+                with span("docgen.function", function=info.name, language=language, format=function_format):
+                    parsed = await generate_docstring(
+                        function_language=language,
+                        function_name=info.name,
+                        function_code=fn_srcs[idx],
+                        function_format=function_format,
+                        callees=callees,
+                        on_text=functools.partial(on_text, idx) if on_text else None,
+                    )
+                logger.debug(f"Docstring generated for {info.name} → {len(parsed.get('docstring') or '')} chars")
+            except Exception as e:
+                logger.error(f"Docstring generation failed for {info.name}: {e}")
+
+        await emit(idx, parsed)
+
+    async def process_batch(indices: List[int]):
+        parsed = [{} for _ in indices]
+        callees = [await callees_of(idx) for idx in indices]
+
+        async with sem:
+            logger.debug(f"Generating docstrings for batch of {len(indices)} functions")
+            try:
+                with span("docgen.batch", size=len(indices), language=language, format=function_format):
+                    parsed = await generate_docstrings_batch(
+                        function_language=language,
+                        functions=[(infos[i].name, fn_srcs[i]) for i in indices],
+                        function_format=function_format,
+                        callees=callees,
+                    )
+            except Exception as e:
+                logger.error(f"Batch generation failed for {len(indices)} functions: {e}")
+
+        for idx, item in zip(indices, parsed):
+            await emit(idx, item)
+
+    leaders = list(followers)
+    if len(leaders) < len(infos):
+        logger.info(f"Documenting {len(leaders)} unique functions for {len(infos)} occurrences")
+
+    depth = levels([sorted({leader_of.get(c, c) for c in callees}) for callees in graph])
+    if any(graph):
+        logger.info(f"Call graph: {sum(map(len, graph))} edges, {max(depth) + 1} levels")
+
+    if batch:
+        # One level at a time, so no batch waits on a member of another batch of its level
+        batches = []
+        for level in sorted({depth[idx] for idx in leaders}):
+            members = [idx for idx in leaders if depth[idx] == level]
+            packed = pack_batches([(infos[i].name, fn_srcs[i]) for i in members])
+            batches += [[members[pos] for pos in indices] for indices in packed]
+        tasks = [asyncio.create_task(process_batch(indices), context=ctx) for indices in batches]
+    else:
+        tasks = [asyncio.create_task(process(idx), context=ctx) for idx in leaders]
+
+    try:
+        for yielded in range(len(infos)):
+            if deadline is None or not queue.empty():
+                yield await queue.get()
+                continue
+            try:
+                item = await asyncio.wait_for(queue.get(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(yielded, len(infos)) from None
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        if counted < len(infos):
+            # Consumer stopped early (deadline, disconnect): this work was dropped
+            FUNCTIONS.inc(len(infos) - counted, language=language, format=function_format, outcome="cancelled")
+
+
+def build_function_doc(info: FunctionInfo, doctext: Optional[str]) -> FunctionDoc:
+    return FunctionDoc(
+        name=info.name,
+        start_lineno=info.start or 1,
+        end_lineno=info.end or info.start or 1,
+        existing_docstring=info.existing_docstring,
+        generated_docstring=doctext
+    )
+
+
+def collect_updates(infos: List[FunctionInfo]) -> List[Tuple[int, int, str]]:
+    """Insertion updates for every function that received a docstring."""
+    return [
+        (info.start, info.end, info.generated_docstring)
+        for info in infos
+        if info.generated_docstring
+    ]
+
+
+async def document_source(
+    language: str,
+    function_format: str,
+    source: str,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    batch: bool = False,
+    only_missing: bool = False,
+    fair_key: Optional[str] = None,
+) -> Tuple[str, List[FunctionInfo]]:
+    """
+    Parse, document and rebuild one source file; returns (modified, infos).
+
+    With `only_missing`, functions that already have a docstring are left
+    untouched and are not part of the returned infos.
+    """
+    infos, fn_srcs, source = await parse_in_pool(language, source)
+
+    if only_missing:
+        selected = missing_docstrings(infos)
+        infos = [infos[i] for i in selected]
+        fn_srcs = [fn_srcs[i] for i in selected]
+
+    docs = iter_generated_docs(
+        language, function_format, infos, fn_srcs, batch=batch, semaphore=semaphore, fair_key=fair_key
+    )
+    async for idx, doctext in docs:
+        infos[idx].generated_docstring = doctext
+
+    modified = await insert_in_pool(source, collect_updates(infos), language)
+    return modified, infos
@@ -0,0 +1,307 @@
+# token-budgeted prompt input: compact skeletons for very large functions/classes
+import ast
+import os
+import re
+import textwrap
+from typing import List, NamedTuple, Optional, Sequence
+
+# Budget for the code part of one prompt (estimated tokens)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+
+# Completion allowance per function, derived from its size and clamped here
+MIN_COMPLETION_TOKENS = int(os.getenv("MIN_COMPLETION_TOKENS", "192"))
+MAX_COMPLETION_TOKENS_PER_FUNCTION = int(os.getenv("MAX_COMPLETION_TOKENS_PER_FUNCTION", "1024"))
+
+# Callee summaries added to one prompt, and their maximum length
+MAX_CALLEE_SUMMARIES = int(os.getenv("MAX_CALLEE_SUMMARIES", "8"))
+SUMMARY_MAX_CHARS = 120
+
+# Strings and comments on one line, removed before counting braces
+_BRACE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|//.*|/\*.*?\*/')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def completion_tokens_for(code: str) -> int:
+    """
+    max_tokens for documenting `code`: a base allowance plus a share of the
+    (compacted) code size, so small helpers do not reserve as much as a
+    large class.
+    """
+    tokens = MIN_COMPLETION_TOKENS + estimate_tokens(code) // 4
+    return max(MIN_COMPLETION_TOKENS, min(MAX_COMPLETION_TOKENS_PER_FUNCTION, tokens))
+
+
+class CalleeSummary(NamedTuple):
+    name: str
+    line: int        # def line within the caller's code (1-based), 0 when defined elsewhere
+    summary: str
+
+
+def summary_line(docstring: str) -> str:
+    """First meaningful line of a generated docstring or doc comment."""
+    for line in docstring.splitlines():
+        text = line.strip().strip("\"'").lstrip("/*#").strip()
+        if text and not text.startswith("@"):
+            if len(text) > SUMMARY_MAX_CHARS:
+                text = text[:SUMMARY_MAX_CHARS - 3].rstrip() + "..."
+            return text
+    return ""
+
+
+def callee_key(callees: Optional[Sequence[CalleeSummary]]) -> str:
+    """
+    Cache-key part for the callee summaries a prompt can contain (outside
+    functions and collapsed members), so a caller's cached docstring is
+    not reused once a callee's summary changes.
+    """
+    return "\n".join(
+        f"{callee.line}:{callee.name}:{callee.summary}" for callee in callees or () if callee.summary
+    )
+
+
+def callee_context(callees: Optional[Sequence[CalleeSummary]]) -> str:
+    """Prompt lines describing already documented functions defined outside the code."""
+    outside = [callee for callee in callees or () if not callee.line and callee.summary]
+    if not outside:
+        return ""
+    lines = [f"- {callee.name}: {callee.summary}" for callee in outside[:MAX_CALLEE_SUMMARIES]]
+    return "Already documented functions it uses (context only, do not document them):\n" + "\n".join(lines)
+
+
+def compact_source(
+    language: str,
+    code: str,
+    budget: int = PROMPT_TOKEN_BUDGET,
+    callees: Optional[Sequence[CalleeSummary]] = None,
+) -> str:
+    """
+    Code to put in the prompt: `code` itself when it fits `budget`,
+    otherwise a compact representation.
+
+    Python methods and nested functions listed in `callees` (with their
+    line in `code`) are always reduced to their signature and summary.
+
+    - Python: decorators and signatures; a class keeps its attributes and
+      method signatures (bodies become `...`); a function keeps the start
+      and end of its body.
+    - Brace languages: nested blocks deeper than the members/statements
+      directly inside the function or class collapse to one marker line.
+    - Whatever is still over budget keeps its first and last lines.
+    """
+    if language.lower() == "python" and callees:
+        code = _collapse_members(code, callees)
+
+    if estimate_tokens(code) <= budget:
+        return code
+
+    comment = "#" if language.lower() == "python" else "//"
+    skeleton = None
+    if language.lower() == "python":
+        skeleton = _python_skeleton(code, budget)
+    if skeleton is None:
+        skeleton = _brace_skeleton(code)
+
+    if estimate_tokens(skeleton) > budget:
+        skeleton = _truncate_lines(skeleton.splitlines(), budget, comment)
+    return skeleton
+
+
+# -------------------------------
+# Python
+# -------------------------------
+def _python_skeleton(code: str, budget: int) -> Optional[str]:
+    source = textwrap.dedent(code)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    if not tree.body or not isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return None
+
+    lines = source.splitlines()
+    node = tree.body[0]
+    out: List[str] = []
+
+    if isinstance(node, ast.ClassDef):
+        _python_class(node, lines, out)
+    else:
+        out.extend(_python_header(node, lines))
+        body = _python_body(node)
+        if body:
+            first = body[0].lineno - 1
+            last = node.end_lineno
+            if first >= node.lineno:
+                out.extend(lines[first:last])
+        text = "\n".join(out)
+        if estimate_tokens(text) > budget:
+            header = _python_header(node, lines)
+            rest = out[len(header):]
+            remaining = budget - estimate_tokens("\n".join(header))
+            return "\n".join(header + _truncate_lines(rest, max(remaining, 1), "#").splitlines())
+        return text
+
+    return "\n".join(out)
+
+
+def _collapse_members(code: str, callees: Sequence[CalleeSummary]) -> str:
+    """Replace the bodies of already documented nested definitions by their summary."""
+    summaries = {callee.line: callee.summary for callee in callees if callee.line and callee.summary}
+    source = textwrap.dedent(code)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return code
+    if not tree.body or not summaries:
+        return code
+
+    root = tree.body[0]
+    lines = source.splitlines()
+    collapsed = [
+        node for node in ast.walk(root)
+        if node is not root
+        and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        and node.lineno in summaries
+        and node.body[0].lineno > node.lineno
+    ]
+
+    # Outermost definitions only, replaced bottom-up so line numbers stay valid
+    outermost = [
+        node for node in collapsed
+        if not any(other is not node and other.lineno <= node.lineno <= other.end_lineno for other in collapsed)
+    ]
+    for node in sorted(outermost, key=lambda n: n.lineno, reverse=True):
+        indent = _indent_of(lines[node.body[0].lineno - 1])
+        summary = summaries[node.lineno].replace('"""', "'''")
+        replacement = [f'{indent}"""{summary}"""', f"{indent}..."]
+        # Short bodies are cheaper to send as they are
+        if len("\n".join(replacement)) < len("\n".join(lines[node.body[0].lineno - 1:node.end_lineno])):
+            lines[node.body[0].lineno - 1:node.end_lineno] = replacement
+    return "\n".join(lines)
+
+
+def _python_header(node: ast.AST, lines: List[str]) -> List[str]:
+    """Decorators and the (possibly multi-line) def/class line."""
+    start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+    body_start = node.body[0].lineno
+    if body_start <= node.lineno:
+        # One-liner such as `def f(): return 1`
+        return lines[start - 1:node.lineno]
+    return lines[start - 1:body_start - 1]
+
+
+def _python_body(node: ast.AST) -> List[ast.stmt]:
+    """Body without the docstring (the model writes a new one)."""
+    body = list(node.body)
+    if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        body = body[1:]
+    return body
+
+
+def _python_class(node: ast.ClassDef, lines: List[str], out: List[str]) -> None:
+    out.extend(_python_header(node, lines))
+    if node.body[0].lineno <= node.lineno:
+        return
+
+    for item in _python_body(node):
+        indent = " " * item.col_offset
+        if isinstance(item, ast.ClassDef):
+            _python_class(item, lines, out)
+        elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            header = _python_header(item, lines)
+            out.extend(header)
+            if item.body[0].lineno > item.lineno:
+                out.append(f"{indent}    ...")
+        elif isinstance(item, (ast.Assign, ast.AnnAssign)):
+            # Class attributes; long literals keep their first line only
+            first = lines[item.lineno - 1]
+            out.append(first if item.end_lineno == item.lineno else f"{first} ...")
+
+    if len(out) == 1:
+        out.append(" " * node.body[0].col_offset + "...")
+
+
+# -------------------------------
+# Brace languages
+# -------------------------------
+def _brace_skeleton(code: str) -> str:
+    """Keep depth-0/1 lines; collapse each deeper run into one `// ...` line."""
+    out: List[str] = []
+    depth = 0
+    hidden_indent = None
+    in_block_comment = False
+
+    for line in code.splitlines():
+        stripped = line
+        if in_block_comment:
+            end = stripped.find("*/")
+            stripped = "" if end < 0 else stripped[end + 2:]
+            in_block_comment = end < 0
+        stripped = _BRACE_NOISE.sub("", stripped)
+        start = stripped.find("/*")
+        if start >= 0:
+            stripped = stripped[:start]
+            in_block_comment = True
+        new_depth = max(0, depth + stripped.count("{") - stripped.count("}"))
+
+        # Lines that open or close a depth-1 block stay visible
+        if min(depth, new_depth) <= 1:
+            if hidden_indent is not None:
+                out.append(hidden_indent + "// ...")
+                hidden_indent = None
+            out.append(line)
+        elif hidden_indent is None:
+            hidden_indent = _indent_of(line)
+        depth = new_depth
+
+    if hidden_indent is not None:
+        out.append(hidden_indent + "// ...")
+    return "\n".join(out)
+
+
+def _indent_of(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+# -------------------------------
+# Last resort
+# -------------------------------
+def _truncate_lines(lines: List[str], budget: int, comment: str) -> str:
+    """First and last lines within `budget` tokens, with a marker for the gap."""
+    head_budget = budget * 2 // 3
+    tail_budget = budget - head_budget
+
+    head: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > head_budget:
+            break
+        head.append(line)
+        used += cost
+
+    tail: List[str] = []
+    used = 0
+    for line in reversed(lines[len(head):]):
+        cost = estimate_tokens(line)
+        if used + cost > tail_budget:
+            break
+        tail.append(line)
+        used += cost
+    tail.reverse()
+
+    omitted = len(lines) - len(head) - len(tail)
+    if omitted <= 0:
+        return "\n".join(lines)
+
+    # Very long single lines: hard cut by characters
+    if not head and lines:
+        head = [lines[0][: head_budget * 4]]
+        omitted -= 1
+
+    marker_indent = _indent_of(tail[0] if tail else (head[-1] if head else ""))
+    return "\n".join(head + [f"{marker_indent}{comment} ... {omitted} lines omitted ..."] + tail)
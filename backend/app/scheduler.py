@@ -0,0 +1,279 @@
+# process-wide scheduler for model calls (rate limits, adaptive concurrency, fair queuing)
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.metrics import LLM_CALL_SECONDS, LLM_QUEUE_SECONDS, LLM_RATE_LIMITED, labels_for_call
+from app.tracing import span
+
+logger = logging.getLogger("doc_generator")
+
+T = TypeVar("T")
+
+# Fairness key of the current request/job; set by the pipeline for its tasks
+request_key: contextvars.ContextVar[str] = contextvars.ContextVar("request_key", default="default")
+
+
+class TokenBucket:
+    """Refilling bucket for per-minute limits; a rate of 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        if self.rate and amount > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMScheduler:
+    """
+    Gatekeeper for every model call in this process.
+
+    - Token buckets enforce requests/min and tokens/min.
+    - Concurrency adapts AIMD-style: +1/limit per fast success, halved on
+      429s and reduced when latency exceeds `target_latency`.
+    - Waiters are queued per fairness key and served round-robin, so one
+      huge file cannot starve small requests.
+    - 429s and transient errors are retried with jittered exponential
+      backoff; `retry-after` pauses all dispatching.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        target_latency: float = 5.0,
+        max_retries: int = 5,
+        transient_errors: Tuple[type, ...] = (),
+    ):
+        self.rpm = TokenBucket(requests_per_minute)
+        self.tpm = TokenBucket(tokens_per_minute)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.transient_errors = transient_errors
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.retries = 0
+        self._last_decrease = 0.0
+        self._queues: "OrderedDict[str, Deque[Tuple[asyncio.Future, int]]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0, key: Optional[str] = None) -> T:
+        """Run `call()` once admitted, retrying rate-limit and transient failures."""
+        key = key or request_key.get()
+        labels = labels_for_call()
+        attempt = 0
+
+        while True:
+            queued = time.monotonic()
+            with span("llm.queue", attempt=attempt):
+                await self._acquire(key, tokens)
+            started = time.monotonic()
+            LLM_QUEUE_SECONDS.observe(started - queued, **labels)
+            try:
+                with span("llm.call", attempt=attempt, tokens=tokens):
+                    result = await call()
+            except Exception as e:
+                self._release()
+                LLM_CALL_SECONDS.observe(time.monotonic() - started, **labels)
+                if getattr(e, "status_code", None) == 429:
+                    LLM_RATE_LIMITED.inc(**labels)
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Model call failed ({e.__class__.__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self._release()
+                raise
+
+            latency = time.monotonic() - started
+            LLM_CALL_SECONDS.observe(latency, **labels)
+            self._on_success(latency)
+            self._release()
+            return result
+
+    def refund_tokens(self, amount: int) -> None:
+        """Return over-estimated tokens (e.g. unused max_tokens) to the bucket."""
+        self.tpm.give_back(amount)
+        self._dispatch()
+
+    def charge(self, tokens: int = 0) -> None:
+        """Count a request sent alongside an admitted call (e.g. a hedge) against the rate limits."""
+        self.rpm.take(1)
+        self.tpm.take(tokens)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
+
+    # ---------------------------
+    # Admission
+    # ---------------------------
+    async def _acquire(self, key: str, tokens: int) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((fut, tokens))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Admitted just before the cancellation landed
+                self._release()
+            else:
+                self._forget(key, fut)
+            raise
+
+    def _forget(self, key: str, fut: asyncio.Future) -> None:
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        for entry in queue:
+            if entry[0] is fut:
+                queue.remove(entry)
+                break
+        if not queue:
+            del self._queues[key]
+        self._dispatch()
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._queues and self.in_flight < int(self.limit):
+            key, queue = next(iter(self._queues.items()))
+            fut, tokens = queue[0]
+
+            if fut.done():
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                continue
+
+            wait = max(
+                self.paused_until - time.monotonic(),
+                self.rpm.wait_time(1),
+                self.tpm.wait_time(tokens),
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+
+            self.rpm.take(1)
+            self.tpm.take(tokens)
+            queue.popleft()
+
+            # Round-robin: the served key moves to the back of the line
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def fire():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = loop.call_later(delay, fire)
+
+    # ---------------------------
+    # Feedback
+    # ---------------------------
+    def _on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self._decrease(0.8)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+
+    def _decrease(self, factor: float) -> None:
+        # At most one decrease per second so a burst of errors counts once
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * factor)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `error`, or None if it is not retryable."""
+        status = getattr(error, "status_code", None)
+        backoff = random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+
+        if status == 429:
+            self.throttled += 1
+            self._decrease(0.5)
+            retry_after = _retry_after(error)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                return retry_after + backoff / 4
+            return backoff
+
+        if (status is not None and status >= 500) or isinstance(error, self.transient_errors):
+            return backoff
+
+        return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    if getattr(error, "retry_after", None) is not None:
+        return error.retry_after
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -16,6 +16,18 @@ class FunctionDoc(BaseModel):
     existing_docstring: Optional[str]
     generated_docstring: Optional[str]
 
+class Patch(BaseModel):
+    # Replace `delete_lines` lines starting at `start_line` (1-based, original
+    # source) with `text`; 0 deletes means insert before that line.
+    start_line: int
+    delete_lines: int
+    text: str
+
 class GenerateResponse(BaseModel):
-    modified_code: str
+    # Exactly one of modified_code / patches / diff is set, depending on `output`
+    modified_code: Optional[str] = None
+    patches: Optional[List[Patch]] = None
+    diff: Optional[str] = None
     docs: List[FunctionDoc]
+    # True when the deadline passed first; undocumented functions have no generated_docstring
+    partial: bool = False
@@ -0,0 +1,312 @@
+# near-duplicate docstring index (MinHash/LSH over normalized code tokens)
+import functools
+import hashlib
+import os
+import random
+import re
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# "1" enables the index (off by default)
+SIMILAR_CACHE = os.getenv("SIMILAR_CACHE", "0") != "0"
+
+# Estimated Jaccard similarity above which a cached docstring is used
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+
+# Entries kept in memory (least recently used are dropped first)
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "10000"))
+
+NUM_PERM = 64
+BANDS = 16                          # 16 bands x 4 rows: ~64% candidate rate at 0.5 similarity, ~99% at 0.7
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+# One 64-bit hash per shingle, XORed with a random mask per "permutation":
+# min(map(mask.__xor__, hashes)) runs in C, unlike an affine hash per shingle
+_rng = random.Random(1)
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+_HASH_MASK = (1 << 64) - 1
+
+# Comments are dropped; strings, numbers, names and single symbols are tokens
+_TOKEN = re.compile(
+    r"""(?P<comment>//[^\n]*|/\*[\s\S]*?\*/|\#[^\n]*)"""
+    r"""|(?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`)"""
+    r"""|(?P<number>\b\d[\w.]*)"""
+    r"""|(?P<name>[A-Za-z_$][\w$]*)"""
+    r"""|(?P<symbol>\S)"""
+)
+
+# Keywords of the supported languages; they never name a local
+KEYWORDS = frozenset("""
+    and as assert async await break case catch class const continue def default del delete do elif else
+    enum except export extends final finally for from function global if implements import in instanceof
+    interface is lambda let new nonlocal not null or pass private protected public raise return static
+    struct super switch synchronized template this throw throws try typedef typename typeof var virtual
+    void volatile while with yield None True False true false self cls int float double char bool boolean
+    long short unsigned signed auto string String
+""".split())
+
+# Words after which a name is being bound (loop, with/except and JS declarations)
+_BINDING_KEYWORDS = frozenset(("for", "as", "let", "const", "var"))
+
+_CAMEL_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+class Tokens(NamedTuple):
+    skeleton: Tuple[str, ...]        # tokens with the code's own names replaced by ID
+    values: Tuple[str, ...]          # original text of every ID token, in order
+
+
+def _local_names(tokens: List[Tuple[str, str]]) -> Set[str]:
+    """
+    Names the code declares itself: the function name, its parameters,
+    assignment targets and loop/with/except variables. Only these can be
+    renamed; callees, attributes, globals and literals have to match.
+    """
+    local: Set[str] = set()
+    calls: List[bool] = []           # per open "(": is it a call's argument list?
+    params_depth: Optional[int] = None
+    seen_definition = False
+
+    for i, (kind, text) in enumerate(tokens):
+        prev_kind, prev = tokens[i - 1] if i else ("", "")
+        nxt = tokens[i + 1][1] if i + 1 < len(tokens) else ""
+        after = tokens[i + 2][1] if i + 2 < len(tokens) else ""
+
+        if text == "(" and kind == "symbol":
+            is_call = prev_kind == "name" and prev not in KEYWORDS
+            before = tokens[i - 2][1] if i > 1 else ""
+            if is_call and not seen_definition and before not in (".", "@"):
+                # The first name( that is not a decorator: the definition itself
+                seen_definition = True
+                local.add(prev)
+                calls.append(False)
+                params_depth = len(calls)
+                continue
+            calls.append(is_call)
+        elif text == ")" and kind == "symbol":
+            if calls:
+                calls.pop()
+            if params_depth is not None and len(calls) < params_depth:
+                params_depth = None
+        elif kind == "name" and text not in KEYWORDS and prev != "." and nxt != "(":
+            if params_depth is not None and len(calls) == params_depth:
+                if prev != "=":      # not a default value
+                    local.add(text)
+            elif prev in _BINDING_KEYWORDS:
+                local.add(text)
+            elif nxt == "=" and after not in ("=", ">") and not (calls and calls[-1]):
+                local.add(text)      # assignment, not a keyword argument or comparison
+    return local
+
+
+def tokenize(code: str) -> Tokens:
+    tokens = [(match.lastgroup, match.group()) for match in _TOKEN.finditer(code) if match.lastgroup != "comment"]
+    local = _local_names(tokens)
+
+    skeleton: List[str] = []
+    values: List[str] = []
+    for i, (kind, text) in enumerate(tokens):
+        if kind == "name" and text in local and (i == 0 or tokens[i - 1][1] != "."):
+            skeleton.append("ID")
+            values.append(text)
+        else:
+            # Keywords, symbols, callees, attributes and literal values as written
+            skeleton.append(text)
+    return Tokens(tuple(skeleton), tuple(values))
+
+
+@functools.lru_cache(maxsize=256)
+def minhash(skeleton: Tuple[str, ...]) -> Tuple[int, ...]:
+    """MinHash signature over SHINGLE_SIZE-token shingles of the skeleton."""
+    # The index lives in one process, so the built-in (seeded) tuple hash is enough
+    if len(skeleton) <= SHINGLE_SIZE:
+        hashes = {hash(skeleton) & _HASH_MASK}
+    else:
+        hashes = {hash(skeleton[i:i + SHINGLE_SIZE]) & _HASH_MASK for i in range(len(skeleton) - SHINGLE_SIZE + 1)}
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _MASKS)
+
+
+def _similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class Match(NamedTuple):
+    docstring: str
+    name: str                        # function the cached docstring was written for
+    similarity: float
+    substitutions: Optional[Dict[str, str]]   # set when the code differs only in local names
+
+
+class _Entry(NamedTuple):
+    scope: str
+    name: str
+    signature: Tuple[int, ...]
+    skeleton_digest: str
+    values: Tuple[str, ...]
+    docstring: str
+
+
+class SimilarityIndex:
+    """
+    In-memory LSH index of generated docstrings keyed by code shape.
+
+    Entries are grouped by `scope` (language, format, model, prompt
+    version) and bounded to `max_entries`, least recently used first out.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_entries: int = SIMILARITY_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[int]] = {}
+        self._shapes: Dict[Tuple[str, str], int] = {}      # (scope, skeleton digest) -> entry id
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bands(self, scope: str, signature: Tuple[int, ...]):
+        for band in range(BANDS):
+            yield scope, band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def add(self, scope: str, name: str, code: str, docstring: str) -> None:
+        tokens = tokenize(code)
+        if not tokens.skeleton or not docstring:
+            return
+        digest = _digest(tokens.skeleton)
+        existing = self._shapes.get((scope, digest))
+        if existing is not None:
+            # Same shape already indexed: later lookups reuse that one
+            self._entries.move_to_end(existing)
+            return
+        entry = _Entry(scope, name, minhash(tokens.skeleton), digest, tokens.values, docstring)
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        self._shapes[(scope, digest)] = entry_id
+        for band in self._bands(scope, entry.signature):
+            self._buckets.setdefault(band, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            old_id, old = self._entries.popitem(last=False)
+            if self._shapes.get((old.scope, old.skeleton_digest)) == old_id:
+                del self._shapes[(old.scope, old.skeleton_digest)]
+            for band in self._bands(old.scope, old.signature):
+                bucket = self._buckets.get(band)
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self._buckets[band]
+
+    def lookup(self, scope: str, name: str, code: str) -> Optional[Match]:
+        """Most similar entry at or above the threshold, or None."""
+        tokens = tokenize(code)
+        if not tokens.skeleton or not self._entries:
+            return None
+
+        # Exact shape first: no signature needed
+        digest = _digest(tokens.skeleton)
+        same_shape = self._shapes.get((scope, digest))
+        if same_shape is not None:
+            entry = self._entries[same_shape]
+            substitutions = _substitutions(entry.values, tokens.values)
+            if substitutions is not None:
+                self._entries.move_to_end(same_shape)
+                return Match(entry.docstring, entry.name, 1.0, substitutions)
+
+        signature = minhash(tokens.skeleton)
+
+        candidates: Set[int] = set()
+        for band in self._bands(scope, signature):
+            candidates |= self._buckets.get(band, set())
+
+        best_id, best = None, 0.0
+        for entry_id in candidates:
+            score = _similarity(signature, self._entries[entry_id].signature)
+            if score > best:
+                best_id, best = entry_id, score
+        if best_id is None or best < self.threshold:
+            return None
+
+        self._entries.move_to_end(best_id)
+        entry = self._entries[best_id]
+        substitutions = None
+        if entry.skeleton_digest == digest:
+            substitutions = _substitutions(entry.values, tokens.values)
+        return Match(entry.docstring, entry.name, best, substitutions)
+
+
+def _digest(skeleton: Tuple[str, ...]) -> str:
+    return hashlib.blake2b("\0".join(skeleton).encode(), digest_size=16).hexdigest()
+
+
+def _substitutions(old: Tuple[str, ...], new: Tuple[str, ...]) -> Optional[Dict[str, str]]:
+    """
+    Renames that turn `old` into `new` position by position, or None if a
+    name would have to map to two different names.
+    """
+    mapping: Dict[str, str] = {}
+    for before, after in zip(old, new):
+        if mapping.setdefault(before, after) != after:
+            return None
+    return {before: after for before, after in mapping.items() if before != after}
+
+
+def _words(identifier: str) -> List[str]:
+    return [part.lower() for chunk in identifier.split("_") for part in _CAMEL_PART.findall(chunk)]
+
+
+def substitute(docstring: str, substitutions: Dict[str, str]) -> str:
+    """
+    Apply identifier renames to a docstring: whole identifiers first, then
+    the words they are made of (get_user -> get_order also turns "user"
+    into "order", keeping capitalization).
+    """
+    if not substitutions:
+        return docstring
+
+    text = docstring
+    names = sorted((name for name in substitutions if len(name) > 1), key=len, reverse=True)
+    if names:
+        pattern = re.compile(r"(?<![\w$])(" + "|".join(re.escape(name) for name in names) + r")(?![\w$])")
+        text = pattern.sub(lambda m: substitutions[m.group(1)], text)
+
+    # One-letter names ("a", "x") read like prose; only rename them where
+    # they are clearly parameters: `x`, @param x, "x (int):" or "x:"
+    for name in (name for name in substitutions if len(name) == 1):
+        new = substitutions[name].replace("\\", "\\\\")
+        name = re.escape(name)
+        text = re.sub(rf"(?<=`){name}(?=`)", new, text)
+        text = re.sub(rf"(?<=@param ){name}(?![\w$])", new, text)
+        text = re.sub(rf"^([ \t]*){name}(?=\s*[(:])", rf"\g<1>{new}", text, flags=re.MULTILINE)
+
+    words: Dict[str, str] = {}
+    for before, after in substitutions.items():
+        old_words, new_words = _words(before), _words(after)
+        if len(old_words) != len(new_words):
+            continue
+        for old_word, new_word in zip(old_words, new_words):
+            if old_word != new_word and len(old_word) >= 3 and words.setdefault(old_word, new_word) != new_word:
+                words[old_word] = old_word          # ambiguous: leave it alone
+    words = {old_word: new_word for old_word, new_word in words.items() if old_word != new_word}
+    if not words:
+        return text
+
+    def replace_word(match: "re.Match") -> str:
+        # group(1) is the word, group(2) an optional plural "s"
+        word = match.group(1)
+        new_word = words[word.lower()]
+        if word.isupper():
+            new_word = new_word.upper()
+        elif word[0].isupper():
+            new_word = new_word[0].upper() + new_word[1:]
+        return new_word + match.group(2)
+
+    word_pattern = re.compile(r"\b(" + "|".join(re.escape(word) for word in words) + r")(s?)\b", re.IGNORECASE)
+    return word_pattern.sub(replace_word, text)
+
+
+# Shared by every request in this process
+similarity_index: Optional[SimilarityIndex] = SimilarityIndex() if SIMILAR_CACHE else None
@@ -0,0 +1,252 @@
+# parse-once source index shared by extraction, slicing and insertion
+import ast
+import re
+from array import array
+from typing import List, Optional, Tuple
+
+from app.utils import (
+    FunctionInfo,
+    annotation_start,
+    doc_comment_start,
+    extract_functions_and_classes,
+    extract_python_functions,
+    normalize_python_source,
+)
+
+# Same separators as str.splitlines(), so offsets and lines stay aligned
+_LINE_BREAK = re.compile("\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+# (replace_from, replace_to, new_lines): 0-based line indices, end-exclusive
+Edit = Tuple[int, int, List[str]]
+
+BLOCK_COMMENT_LANGUAGES = {"javascript", "typescript", "java", "c", "c++", "cpp"}
+
+
+class SourceDocument:
+    """
+    One source file, indexed once per request.
+
+    - `source` is the text everything refers to (for Python, the
+      normalized source that was actually parsed).
+    - `lines` and a compact line-offset index are built once; slicing a
+      function is a single string slice.
+    - The function list is built lazily. With `parse=False` the Python
+      source is not parsed up front either, so a document created only to
+      insert docstrings costs one line index.
+    """
+
+    __slots__ = ("language", "source", "lines", "_offsets", "_tree", "_functions")
+
+    def __init__(self, language: str, source: str, parse: bool = True):
+        self.language = language.lower()
+        self._tree = None
+        self._functions: Optional[List[FunctionInfo]] = None
+
+        if parse and self.language == "python":
+            try:
+                self._tree = ast.parse(source)
+            except SyntaxError:
+                source = normalize_python_source(source)
+
+        self.source = source
+        self.lines = source.splitlines()
+
+        offsets = array("q", [0])
+        offsets.extend(m.end() for m in _LINE_BREAK.finditer(source))
+        if offsets[-1] != len(source):
+            offsets.append(len(source))
+        self._offsets = offsets
+
+    # ---------------------------
+    # Parsing
+    # ---------------------------
+    @property
+    def tree(self):
+        """Python AST of `source` (None for other languages)."""
+        if self._tree is None and self.language == "python":
+            self._tree = ast.parse(self.source)
+        return self._tree
+
+    @property
+    def functions(self) -> List[FunctionInfo]:
+        if self._functions is None:
+            if self.language == "python":
+                self._functions = extract_python_functions(self.source, tree=self.tree)
+            else:
+                self._functions = extract_functions_and_classes(self.language, self.source)
+        return self._functions
+
+    # ---------------------------
+    # Slicing
+    # ---------------------------
+    def line_span(self, first: int, last: int) -> str:
+        """Text of 1-based lines first..last (inclusive) without the final line break."""
+        last = min(last, len(self.lines))
+        if first < 1 or last < first:
+            return ""
+        return self.source[self._offsets[first - 1]:self._offsets[last]].rstrip("\r\n")
+
+    def segment(self, info: FunctionInfo) -> str:
+        """Source text sent to the model for one function."""
+        if self.language == "python":
+            node = info.node
+            if node is None or getattr(node, "end_lineno", None) is None:
+                return self.line_span(info.start or 0, info.end or info.start or 0)
+
+            begin = self._offsets[node.lineno - 1] + self._char_col(node.lineno, node.col_offset)
+            finish = self._offsets[node.end_lineno - 1] + self._char_col(node.end_lineno, node.end_col_offset)
+            return self.source[begin:finish]
+
+        if info.start and info.end:
+            return self.line_span(info.start, info.end)
+        if info.start:
+            return self.line_span(info.start, info.start)
+        return ""
+
+    def _char_col(self, lineno: int, byte_col: int) -> int:
+        # ast columns are UTF-8 byte offsets
+        line = self.lines[lineno - 1]
+        if line.isascii():
+            return byte_col
+        return len(line.encode("utf-8")[:byte_col].decode("utf-8", errors="ignore"))
+
+    # ---------------------------
+    # Insertion
+    # ---------------------------
+    def docstring_edits(self, updates: List[Tuple[int, int, str]]) -> List[Edit]:
+        """
+        Line edits that insert generated documentation, sorted and non-overlapping.
+
+        Python:
+        - Inserts (or replaces) the docstring inside the function/class body.
+
+        JavaScript / TypeScript / Java / C / C++:
+        - Inserts a block comment above the function and its annotations,
+          replacing an existing doc comment there.
+        """
+        lines = self.lines
+        edits: List[Edit] = []
+
+        for start, end, doctext in updates:
+            if not doctext or not start or start > len(lines):
+                continue
+
+            def_line = lines[start - 1]
+            base_indent = def_line[: len(def_line) - len(def_line.lstrip())]
+
+            if self.language in BLOCK_COMMENT_LANGUAGES:
+                doc_lines = [
+                    base_indent + line.strip() if line.strip() else ""
+                    for line in doctext.strip().splitlines()
+                ]
+                anchor = annotation_start(lines, start - 1)
+                edits.append((doc_comment_start(lines, anchor), anchor, doc_lines))
+                continue
+
+            indent = base_indent + "    "
+            clean_doc = doctext.strip().replace('"""', '\\"""')
+
+            if clean_doc.startswith('"""') and clean_doc.endswith('"""'):
+                doc_lines = [
+                    indent + line.strip() if line.strip() else ""
+                    for line in clean_doc.splitlines()
+                ]
+            else:
+                doc_lines = f'{indent}"""{clean_doc}"""'.splitlines()
+
+            next_idx = start
+            quote = lines[next_idx].lstrip()[:3] if next_idx < len(lines) else ""
+            if quote in ('"""', "'''"):
+                j = next_idx
+                first = lines[next_idx].strip()
+                if len(first) >= 6 and first.endswith(quote):
+                    # One-line docstring
+                    edits.append((next_idx, next_idx + 1, doc_lines))
+                    continue
+                while j < len(lines):
+                    if lines[j].rstrip().endswith(quote) and j != next_idx:
+                        break
+                    j += 1
+                edits.append((next_idx, j + 1, doc_lines))
+            else:
+                edits.append((next_idx, next_idx, doc_lines))
+
+        edits.sort(key=lambda edit: edit[0])
+
+        clipped: List[Edit] = []
+        pos = 0
+        for replace_from, replace_to, doc_lines in edits:
+            replace_from = max(replace_from, pos)
+            replace_to = max(replace_from, replace_to)
+            clipped.append((replace_from, replace_to, doc_lines))
+            pos = replace_to
+        return clipped
+
+    def apply_docstrings(self, updates: List[Tuple[int, int, str]]) -> str:
+        """Insert generated documentation in one linear rebuild."""
+        lines = self.lines
+        out: List[str] = []
+        pos = 0
+        for replace_from, replace_to, doc_lines in self.docstring_edits(updates):
+            out.extend(lines[pos:replace_from])
+            out.extend(doc_lines)
+            pos = replace_to
+        out.extend(lines[pos:])
+
+        return "\n".join(out)
+
+    def patches(self, updates: List[Tuple[int, int, str]]) -> List[dict]:
+        """
+        Edits as hunks against the original lines: replace `delete_lines`
+        lines starting at 1-based `start_line` with `text` (0 deletes means
+        insert before that line). Hunks are sorted; apply them bottom-up.
+        """
+        return [
+            {"start_line": replace_from + 1, "delete_lines": replace_to - replace_from, "text": "\n".join(doc_lines)}
+            for replace_from, replace_to, doc_lines in self.docstring_edits(updates)
+        ]
+
+    def unified_diff(self, updates: List[Tuple[int, int, str]], path: str = "source", context: int = 3) -> str:
+        """
+        Unified diff of the edits, built straight from the edit list (no
+        line matching), so it stays linear in the size of the hunks.
+        """
+        lines = self.lines
+        edits = self.docstring_edits(updates)
+        if not edits:
+            return ""
+
+        # Group edits whose context windows touch
+        groups: List[List[Edit]] = []
+        for edit in edits:
+            if groups and edit[0] - context <= groups[-1][-1][1] + context:
+                groups[-1].append(edit)
+            else:
+                groups.append([edit])
+
+        out = [f"--- a/{path}", f"+++ b/{path}"]
+        delta = 0
+        for group in groups:
+            old_begin = max(0, group[0][0] - context)
+            old_end = min(len(lines), group[-1][1] + context)
+            body: List[str] = []
+            pos = old_begin
+            added = removed = 0
+            for replace_from, replace_to, doc_lines in group:
+                body.extend(" " + line for line in lines[pos:replace_from])
+                body.extend("-" + line for line in lines[replace_from:replace_to])
+                body.extend("+" + line for line in doc_lines)
+                removed += replace_to - replace_from
+                added += len(doc_lines)
+                pos = replace_to
+            body.extend(" " + line for line in lines[pos:old_end])
+
+            old_len = old_end - old_begin
+            new_len = old_len - removed + added
+            old_start = old_begin + 1 if old_len else old_begin
+            new_start = old_begin + delta + 1 if new_len else old_begin + delta
+            out.append(f"@@ -{old_start},{old_len} +{new_start},{new_len} @@")
+            out.extend(body)
+            delta += added - removed
+
+        return "\n".join(out) + "\n"
@@ -0,0 +1,63 @@
+# streamed completions: stop sequences and end-of-docstring detection
+import os
+from typing import List, Tuple
+
+# "0" waits for whole completions instead of streaming them
+STREAM_COMPLETIONS = os.getenv("STREAM_COMPLETIONS", "1") != "0"
+
+# A docstring can only end, or gain a line, on a piece containing one of these
+END_CHARACTERS = frozenset("\n/`\"'")
+
+_FENCE = "```"
+_QUOTES = ('"""', "'''")
+
+
+def stop_sequences(language: str) -> List[str]:
+    """
+    Server-side stop sequences for one docstring: a closing markdown fence
+    or, for Python, closing triple quotes on their own line, each followed
+    by more output. Nothing the docstring needs comes after them. A
+    comment's `*/` must stay in the text, so `trim_docstring` detects it.
+    """
+    if language.lower() == "python":
+        return [f"\n{_FENCE}\n", '\n"""\n', "\n'''\n"]
+    return [f"\n{_FENCE}\n"]
+
+
+def trim_docstring(language: str, text: str) -> Tuple[str, bool]:
+    """
+    (docstring, complete) for model output received so far.
+
+    Drops an opening markdown fence and, for Python, surrounding triple
+    quotes; everything after the end of the docstring (closing quotes,
+    `*/`, a closing fence) is cut off. `complete` is True once such an end
+    was seen, so the rest of the stream can be dropped.
+    """
+    body = text.lstrip()
+    if body.startswith(_FENCE):
+        newline = body.find("\n")
+        if newline < 0:
+            return "", False
+        body = body[newline + 1:]
+
+    complete = False
+    fence = body.find(_FENCE)
+    if fence >= 0:
+        body, complete = body[:fence], True
+
+    if language.lower() == "python":
+        for quote in _QUOTES:
+            if body.startswith(quote):
+                body = body[len(quote):]
+                break
+        for quote in _QUOTES:
+            end = body.find(quote)
+            if end >= 0:
+                body, complete = body[:end], True
+    else:
+        start = body.find("/*")
+        end = body.find("*/", start + 2) if start >= 0 else -1
+        if end >= 0:
+            body, complete = body[start:end + 2], True
+
+    return body.strip(), complete
@@ -0,0 +1,466 @@
+# rule-based docstrings for trivial functions (getters, setters, dunders, wrappers); no model call
+import ast
+import os
+import re
+import textwrap
+from typing import List, NamedTuple, Optional, Sequence
+
+from app.prompting import CalleeSummary
+
+# Functions with at most this many statements (docstring excluded) are
+# candidates; 0 disables the template path
+TEMPLATE_MAX_STATEMENTS = int(os.getenv("TEMPLATE_MAX_STATEMENTS", "1"))
+
+
+class TemplateDoc(NamedTuple):
+    kind: str          # rule that matched (getter, setter, dunder, delegate, ...)
+    docstring: str     # raw docstring, same shape as model output
+
+
+class _Param(NamedTuple):
+    name: str
+    type: Optional[str]
+    default: Optional[str]
+
+
+class _Doc(NamedTuple):
+    kind: str
+    summary: str
+    params: List[_Param]
+    returns: Optional[str]             # description; None when nothing is returned
+    return_type: Optional[str]
+    raises: Optional[str]
+    extra: Optional[str] = None        # second paragraph
+
+
+def template_docstring(
+    language: str,
+    function_format: str,
+    function_name: str,
+    code: str,
+    callees: Optional[Sequence[CalleeSummary]] = None,
+    max_statements: int = TEMPLATE_MAX_STATEMENTS,
+) -> Optional[TemplateDoc]:
+    """Docstring for `code` if it is trivial enough to need no model call, else None."""
+    if max_statements <= 0:
+        return None
+
+    if language.lower() == "python":
+        doc = _python_doc(code, max_statements, callees)
+        if doc is None:
+            return None
+        return TemplateDoc(doc.kind, _render_python(doc, function_format))
+
+    doc = _brace_doc(language.lower(), function_name, code, max_statements)
+    if doc is None:
+        return None
+    return TemplateDoc(doc.kind, _render_comment(doc, function_format))
+
+
+def parameter_names(language: str, code: str) -> List[str]:
+    """Names of the parameters a docstring for `code` should mention (empty for classes or when unknown)."""
+    if language.lower() == "python":
+        try:
+            tree = ast.parse(textwrap.dedent(code))
+        except SyntaxError:
+            return []
+        if not tree.body or not isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return []
+        return [param.name.lstrip("*") for param in _python_params(tree.body[0].args)]
+
+    open_brace = code.find("{")
+    header = code[:open_brace] if open_brace >= 0 else code
+    paren = header.find("(")
+    close_paren = _matching_paren(header, paren) if paren >= 0 else None
+    if close_paren is None:
+        return []
+    params = _brace_params(language.lower(), header[paren + 1:close_paren])
+    # Destructured and rest patterns have no single name to look for
+    return [param.name for param in params if _IDENTIFIER.fullmatch(param.name)]
+
+
+# -------------------------------
+# Naming helpers
+# -------------------------------
+_IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+_CAMEL_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+_DUNDERS = {
+    "__repr__": ("Return the developer-facing representation of the object.", "str"),
+    "__str__": ("Return the readable string form of the object.", "str"),
+    "__len__": ("Return the number of items.", "int"),
+    "__hash__": ("Return the hash of the object.", "int"),
+    "__bool__": ("Return whether the object is truthy.", "bool"),
+    "__eq__": ("Return whether the object equals `other`.", "bool"),
+    "__ne__": ("Return whether the object differs from `other`.", "bool"),
+    "__lt__": ("Return whether the object sorts before `other`.", "bool"),
+    "__contains__": ("Return whether `item` is contained in the object.", "bool"),
+    "__iter__": ("Return an iterator over the items.", None),
+    "__enter__": ("Enter the runtime context.", None),
+    "__exit__": ("Exit the runtime context.", None),
+    "__getitem__": ("Return the item for `key`.", None),
+    "__setitem__": ("Set the item for `key`.", None),
+    "__delitem__": ("Delete the item for `key`.", None),
+    "__call__": ("Call the object.", None),
+}
+
+
+def _words(name: str) -> str:
+    parts = [part.lower() for chunk in name.strip("_").split("_") for part in _CAMEL_PART.findall(chunk)]
+    return " ".join(parts) or name
+
+
+def _attribute_words(name: str, prefixes: Sequence[str] = ()) -> str:
+    words = _words(name).split()
+    if len(words) > 1 and words[0] in prefixes:
+        words = words[1:]
+    return " ".join(words)
+
+
+def _describe(param: _Param) -> str:
+    return f"The {_words(param.name)}."
+
+
+# -------------------------------
+# Python
+# -------------------------------
+def _python_doc(code: str, max_statements: int, callees: Optional[Sequence[CalleeSummary]]) -> Optional[_Doc]:
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        return None
+    if not tree.body or not isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+
+    node = tree.body[0]
+    body = list(node.body)
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        body = body[1:]
+    if len(body) > max_statements or any(isinstance(stmt, (ast.If, ast.For, ast.While, ast.With, ast.Try))
+                                         for stmt in body):
+        return None
+
+    params = _python_params(node.args)
+    return_type = ast.unparse(node.returns) if node.returns is not None else None
+    decorators = [ast.unparse(d) for d in node.decorator_list]
+    name = node.name
+    returns = [stmt for stmt in ast.walk(node) if isinstance(stmt, ast.Return) and stmt.value is not None]
+
+    def doc(kind, summary, returns_desc=None, rtype=return_type, raises=None, extra=None) -> _Doc:
+        return _Doc(kind, summary, params, returns_desc if returns else None, rtype, raises, extra)
+
+    # Property getters / setters
+    if "property" in decorators or "cached_property" in decorators or "functools.cached_property" in decorators:
+        attr = _self_attribute(returns[0].value) if returns else None
+        return _Doc("property", f"The {_words(attr or name)}.", [], None, None, None)
+    if any(d.endswith(".setter") for d in decorators):
+        return _Doc("setter", f"Set the {_words(name)}.", params, None, None, None)
+
+    if name == "__init__" and all(_stores_param(s, params) or _is_noop(s) for s in body):
+        return _Doc("init", "Initialize the object.", params, None, None, None)
+
+    if name in _DUNDERS:
+        summary, rtype = _DUNDERS[name]
+        if params:
+            # The table names the first parameter `other`/`item`/`key`
+            summary = re.sub(r"`\w+`", f"`{params[0].name}`", summary)
+        described = summary[len("Return "):] if summary.startswith("Return ") else "The result."
+        return doc("dunder", summary, rtype=return_type or rtype, returns_desc=described[0].upper() + described[1:])
+
+    if not body or all(_is_noop(stmt) for stmt in body):
+        if "abstractmethod" in decorators or "abc.abstractmethod" in decorators:
+            return doc("abstract", f"Abstract `{name}` hook, implemented by subclasses.")
+        # Segments start at the def line, so a missing decorator does not
+        # prove this is a real no-op (protocol/abstract stubs look the same)
+        return None
+
+    stmt = body[0]
+    if len(body) == 1 and _raises_not_implemented(stmt):
+        return doc("abstract", f"Abstract `{name}` hook, implemented by subclasses.",
+                   raises="NotImplementedError: Always; subclasses must override this method.")
+
+    if isinstance(stmt, ast.Assign) and len(body) == 1 and len(params) == 1 and _stores_param(stmt, params):
+        attr = _self_attribute(stmt.targets[0])
+        return _Doc("setter", f"Set the {_words(attr)}.", params, None, None, None)
+
+    if isinstance(stmt, ast.Return) and stmt.value is not None and len(body) == 1:
+        value = stmt.value
+        attr = _self_attribute(value)
+        if attr is not None and not params:
+            words = _words(attr)
+            return doc("getter", f"Return the {words}.", returns_desc=f"The {words}.")
+        if isinstance(value, ast.Constant):
+            rtype = return_type or (type(value.value).__name__ if value.value is not None else None)
+            return doc("constant", f"Return {value.value!r}.", returns_desc=f"Always {value.value!r}.", rtype=rtype)
+        if isinstance(value, ast.Call) and _passes_params_through(value, params):
+            target = ast.unparse(value.func)
+            callee = next((c for c in callees or () if c.name == target.split(".")[-1] and c.summary), None)
+            if callee is not None:
+                return doc("delegate", callee.summary, returns_desc=f"The result of `{target}`.",
+                           extra=f"Delegates to `{target}`.")
+            return doc("delegate", f"Delegate to `{target}`.", returns_desc=f"The result of `{target}`.")
+    return None
+
+
+def _python_params(args: ast.arguments) -> List[_Param]:
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    params = []
+    for arg, default in zip(positional, defaults):
+        params.append(_param(arg, default))
+    if args.vararg:
+        params.append(_Param("*" + args.vararg.arg, _annotation(args.vararg), None))
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        params.append(_param(arg, default))
+    if args.kwarg:
+        params.append(_Param("**" + args.kwarg.arg, _annotation(args.kwarg), None))
+    return [param for param in params if param.name not in ("self", "cls")]
+
+
+def _param(arg: ast.arg, default: Optional[ast.expr]) -> _Param:
+    return _Param(arg.arg, _annotation(arg), ast.unparse(default) if default is not None else None)
+
+
+def _annotation(arg: ast.arg) -> Optional[str]:
+    return ast.unparse(arg.annotation) if arg.annotation is not None else None
+
+
+def _self_attribute(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in ("self", "cls"):
+        return node.attr
+    return None
+
+
+def _is_noop(stmt: ast.stmt) -> bool:
+    return isinstance(stmt, ast.Pass) or (
+        isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and stmt.value.value is Ellipsis
+    )
+
+
+def _raises_not_implemented(stmt: ast.stmt) -> bool:
+    if not isinstance(stmt, ast.Raise) or stmt.exc is None:
+        return False
+    exc = stmt.exc.func if isinstance(stmt.exc, ast.Call) else stmt.exc
+    return isinstance(exc, ast.Name) and exc.id == "NotImplementedError"
+
+
+def _stores_param(stmt: ast.stmt, params: List[_Param]) -> bool:
+    """`self.x = x` (or an annotated equivalent) for one of the parameters."""
+    if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1:
+        target, value = stmt.targets[0], stmt.value
+    elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+        target, value = stmt.target, stmt.value
+    else:
+        return False
+    names = {param.name for param in params}
+    return _self_attribute(target) is not None and isinstance(value, ast.Name) and value.id in names
+
+
+def _passes_params_through(call: ast.Call, params: List[_Param]) -> bool:
+    """The call receives exactly the function's parameters (a thin wrapper)."""
+    passed = [arg.value.id if isinstance(arg, ast.Starred) and isinstance(arg.value, ast.Name) else
+              getattr(arg, "id", None) for arg in call.args]
+    passed += [kw.arg or getattr(kw.value, "id", None) for kw in call.keywords]
+    wanted = [param.name.lstrip("*") for param in params]
+    return None not in passed and sorted(passed) == sorted(wanted)
+
+
+def _render_python(doc: _Doc, function_format: str) -> str:
+    lines = [doc.summary]
+    if doc.extra:
+        lines += ["", doc.extra]
+    fmt = function_format.lower()
+
+    if fmt == "numpy":
+        if doc.params:
+            lines += ["", "Parameters", "----------"]
+            for param in doc.params:
+                kind = param.type or ""
+                if param.default is not None:
+                    kind = f"{kind}, optional" if kind else "optional"
+                lines.append(f"{param.name} : {kind}" if kind else param.name)
+                default = f" Defaults to {param.default}." if param.default is not None else ""
+                lines.append(f"    {_describe(param)}{default}")
+        if doc.returns:
+            lines += ["", "Returns", "-------", doc.return_type or "object", f"    {doc.returns}"]
+        if doc.raises:
+            exc, _, why = doc.raises.partition(": ")
+            lines += ["", "Raises", "------", exc, f"    {why}"]
+        return "\n".join(lines)
+
+    if fmt == "pep-257":
+        if doc.params:
+            lines += ["", "Arguments:"]
+            for param in doc.params:
+                default = f" (default {param.default})" if param.default is not None else ""
+                lines.append(f"{param.name} -- {_describe(param)[:-1].lower()}{default}")
+        return "\n".join(lines)
+
+    # Google
+    if doc.params:
+        lines += ["", "Args:"]
+        for param in doc.params:
+            kind = f" ({param.type})" if param.type else ""
+            default = f" Defaults to {param.default}." if param.default is not None else ""
+            lines.append(f"    {param.name}{kind}: {_describe(param)}{default}")
+    if doc.returns:
+        kind = f"{doc.return_type}: " if doc.return_type else ""
+        lines += ["", "Returns:", f"    {kind}{doc.returns}"]
+    if doc.raises:
+        lines += ["", "Raises:", f"    {doc.raises}"]
+    return "\n".join(lines)
+
+
+# -------------------------------
+# Brace languages (JavaScript, TypeScript, Java, C, C++)
+# -------------------------------
+_MODIFIERS = {
+    "public", "private", "protected", "static", "final", "abstract", "synchronized", "native", "inline",
+    "virtual", "explicit", "constexpr", "extern", "async", "export", "default", "function", "override",
+    "readonly", "get", "set",
+}
+_LITERAL = re.compile(r"""^(-?\d[\w.]*|"[^"]*"|'[^']*'|true|false|null|nullptr|undefined|NULL)$""")
+_MEMBER = r"(?:this\s*(?:\.|->)\s*)?([A-Za-z_$][\w$]*)"
+
+
+def _brace_doc(language: str, function_name: str, code: str, max_statements: int) -> Optional[_Doc]:
+    open_brace = code.find("{")
+    close_brace = code.rfind("}")
+    paren = code.find("(")
+    if open_brace < 0 or close_brace < open_brace or paren < 0 or paren > open_brace:
+        return None
+
+    body = code[open_brace + 1:close_brace]
+    if "{" in body or "/*" in body or "//" in body:
+        return None
+    statements = [s.strip() for s in body.split(";") if s.strip()]
+    if len(statements) > max_statements:
+        return None
+
+    header = code[:open_brace]
+    close_paren = _matching_paren(header, paren)
+    if close_paren is None:
+        return None
+    params = _brace_params(language, header[paren + 1:close_paren])
+    return_type = _brace_return_type(language, header[:paren], header[close_paren + 1:])
+    name = function_name.split(".")[-1]
+    accessor = re.search(r"\b(get|set)\s+[\w$]+\s*$", header[:paren])
+    verb = accessor.group(1) if accessor else (_words(name).split() or [""])[0]
+
+    def doc(kind, summary, returns=None) -> _Doc:
+        return _Doc(kind, summary, params, returns if return_type != "void" else None, return_type, None)
+
+    if not statements:
+        if return_type is None and name and name[0].isupper():
+            return doc("constructor", f"Create a {_words(name)}.")
+        return doc("noop", "Do nothing.")
+
+    stmt = statements[0]
+    returned = re.fullmatch(r"return\s+(.+)", stmt, flags=re.S)
+    if returned:
+        value = returned.group(1).strip()
+        member = re.fullmatch(_MEMBER, value)
+        if member and not params and verb in ("get", "is", "has"):
+            if verb in ("is", "has"):
+                words = _attribute_words(name, ("is", "has"))
+                return doc("getter", f"Return whether it {'is' if verb == 'is' else 'has'} {words}.",
+                           f"Whether it {'is' if verb == 'is' else 'has'} {words}.")
+            words = _attribute_words(member.group(1).rstrip("_"))
+            return doc("getter", f"Return the {words}.", f"The {words}.")
+        if _LITERAL.match(value):
+            return doc("constant", f"Return {value}.", f"Always {value}.")
+        return None
+
+    assigned = re.fullmatch(_MEMBER + r"\s*=\s*([A-Za-z_$][\w$]*)", stmt)
+    if assigned and len(params) == 1 and assigned.group(2) == params[0].name and verb == "set":
+        return doc("setter", f"Set the {_attribute_words(assigned.group(1).rstrip('_'))}.")
+    return None
+
+
+def _matching_paren(text: str, start: int) -> Optional[int]:
+    depth = 0
+    for pos in range(start, len(text)):
+        if text[pos] == "(":
+            depth += 1
+        elif text[pos] == ")":
+            depth -= 1
+            if depth == 0:
+                return pos
+    return None
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char in "<([{":
+            depth += 1
+        elif char in ">)]}":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _brace_params(language: str, text: str) -> List[_Param]:
+    params = []
+    for part in _split_top_level(text):
+        if part == "void":
+            continue
+        part, _, default = part.partition("=")
+        part, default = part.strip(), default.strip() or None
+        if language in ("javascript", "typescript"):
+            name, _, kind = part.partition(":")
+            name = name.strip().lstrip(".").rstrip("?")
+            params.append(_Param(name, kind.strip() or None, default))
+            continue
+        match = re.search(r"([A-Za-z_$][\w$]*)\s*(\[\s*\])*$", part)
+        if not match:
+            return []
+        kind = part[:match.start(1)].strip() + ("[]" if match.group(2) else "")
+        params.append(_Param(match.group(1), kind or None, default))
+    return params
+
+
+def _brace_return_type(language: str, before: str, after: str) -> Optional[str]:
+    if language in ("javascript", "typescript"):
+        match = re.match(r"\s*:\s*([^{=]+)", after)
+        return match.group(1).strip() if match else None
+
+    words = [w for w in re.split(r"\s+", before.strip()) if w and w not in _MODIFIERS]
+    if len(words) < 2:
+        return None         # constructor (or a name without a type)
+    return " ".join(words[:-1])
+
+
+def _render_comment(doc: _Doc, function_format: str) -> str:
+    fmt = function_format.lower()
+    summary = f"@brief {doc.summary}" if fmt == "doxygen" else doc.summary
+    lines = [summary]
+    if doc.params or doc.returns:
+        lines.append("")
+    for param in doc.params:
+        description = _describe(param)
+        if param.default is not None:
+            description += f" Defaults to {param.default}."
+        if fmt == "jsdoc":
+            kind = f"{{{param.type}}} " if param.type else ""
+            lines.append(f"@param {kind}{param.name} - {description}")
+        elif fmt == "tsdoc":
+            lines.append(f"@param {param.name} - {description}")
+        else:
+            lines.append(f"@param {param.name} {description}")
+    if doc.returns:
+        if fmt == "jsdoc":
+            kind = f"{{{doc.return_type}}} " if doc.return_type else ""
+            lines.append(f"@returns {kind}{doc.returns}")
+        elif fmt == "tsdoc":
+            lines.append(f"@returns {doc.returns}")
+        else:
+            lines.append(f"@return {doc.returns}")
+    return "/**\n" + "\n".join(f" * {line}".rstrip() for line in lines) + "\n */"
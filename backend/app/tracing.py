@@ -0,0 +1,27 @@
+# optional OpenTelemetry spans (no-ops when opentelemetry-api is not installed)
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+_tracer = trace.get_tracer("doc_generator") if trace is not None else None
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """
+    Trace a block as a span named `name`.
+
+    Spans follow contextvars, so per-function spans created in pipeline
+    tasks nest under the request's span. Exporting is configured the usual
+    OpenTelemetry way (SDK / opentelemetry-instrument); without the package
+    this costs one function call.
+    """
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None}):
+        yield
@@ -1,36 +1,173 @@
 # helper functions (chunking, safety, function extraction)
 import ast
+import asyncio
+import codecs
+import importlib
+import mmap
+import os
 import re
+import tempfile
 import textwrap
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from fastapi import UploadFile
 
-# JS/TS
-import esprima
-# from py_sucrase import transform
-
-# Java
-import javalang
-
-# C/C++
-from clang.cindex import Index
+from app.callgraph import link_python_calls
 
 import logging
 
 logger = logging.getLogger("utils")
 logger.setLevel(logging.INFO)
+# -------------------------------
+# Parser modules (imported on first use)
+# -------------------------------
+# esprima alone takes ~0.5s to import; Python-only traffic never needs it.
+# C/C++ use the built-in tokenizer below (no libclang).
+PARSER_MODULES = {
+    "javascript": ("esprima",),
+    "typescript": ("esprima",),
+    "java": ("javalang", "javalang.tree"),
+}
+
+
+def preload_parsers(languages: Iterable[str]) -> List[str]:
+    """
+    Import the parser modules for `languages` ("all" for every language)
+    now instead of on the first request; returns the modules loaded.
+    """
+    wanted = {language.strip().lower() for language in languages if language.strip()}
+    if "all" in wanted:
+        wanted = set(PARSER_MODULES)
+
+    loaded = []
+    for language in sorted(wanted):
+        for module in PARSER_MODULES.get(language, ()):
+            if module not in loaded:
+                importlib.import_module(module)
+                loaded.append(module)
+    return loaded
+
+
 # -------------------------------
 # Async file reading
 # -------------------------------
-async def extract_code_from_file(file: UploadFile) -> str:
-    content = await file.read()
-    return content.decode("utf-8", errors="ignore")
+# Uploaded source files above this size are rejected (HTTP 413)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+# Uploads above this size are decoded from a memory map of a file on disk
+UPLOAD_MMAP_BYTES = int(os.getenv("UPLOAD_MMAP_BYTES", str(1024 * 1024)))
+
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# UTF-32 before UTF-16: the UTF-32-LE BOM starts with the UTF-16-LE one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Bytes expected in source text; what bytes.translate() leaves are control characters
+_TEXT_BYTES = bytes(range(32, 256)) + b"\t\n\r\f\b\x1b"
+
+
+class UploadRejected(Exception):
+    """Upload that cannot be documented: too large (413) or not text (415)."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_encoding(head: bytes) -> str:
+    """
+    Encoding of a source file from its first bytes: a BOM, else UTF-8 if
+    they decode as such, else Latin-1. Raises UploadRejected (415) for
+    binary content (NUL bytes or mostly control characters).
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    if b"\0" in head or len(head.translate(None, _TEXT_BYTES)) * 10 > len(head):
+        raise UploadRejected("Upload looks like a binary file, not source code", 415)
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the chunk is fine
+        if e.reason != "unexpected end of data":
+            return "latin-1"
+    return "utf-8"
+
+
+async def extract_code_from_file(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """
+    Read and decode an uploaded source file in chunks.
+
+    Oversized uploads are rejected before reading when their size is
+    known, else as soon as the limit is crossed. Encoding and binary
+    content are detected from the first chunk. Large files are decoded
+    from a memory map of the upload's spool file (or of a spool file of
+    our own) instead of being joined in memory first.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejected(f"Upload is {file.size} bytes; the limit is {max_bytes}", 413)
+
+    head = await file.read(UPLOAD_CHUNK_BYTES)
+    if len(head) > max_bytes:
+        raise UploadRejected(f"Upload is larger than the {max_bytes} byte limit", 413)
+    encoding = sniff_encoding(head)
+
+    if file.size is not None and file.size > UPLOAD_MMAP_BYTES:
+        try:
+            file.file.fileno()
+        except (AttributeError, OSError):
+            pass
+        else:
+            # Starlette already spooled the upload to disk
+            return await asyncio.to_thread(_decode_mapped, file.file, encoding)
+
+    chunks = [head]
+    total = len(head)
+    spool = None
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadRejected(f"Upload is larger than the {max_bytes} byte limit", 413)
+            if spool is None and total > UPLOAD_MMAP_BYTES:
+                spool = tempfile.TemporaryFile()
+                spool.writelines(chunks)
+                chunks = []
+            if spool is not None:
+                spool.write(chunk)
+            else:
+                chunks.append(chunk)
+
+        if spool is None:
+            return b"".join(chunks).decode(encoding, errors="replace")
+        return await asyncio.to_thread(_decode_mapped, spool, encoding)
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+def _decode_mapped(fileobj, encoding: str) -> str:
+    fileobj.flush()
+    if os.fstat(fileobj.fileno()).st_size == 0:
+        return ""
+    with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return str(mapped, encoding, "replace")
 
 
 # -------------------------------
 # Function Info Container
 # -------------------------------
 class FunctionInfo:
+    __slots__ = ("name", "start", "end", "node", "existing_docstring", "generated_docstring", "calls")
+
     def __init__(
         self,
         name: str,
@@ -45,18 +182,21 @@ class FunctionInfo:
         self.node = node
         self.existing_docstring = existing_docstring
         self.generated_docstring: Optional[str] = None
+        # Start lines of same-file functions this one depends on (Python only)
+        self.calls: List[int] = []
 
 
 # -------------------------------
 # Python extractor (native)
 # -------------------------------
-def extract_python_functions(source: str) -> List[FunctionInfo]:
+def extract_python_functions(source: str, tree: Optional[ast.AST] = None) -> List[FunctionInfo]:
     res: List[FunctionInfo] = []
 
-    # 🔴 Normalize BEFORE ast.parse
-    source = normalize_python_source(source)
-
-    tree = ast.parse(source)
+    # Callers that already parsed the (normalized) source pass the tree
+    if tree is None:
+        # 🔴 Normalize BEFORE ast.parse
+        source = normalize_python_source(source)
+        tree = ast.parse(source)
 
     for node in ast.walk(tree):
         if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
@@ -68,6 +208,7 @@ def extract_python_functions(source: str) -> List[FunctionInfo]:
             res.append(FunctionInfo(name, start, end, node, existing_doc))
 
     res.sort(key=lambda x: (x.start if x.start else 0))
+    link_python_calls(tree, res)
     return res
 
 
@@ -120,9 +261,12 @@ def strip_typescript_types(source: str) -> str:
 
 
 def _extract_es_functions(source: str, is_typescript: bool = False) -> List[FunctionInfo]:
+    import esprima
+
     res: List[FunctionInfo] = []
 
     parse_source = strip_typescript_types(source) if is_typescript else source
+    lines = source.splitlines()
 
     try:
         tree = esprima.parseModule(parse_source, loc=True)
@@ -135,7 +279,7 @@ def _extract_es_functions(source: str, is_typescript: bool = False) -> List[Func
             name = getattr(node.id, "name", "<anonymous>")
             start = node.loc.start.line
             end = node.loc.end.line
-            res.append(FunctionInfo(name, start, end, node, None))
+            res.append(FunctionInfo(name, start, end, node, doc_comment_above(lines, start)))
 
     return res
 
@@ -144,103 +288,291 @@ def _extract_es_functions(source: str, is_typescript: bool = False) -> List[Func
 # Java extractor
 # -------------------------------
 def extract_java_functions(source: str) -> List[FunctionInfo]:
+    import javalang
+
     res: List[FunctionInfo] = []
     try:
-        tree = javalang.parse.parse(source)
+        tokens = list(javalang.tokenizer.tokenize(source))
+        tree = javalang.parser.Parser(tokens).parse_compilation_unit()
     except Exception:
         return res
 
-    for _, method in tree.filter(javalang.tree.MethodDeclaration):
+    lines = source.splitlines()
+    methods = [method for _, method in tree.filter(javalang.tree.MethodDeclaration)]
+    ends = _java_end_lines(tokens, {tuple(m.position) for m in methods if m.position})
+    for method in methods:
         start = method.position.line if method.position else None
-        res.append(FunctionInfo(method.name, start, None, method, None))
+        end = ends.get(tuple(method.position)) if method.position else None
+        doc = doc_comment_above(lines, start) if start else None
+        res.append(FunctionInfo(method.name, start, end, method, doc))
     return res
 
 
-# -------------------------------
-# C / C++ regex fallback extractor
-# -------------------------------
-def find_c_like_block_end(source: str, start_line: int) -> int:
+def _java_end_lines(tokens, starts: Set[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
     """
-    Find the ending line of a C/C++ function by counting braces.
-    start_line is 1-based.
+    Last line of each declaration starting at one of `starts` (line,
+    column): the line of the `}` closing the next `{`, or of the `;` ending
+    an abstract method. javalang only gives declarations a start.
     """
-    lines = source.splitlines()
-    brace_count = 0
-    found_opening_brace = False
+    ends: Dict[Tuple[int, int], int] = {}
+    pending: List[Tuple[int, int]] = []     # starts waiting for their `{` or `;`
+    opened: List[List[Tuple[int, int]]] = []
+
+    for token in tokens:
+        if token.value == "{":
+            opened.append(pending)
+            pending = []
+        elif token.value == "}":
+            for start in opened.pop() if opened else ():
+                ends[start] = token.position.line
+            pending = []
+        elif token.value == ";":
+            for start in pending:
+                ends[start] = token.position.line
+            pending = []
+        elif tuple(token.position) in starts:
+            pending.append(tuple(token.position))
+    return ends
 
-    for i in range(start_line - 1, len(lines)):
-        line = lines[i]
 
-        # Remove simple single-line comments
-        code_line = line.split("//")[0]
+# -------------------------------
+# Doc comments above declarations (JS / TS / Java)
+# -------------------------------
+def annotation_start(lines: List[str], def_idx: int) -> int:
+    """Index of the first annotation line (@Override, ...) directly above lines[def_idx]."""
+    while def_idx > 0 and lines[def_idx - 1].lstrip().startswith("@"):
+        def_idx -= 1
+    return def_idx
 
-        for char in code_line:
-            if char == "{":
-                brace_count += 1
-                found_opening_brace = True
-            elif char == "}":
-                brace_count -= 1
 
-                if found_opening_brace and brace_count == 0:
-                    return i + 1
+def doc_comment_start(lines: List[str], def_idx: int) -> int:
+    """
+    Index of the first line of a /** */ (or ///, //!) comment that ends
+    right above lines[def_idx]; def_idx itself if there is none.
+    """
+    j = def_idx - 1
+    if j < 0:
+        return def_idx
+
+    above = lines[j].strip()
+    if above.endswith("*/"):
+        # Only comment lines may sit between the opening /** and the definition
+        for k in range(j, -1, -1):
+            stripped = lines[k].lstrip()
+            if stripped.startswith(("/**", "/*!")):
+                return k
+            if not stripped.startswith("*"):
+                return def_idx  # plain block comment, or a comment after code
+        return def_idx
+
+    if above.startswith(("///", "//!")):
+        k = j
+        while k > 0 and lines[k - 1].lstrip().startswith(("///", "//!")):
+            k -= 1
+        return k
+
+    return def_idx
+
+
+def doc_comment_above(lines: List[str], start: int) -> Optional[str]:
+    """Text of the doc comment above 1-based line `start` (skipping annotations), if any."""
+    anchor = annotation_start(lines, start - 1)
+    first = doc_comment_start(lines, anchor)
+    if first == anchor:
+        return None
+    return _clean_doc_comment("\n".join(lines[first:anchor])) or None
 
-    return start_line
 
+# -------------------------------
+# C / C++ extractor (single-pass scanner)
+# -------------------------------
+_C_TOKEN = re.compile(
+    r"""
+    (?P<comment>//[^\n]*|/\*[\s\S]*?\*/)
+    | (?P<string>R"(?P<delim>[^(\s"]{0,16})\([\s\S]*?\)(?P=delim)"
+                 |"(?:\\.|[^"\\\n])*"
+                 |'(?:\\.|[^'\\\n])*')
+    | (?P<pp>^[ \t]*\#(?:\\\n|[^\n])*)
+    | (?P<open>\{)
+    | (?P<close>\})
+    | (?P<semi>;)
+    | (?P<colon>:)
+    """,
+    re.MULTILINE | re.VERBOSE,
+)
+
+_C_COMMENT = re.compile(r"//[^\n]*|/\*[\s\S]*?\*/")
+
+# Doc comment (/** */ or a run of ///, //! lines) right before the declaration
+_C_DOC_COMMENT = re.compile(r"(/\*[*!](?!/)[\s\S]*?\*/|(?:[ \t]*//[/!][^\n]*\n?)+)\s*$")
+
+_C_CONTAINER = re.compile(
+    r"""^(?:template\s*<.*>\s*)?
+    (?:namespace\b|extern\s*"C(?:\+\+)?"|(?:class|struct|union)\s+[\w:]+[^(]*(?::|$))""",
+    re.VERBOSE,
+)
+
+_C_NAME_BEFORE_PAREN = re.compile(
+    r"(~?[A-Za-z_]\w*(?:\s*::\s*~?[A-Za-z_]\w*)*|operator\s*[^\s(]+(?:\s*\(\s*\))?)\s*$"
+)
+
+_C_AFTER_PARAMS = re.compile(
+    r"""^\s*(?:(?:const|volatile|noexcept(?:\s*\([^)]*\))?|override|final|&&?|throw\s*\([^)]*\)|->\s*[^{;=]+)\s*)*
+    (?::.*)?$""",  # optional constructor initializer list
+    re.VERBOSE | re.DOTALL,
+)
+
+_C_NOT_FUNCTIONS = {
+    "if", "for", "while", "switch", "catch", "else", "do", "return",
+    "sizeof", "decltype", "alignof", "static_assert", "defined",
+}
+
+_C_ACCESS_SPECIFIERS = {"public", "private", "protected", "signals", "slots"}
+
+
+def _clean_doc_comment(comment: str) -> str:
+    """Strip comment markers from a Doxygen/Javadoc style comment."""
+    comment = comment.strip()
+    if comment.startswith("/*"):
+        comment = comment[3:-2]
+        lines = [re.sub(r"^\s*\*?\s?", "", line) for line in comment.splitlines()]
+    else:
+        lines = [re.sub(r"^\s*//[/!]\s?", "", line) for line in comment.splitlines()]
+    return "\n".join(lines).strip()
+
+
+def _classify_c_header(header: str):
+    """
+    Classify the declaration text in front of a `{` at container scope.
 
-def extract_c_like_functions_regex(source: str) -> List[FunctionInfo]:
+    Returns ("function", name), ("container", None) or ("other", None).
+    """
+    paren = header.find("(")
+    if paren != -1:
+        pre = header[:paren].rstrip()
+        name_match = _C_NAME_BEFORE_PAREN.search(pre)
+        # '=' → initializer; a lone ':' → inheritance list or label
+        plain = pre.replace("::", "")
+        if name_match and "=" not in plain.replace("operator", "") and ":" not in plain:
+            name = re.sub(r"\s+", "", name_match.group(1))
+            depth = 0
+            for pos in range(paren, len(header)):
+                if header[pos] == "(":
+                    depth += 1
+                elif header[pos] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+            if name not in _C_NOT_FUNCTIONS and depth == 0 and _C_AFTER_PARAMS.match(header[pos + 1:]):
+                return "function", name
+
+    if _C_CONTAINER.match(header):
+        return "container", None
+    return "other", None
+
+
+def extract_c_like_functions(source: str) -> List[FunctionInfo]:
     """
     Lightweight C/C++ function extractor.
     Works without libclang.
 
-    Handles examples like:
-    int addNumbers(int a, int b) {
-    void greetUser(char name[]) {
-    string formatName(string firstName, string lastName) {
-    bool isUserActive(bool status) {
+    One pass over the file with a tokenizer that skips string/char
+    literals, comments and preprocessor lines, so braces inside them do
+    not confuse the nesting. Functions are found at file, namespace,
+    extern "C" and class/struct scope; multi-line signatures (return
+    type, template<> or qualifiers on other lines) are supported, and a
+    /** */ or /// comment right above a function is returned as its
+    existing_docstring.
     """
     res: List[FunctionInfo] = []
-    lines = source.splitlines()
 
-    function_pattern = re.compile(
-        r"""
-        ^\s*
-        (?!if\b|for\b|while\b|switch\b|catch\b|else\b)
-        (?:template\s*<[^>]+>\s*)?
-        (?:
-            [A-Za-z_][\w:<>\*&\s]*      # return type
-            \s+
-        )?
-        ([A-Za-z_]\w*)                  # function name
-        \s*
-        \([^;{}]*\)                     # parameters
-        \s*
-        (?:const\s*)?
-        \{                              # function body starts
-        """,
-        re.VERBOSE,
-    )
+    # Scope stack entries: ("container" | "function" | "other", name, start, doc)
+    stack = [("container", None, None, None)]
+    header_start = 0
 
-    for index, line in enumerate(lines):
-        match = function_pattern.match(line)
-        if not match:
+    # Incremental offset → line mapping (queries move almost always forward)
+    line_pos, line_no = 0, 1
+
+    def line_at(pos: int) -> int:
+        nonlocal line_pos, line_no
+        if pos >= line_pos:
+            line_no += source.count("\n", line_pos, pos)
+        else:
+            line_no -= source.count("\n", pos, line_pos)
+        line_pos = pos
+        return line_no
+
+    for match in _C_TOKEN.finditer(source):
+        kind = match.lastgroup
+        in_container = stack[-1][0] == "container"
+
+        if kind in ("comment", "string"):
             continue
 
-        name = match.group(1)
+        if kind == "pp":
+            if in_container:
+                header_start = match.end()
+            continue
 
-        # Skip common control-like false positives
-        if name in {"if", "for", "while", "switch", "catch"}:
+        if kind == "semi":
+            if in_container:
+                header_start = match.end()
             continue
 
-        start = index + 1
-        end = find_c_like_block_end(source, start)
+        if kind == "colon":
+            # `public:` and friends end a declaration prefix in classes
+            if in_container:
+                word = _C_COMMENT.sub(" ", source[header_start:match.start()]).strip()
+                if word in _C_ACCESS_SPECIFIERS:
+                    header_start = match.end()
+            continue
+
+        if kind == "open":
+            if not in_container:
+                stack.append(("other", None, None, None))
+                continue
+
+            raw_header = source[header_start:match.start()]
+            header = re.sub(r"\s+", " ", _C_COMMENT.sub(" ", raw_header)).strip()
+            scope, name = _classify_c_header(header)
+
+            if scope == "function":
+                # First code character of the declaration
+                offset = 0
+                for comment in _C_COMMENT.finditer(raw_header):
+                    if raw_header[offset:comment.start()].strip():
+                        break
+                    offset = comment.end()
+                offset += len(raw_header[offset:]) - len(raw_header[offset:].lstrip())
+
+                doc_match = _C_DOC_COMMENT.search(raw_header[:offset])
+                doc = _clean_doc_comment(doc_match.group(1)) if doc_match else None
+                stack.append(("function", name, line_at(header_start + offset), doc))
+            else:
+                stack.append((scope, None, None, None))
+                header_start = match.end()
+            continue
 
-        res.append(FunctionInfo(
-            name=name,
-            start=start,
-            end=end,
-            node=None,
-            existing_docstring=None,
-        ))
+        if kind == "close":
+            if len(stack) == 1:
+                continue  # unbalanced '}'
+            scope, name, start, doc = stack.pop()
+            if scope == "function":
+                res.append(FunctionInfo(
+                    name=name,
+                    start=start,
+                    end=line_at(match.start()),
+                    node=None,
+                    existing_docstring=doc,
+                ))
+            if stack[-1][0] == "container":
+                header_start = match.end()
+
+    # Unterminated bodies run to the end of the file
+    last_line = source.count("\n") + 1
+    for scope, name, start, doc in stack[1:]:
+        if scope == "function":
+            res.append(FunctionInfo(name, start, last_line, None, doc))
 
     res.sort(key=lambda x: x.start or 0)
     return res
@@ -250,14 +582,14 @@ def extract_c_like_functions_regex(source: str) -> List[FunctionInfo]:
 # C++ extractor
 # -------------------------------
 def extract_cpp_functions(source: str) -> List[FunctionInfo]:
-    return extract_c_like_functions_regex(source)
+    return extract_c_like_functions(source)
 
 
 # -------------------------------
 # C extractor
 # -------------------------------
 def extract_c_functions(source: str) -> List[FunctionInfo]:
-    return extract_c_like_functions_regex(source)
+    return extract_c_like_functions(source)
 
 
 # -------------------------------
@@ -0,0 +1,162 @@
+# process pool for CPU-bound parsing, slicing and insertion
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from app.incremental import changed_since
+from app.source import SourceDocument
+from app.utils import FunctionInfo, preload_parsers
+
+logger = logging.getLogger("doc_generator")
+
+PARSE_WORKERS = max(1, int(os.getenv("PARSE_WORKERS", "2")))
+PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", "30"))
+
+# Parsers to import in every worker at startup ("JavaScript,Java", "all");
+# by default each worker imports a parser on its first file of that language
+WARMUP_LANGUAGES = tuple(lang.strip() for lang in os.getenv("WARMUP_LANGUAGES", "").split(",") if lang.strip())
+
+_executor: Optional[ProcessPoolExecutor] = None
+_workers: Optional[int] = None    # size of the pool, kept when it is recreated
+
+
+class ParseTimeout(Exception):
+    """Raised when a parse/insert job exceeds PARSE_TIMEOUT_SECONDS."""
+
+
+def get_executor(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """The shared pool; `workers` (default PARSE_WORKERS) only applies when it is created."""
+    global _executor, _workers
+    if _executor is None:
+        _workers = workers or _workers or PARSE_WORKERS
+        # spawn: never fork a process that is running an event loop
+        _executor = ProcessPoolExecutor(
+            max_workers=_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def start_executor(workers: Optional[int] = None) -> None:
+    """Spawn the worker processes up front so the first request does not pay for it."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor(workers)
+    count = workers or PARSE_WORKERS
+    await asyncio.gather(*(
+        loop.run_in_executor(executor, _warm_worker, WARMUP_LANGUAGES) for _ in range(count)
+    ))
+
+
+def shutdown_executor() -> None:
+    global _executor, _workers
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _workers = None
+
+
+def _kill_executor(executor: ProcessPoolExecutor) -> None:
+    """Terminate the pool's processes; the next job starts a fresh pool."""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    # Python 3.14 has executor.kill_workers(); before that the processes
+    # are only reachable through the private mapping
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+
+
+# -------------------------------
+# Jobs (run inside the worker)
+# -------------------------------
+def _warm_worker(languages: Tuple[str, ...] = ()) -> int:
+    # Parsers are imported on first use; WARMUP_LANGUAGES preloads them. The
+    # short sleep keeps each warm-up call on a different worker process.
+    preload_parsers(languages)
+    time.sleep(0.1)
+    return os.getpid()
+
+
+def parse_job(language: str, source: str) -> Tuple[List[FunctionInfo], List[str], str]:
+    """
+    Extract functions and slice their sources from one SourceDocument.
+
+    Returns (infos, fn_srcs, source). `source` is the text the line numbers
+    refer to (it differs from the input only when Python normalization
+    kicked in) and must be used for insertion. Parser nodes stay in the
+    worker: only names, line ranges, existing docstrings and the sliced
+    sources are sent back.
+    """
+    doc = SourceDocument(language, source)
+    infos = doc.functions
+    fn_srcs = [doc.segment(info) for info in infos]
+    for info in infos:
+        info.node = None
+    return infos, fn_srcs, doc.source
+
+
+def insert_job(source: str, updates: List[Tuple[int, int, str]], language: str) -> str:
+    return SourceDocument(language, source, parse=False).apply_docstrings(updates)
+
+
+def patch_job(source: str, updates: List[Tuple[int, int, str]], language: str) -> List[dict]:
+    return SourceDocument(language, source, parse=False).patches(updates)
+
+
+def diff_job(source: str, updates: List[Tuple[int, int, str]], language: str, path: str) -> str:
+    return SourceDocument(language, source, parse=False).unified_diff(updates, path=path)
+
+
+# -------------------------------
+# Async wrappers
+# -------------------------------
+async def _run(fn, *args, timeout: float = PARSE_TIMEOUT_SECONDS):
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, fn, *args), timeout)
+        except asyncio.TimeoutError:
+            # A worker cannot be interrupted: kill the pool so the runaway
+            # job stops using a process, and let the next job start a new one
+            logger.error(f"{fn.__name__} exceeded {timeout}s, restarting the worker pool")
+            _kill_executor(executor)
+            raise ParseTimeout(f"Processing took longer than {timeout:.0f}s")
+        except BrokenProcessPool:
+            # A worker died (killed after another job's timeout, or crashed):
+            # retry once on a fresh pool
+            _kill_executor(executor)
+            if attempt:
+                raise
+
+
+async def parse_in_pool(language: str, source: str) -> Tuple[List[FunctionInfo], List[str], str]:
+    return await _run(parse_job, language, source)
+
+
+async def insert_in_pool(source: str, updates: List[Tuple[int, int, str]], language: str) -> str:
+    return await _run(insert_job, source, updates, language)
+
+
+async def patch_in_pool(source: str, updates: List[Tuple[int, int, str]], language: str) -> List[dict]:
+    return await _run(patch_job, source, updates, language)
+
+
+async def diff_in_pool(source: str, updates: List[Tuple[int, int, str]], language: str, path: str) -> str:
+    return await _run(diff_job, source, updates, language, path)
+
+
+async def changed_since_in_pool(
+    language: str,
+    infos: List[FunctionInfo],
+    fn_srcs: List[str],
+    previous_source: str,
+) -> List[int]:
+    return await _run(changed_since, language, infos, fn_srcs, previous_source)
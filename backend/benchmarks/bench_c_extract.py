@@ -0,0 +1,66 @@
+# C/C++ extraction scaling benchmark
+#
+#   cd backend && python -m benchmarks.bench_c_extract [--sizes 1000,5000,20000,50000]
+#
+# Prints time per line for growing files; a linear extractor keeps the
+# per-line cost flat as the file grows.
+import argparse
+import sys
+import time
+
+from app.utils import extract_c_like_functions
+
+FUNCTION_TEMPLATE = '''/**
+ * Helper number {i}.
+ */
+static int helper_{i}(int a, const char *name)
+{{
+    const char *msg = "braces in strings: {{ }} }}";
+    char open = '{{';
+    /* a comment with a brace }} */
+    if (a > {i}) {{
+        return a - {i};
+    }}
+    return a + (int)open; // trailing }}
+}}
+
+'''
+
+
+def make_source(lines: int) -> str:
+    per_function = FUNCTION_TEMPLATE.count("\n")
+    count = max(1, lines // per_function)
+    return "#include <stdio.h>\n\n" + "".join(FUNCTION_TEMPLATE.format(i=i) for i in range(count))
+
+
+def bench(lines: int, repeat: int = 3):
+    source = make_source(lines)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        infos = extract_c_like_functions(source)
+        best = min(best, time.perf_counter() - started)
+    return source.count("\n"), len(infos), best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="C/C++ extraction scaling benchmark")
+    parser.add_argument("--sizes", default="1000,5000,20000,50000", help="comma-separated line counts")
+    parser.add_argument("--max-ratio", type=float, default=2.0,
+                        help="fail if per-line cost of the largest file exceeds the smallest by this factor")
+    args = parser.parse_args(argv)
+
+    results = [bench(int(size)) for size in args.sizes.split(",")]
+
+    print(f"{'lines':>8} {'functions':>10} {'seconds':>10} {'us/line':>9}")
+    for lines, functions, seconds in results:
+        print(f"{lines:>8} {functions:>10} {seconds:>10.4f} {seconds / lines * 1e6:>9.2f}")
+
+    first, last = results[0], results[-1]
+    ratio = (last[2] / last[0]) / (first[2] / first[0])
+    print(f"per-line cost ratio (largest / smallest): {ratio:.2f}")
+    return 0 if ratio <= args.max_ratio else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# cold-start benchmark: wall time of `import main` in fresh interpreters
+#
+#   cd backend && python -m benchmarks.bench_startup [--runs 7] [--max-seconds 1.5] [--top 15]
+#
+# Exits 1 when the median import time is above --max-seconds, or when it
+# exceeds the median `import fastapi` by more than --max-overhead, so it can
+# gate CI. FastAPI itself is most of the cold start (about 0.6 of 0.75 s on a
+# dev machine), so the overhead check is the one that catches our own
+# regressions on any hardware. Parser modules (esprima, javalang),
+# python-dotenv and the model SDK are imported on first use and must not
+# show up in the --top list.
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TARGET = "main"
+DEFAULT_MAX_SECONDS = 1.5
+
+# What `import main` may add on top of `import fastapi`: the app modules,
+# route and middleware setup
+FRAMEWORK = "fastapi"
+DEFAULT_MAX_OVERHEAD = 0.3
+
+# Modules that are imported lazily; finding one at startup is reported
+LAZY_MODULES = ("esprima", "javalang", "groq", "dotenv", "clang")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Keep the measurement free of network clients and the on-disk cache
+    env.setdefault("LLM_BACKEND", "fake")
+    env.setdefault("DOCSTRING_CACHE_PATH", "off")
+    return env
+
+
+def time_import(target: str) -> float:
+    """Wall time of one `python -c "import <target>"` (including interpreter start)."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {target}"], cwd=BACKEND_DIR, env=_env(), check=True)
+    return time.perf_counter() - started
+
+
+def interpreter_baseline() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], cwd=BACKEND_DIR, env=_env(), check=True)
+    return time.perf_counter() - started
+
+
+def import_profile(target: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self µs, cumulative µs, depth) per module from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, env=_env(), check=True, capture_output=True, text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return modules
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import time of the API module")
+    parser.add_argument("--target", default=DEFAULT_TARGET, help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS,
+                        help="fail when the median import time is above this")
+    parser.add_argument("--max-overhead", type=float, default=DEFAULT_MAX_OVERHEAD,
+                        help=f"fail when the median is more than this above `import {FRAMEWORK}`")
+    parser.add_argument("--top", type=int, default=15, help="show the N slowest top-level imports (0: none)")
+    args = parser.parse_args(argv)
+
+    # Warm the OS file cache and __pycache__ first; we want import cost, not disk
+    time_import(args.target)
+
+    baseline = statistics.median(interpreter_baseline() for _ in range(3))
+    time_import(FRAMEWORK)
+    framework = statistics.median(time_import(FRAMEWORK) for _ in range(args.runs))
+    samples = [time_import(args.target) for _ in range(args.runs)]
+    median = statistics.median(samples)
+    imports = max(0.0, median - baseline)
+    overhead = median - framework
+
+    print(f"import {args.target}: median {median:.3f} s, min {min(samples):.3f} s, max {max(samples):.3f} s "
+          f"over {len(samples)} runs")
+    print(f"interpreter start: {baseline:.3f} s; imports alone: {imports:.3f} s")
+    print(f"import {FRAMEWORK}: median {framework:.3f} s; {args.target} adds {overhead:.3f} s")
+
+    profile = import_profile(args.target)
+    if args.top:
+        print(f"\nslowest imports below {args.target} (cumulative ms):")
+        direct = [m for m in profile if m[3] <= 1 and m[0] != args.target]
+        for name, _, cumulative, _ in sorted(direct, key=lambda m: m[2], reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:>8.1f}  {name}")
+
+    eager = sorted({m[0].split(".")[0] for m in profile} & set(LAZY_MODULES))
+    if eager:
+        print(f"\nwarning: imported at startup although they should be lazy: {', '.join(eager)}")
+
+    failed = False
+    if median > args.max_seconds:
+        print(f"\nFAIL: median {median:.3f} s is above the {args.max_seconds:.3f} s target")
+        failed = True
+    if overhead > args.max_overhead:
+        print(f"\nFAIL: {args.target} adds {overhead:.3f} s to {FRAMEWORK}, above the {args.max_overhead:.3f} s target")
+        failed = True
+    if failed:
+        return 1
+    print(f"\nOK: median {median:.3f} s is within the {args.max_seconds:.3f} s target, "
+          f"{overhead:.3f} s over {FRAMEWORK} within {args.max_overhead:.3f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+# end-to-end benchmark suite: extraction, slicing, insertion and /generate throughput
+#
+#   cd backend && python -m benchmarks.bench_suite [--sizes 100,1000,10000,50000] [--out bench-results.json]
+#   cd backend && python -m benchmarks.bench_suite --compare before.json after.json [--threshold 0.15]
+#
+# Model calls go to the fake backend (LLM_BACKEND=fake, no network) and the
+# docstring cache is disabled, so /generate numbers measure our own
+# overhead: parsing, scheduling, insertion and serialization.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.corpora import LANGUAGES, make_source
+
+DEFAULT_SIZES = "100,1000,10000,50000"
+DEFAULT_CONCURRENCY = "1,4,16"
+
+
+# -------------------------------
+# Measurement helpers
+# -------------------------------
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    pos = (len(sorted_samples) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (pos - lo)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "samples": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, budget: float) -> List[float]:
+    """Time `fn` up to `repeat` times, stopping early once `budget` seconds are spent."""
+    samples: List[float] = []
+    spent = 0.0
+    while len(samples) < repeat and (not samples or spent < budget):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed)
+        spent += elapsed
+    return samples
+
+
+def peak_memory_kib(fn: Callable[[], object]) -> int:
+    """Peak Python heap allocated while running `fn` once (separate run, tracing is slow)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+# -------------------------------
+# Stage benchmarks
+# -------------------------------
+def bench_stages(languages: List[str], sizes: List[int], repeat: int, budget: float) -> List[dict]:
+    from app.docgen import extract_functions_and_classes, get_source_for_fn, insert_docstrings_into_source
+    from app.source import SourceDocument
+
+    results = []
+    for language in languages:
+        for size in sizes:
+            source = make_source(language, size)
+            lines = source.count("\n")
+            infos = extract_functions_and_classes(language, source)
+            updates = [(info.start, info.end, f"Generated docstring for {info.name}.") for info in infos]
+            middle = infos[len(infos) // 2] if infos else None
+
+            def slice_all():
+                doc = SourceDocument(language, source, parse=False)
+                return [doc.segment(info) for info in infos]
+
+            stages = {
+                "extract": lambda: extract_functions_and_classes(language, source),
+                # Indexed slicing of every function, as the pipeline does
+                "slice": slice_all,
+                # One-off helper: cost of a single call on this file size
+                "slice_one": lambda: get_source_for_fn(language, source, middle) if middle else "",
+                "insert": lambda: insert_docstrings_into_source(source, updates, language),
+            }
+
+            for stage, fn in stages.items():
+                stats = summarize(measure(fn, repeat, budget))
+                result = {
+                    "name": f"{stage}/{language}/{size}",
+                    "stage": stage,
+                    "language": language,
+                    "lines": lines,
+                    "functions": len(infos),
+                    **stats,
+                    "peak_kib": peak_memory_kib(fn),
+                }
+                results.append(result)
+                _print_result(result)
+    return results
+
+
+# -------------------------------
+# /generate benchmarks
+# -------------------------------
+async def _bench_requests(
+    languages: List[str],
+    lines: int,
+    levels: List[int],
+    requests_per_level: int,
+) -> List[dict]:
+    import httpx
+
+    import main
+    from app.languages import DEFAULT_FORMAT_BY_LANGUAGE
+
+    results = []
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            offset = 0
+            for language in languages:
+                for concurrency in levels:
+                    # A distinct file per request so identical calls are not coalesced
+                    bodies = []
+                    for _ in range(requests_per_level):
+                        bodies.append(make_source(language, lines, offset))
+                        offset += 100000
+
+                    sem = asyncio.Semaphore(concurrency)
+                    latencies: List[float] = []
+                    functions = 0
+
+                    async def one(code: str):
+                        nonlocal functions
+                        async with sem:
+                            started = time.perf_counter()
+                            response = await client.post("/generate", data={
+                                "code": code,
+                                "language": language,
+                                "format": DEFAULT_FORMAT_BY_LANGUAGE[language],
+                            })
+                            latencies.append(time.perf_counter() - started)
+                            response.raise_for_status()
+                            functions += len(response.json()["docs"])
+
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    try:
+                        await asyncio.gather(*(one(code) for code in bodies))
+                        peak = tracemalloc.get_traced_memory()[1] // 1024
+                    finally:
+                        tracemalloc.stop()
+                    wall = time.perf_counter() - started
+
+                    result = {
+                        "name": f"generate/{language}/c{concurrency}",
+                        "stage": "generate",
+                        "language": language,
+                        "lines": bodies[0].count("\n"),
+                        "concurrency": concurrency,
+                        "requests": len(bodies),
+                        "functions": functions,
+                        **summarize(latencies),
+                        "throughput_rps": round(len(bodies) / wall, 2),
+                        "functions_per_s": round(functions / wall, 1),
+                        "peak_kib": peak,
+                    }
+                    results.append(result)
+                    _print_result(result)
+    return results
+
+
+def bench_requests(languages: List[str], lines: int, levels: List[int], requests_per_level: int) -> List[dict]:
+    return asyncio.run(_bench_requests(languages, lines, levels, requests_per_level))
+
+
+# -------------------------------
+# Reporting / comparison
+# -------------------------------
+def _print_result(result: dict) -> None:
+    extra = f" {result['throughput_rps']:>8.2f} req/s" if "throughput_rps" in result else ""
+    print(
+        f"{result['name']:<32} {result['lines']:>7} lines {result['functions']:>6} fns "
+        f"p50 {result['p50_ms']:>10.3f} ms  p95 {result['p95_ms']:>10.3f} ms  p99 {result['p99_ms']:>10.3f} ms "
+        f"peak {result['peak_kib']:>8} KiB{extra}",
+        flush=True,
+    )
+
+
+def compare(before_path: str, after_path: str, threshold: float, min_delta_ms: float) -> int:
+    """Print per-benchmark changes; returns 1 if any benchmark regressed."""
+    with open(before_path) as f:
+        before = {r["name"]: r for r in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"{'benchmark':<32} {'p50 before':>11} {'p50 after':>11} {'change':>8}  {'p95 change':>10}  {'peak change':>11}")
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        flags = []
+        for metric in ("p50_ms", "p95_ms"):
+            if new[metric] > old[metric] * (1 + threshold) and new[metric] - old[metric] > min_delta_ms:
+                flags.append(metric[:3])
+        if new["peak_kib"] > old["peak_kib"] * (1 + threshold) and new["peak_kib"] - old["peak_kib"] > 64:
+            flags.append("memory")
+
+        regressions += bool(flags)
+        print(
+            f"{name:<32} {old['p50_ms']:>11.3f} {new['p50_ms']:>11.3f} {_change(old['p50_ms'], new['p50_ms']):>8}  "
+            f"{_change(old['p95_ms'], new['p95_ms']):>10}  {_change(old['peak_kib'], new['peak_kib']):>11}"
+            + (f"  REGRESSION ({', '.join(flags)})" if flags else "")
+        )
+
+    for name in sorted(before.keys() - after.keys()):
+        print(f"{name:<32} missing from {after_path}")
+
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old:+.1%}"
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def _configure_env(latency: str) -> None:
+    # Must happen before app.openai_client is imported
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = latency
+    os.environ["DOCSTRING_CACHE_PATH"] = "off"
+    os.environ.setdefault("FAKE_LLM_SEED", "0")
+    os.environ.setdefault("JOBS_DIR", tempfile.mkdtemp(prefix="docgen-bench-jobs-"))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Extraction, insertion and request throughput benchmarks")
+    parser.add_argument("--languages", default=",".join(LANGUAGES), help="comma-separated languages")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated corpus sizes in lines")
+    parser.add_argument("--repeat", type=int, default=7, help="samples per stage benchmark")
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds per stage benchmark before stopping early")
+    parser.add_argument("--request-lines", type=int, default=1000, help="file size for /generate benchmarks")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma-separated client concurrency levels")
+    parser.add_argument("--requests", type=int, default=16, help="requests per concurrency level")
+    parser.add_argument("--llm-latency", default="fixed:0.01", help="fake model latency spec (see app/llm.py)")
+    parser.add_argument("--skip-stages", action="store_true", help="only run the /generate benchmarks")
+    parser.add_argument("--skip-requests", action="store_true", help="only run the stage benchmarks")
+    parser.add_argument("--out", default="bench-results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold, args.min_delta_ms)
+
+    _configure_env(args.llm_latency)
+    languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()]
+    unknown = set(languages) - set(LANGUAGES)
+    if unknown:
+        parser.error(f"unknown language(s): {', '.join(sorted(unknown))}")
+
+    results: List[dict] = []
+    if not args.skip_stages:
+        sizes = [int(size) for size in args.sizes.split(",")]
+        results += bench_stages(languages, sizes, args.repeat, args.budget)
+    if not args.skip_requests:
+        levels = [int(level) for level in args.concurrency.split(",")]
+        results += bench_requests(languages, args.request_lines, levels, args.requests)
+
+    with open(args.out, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
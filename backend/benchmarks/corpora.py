@@ -0,0 +1,166 @@
+# synthetic source files of a given size for every supported language
+from typing import Dict
+
+# Each template is one repeatable unit; {i} keeps names unique. Units mix
+# classes, methods, free functions, existing doc comments and code that
+# tends to trip up extractors (braces in strings, nested blocks).
+TEMPLATES: Dict[str, str] = {
+    "Python": '''class Model{i}:
+    """Model number {i}."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def compute(self, x, y=2):
+        total = 0
+        for k in range(x):
+            if k % 3 == 0:
+                total += k * y
+        return total + self.value
+
+
+def helper_{i}(items, *, strict=False):
+    label = "braces {{ }} and colons: in strings"
+    return [item for item in items if item or strict], label
+
+
+''',
+    "JavaScript": '''class Model{i} {{
+  constructor(value) {{
+    this.value = value;
+  }}
+
+  compute(x, y = 2) {{
+    let total = 0;
+    for (let k = 0; k < x; k++) {{
+      if (k % 3 === 0) {{ total += k * y; }}
+    }}
+    return total + this.value;
+  }}
+}}
+
+/**
+ * Helper number {i}.
+ */
+function helper{i}(items, strict) {{
+  const label = "braces {{ }} in strings";
+  return items.filter((item) => item || strict).concat([label]);
+}}
+
+const arrow{i} = (a, b) => a + b;
+
+''',
+    "TypeScript": '''class Model{i} {{
+  constructor(value: number) {{
+    this.value = value;
+  }}
+
+  compute(x: number, y: number = 2): number {{
+    let total = 0;
+    for (let k = 0; k < x; k++) {{
+      if (k % 3 === 0) {{ total += k * y; }}
+    }}
+    return total + this.value;
+  }}
+}}
+
+/**
+ * Helper number {i}.
+ */
+function helper{i}(items: string[], strict: boolean): string[] {{
+  const label: string = "braces {{ }} in strings";
+  return items.filter((item) => item || strict).concat([label]);
+}}
+
+''',
+    "Java": '''class Model{i} {{
+    private int value;
+
+    /** Creates model number {i}. */
+    public Model{i}(int value) {{
+        this.value = value;
+    }}
+
+    public int compute(int x, int y) {{
+        int total = 0;
+        for (int k = 0; k < x; k++) {{
+            if (k % 3 == 0) {{ total += k * y; }}
+        }}
+        return total + value;
+    }}
+
+    static String helper{i}(String name) {{
+        return "braces {{ }} in strings " + name;
+    }}
+}}
+
+''',
+    "C": '''/**
+ * Helper number {i}.
+ */
+static int helper_{i}(int a, const char *name)
+{{
+    const char *msg = "braces in strings: {{ }} }}";
+    char open = '{{';
+    /* a comment with a brace }} */
+    if (a > {i}) {{
+        return a - {i};
+    }}
+    return a + (int)open; // trailing }}
+}}
+
+struct point_{i} {{ int x; int y; }};
+
+int area_{i}(struct point_{i} p) {{ return p.x * p.y; }}
+
+''',
+    "C++": '''namespace ns{i} {{
+
+/// Model number {i}.
+class Model {{
+public:
+    explicit Model(int value) : value_(value) {{}}
+
+    int compute(int x, int y = 2) const {{
+        int total = 0;
+        for (int k = 0; k < x; ++k) {{
+            if (k % 3 == 0) {{ total += k * y; }}
+        }}
+        return total + value_;
+    }}
+
+private:
+    int value_;
+}};
+
+template <typename T>
+T clamp_{i}(T v, T lo, T hi) {{
+    return v < lo ? lo : (v > hi ? hi : v);
+}}
+
+}}  // namespace ns{i}
+
+''',
+}
+
+HEADERS: Dict[str, str] = {
+    "Python": "import os\nimport sys\n\n\n",
+    "JavaScript": "'use strict';\n\n",
+    "TypeScript": "",
+    "Java": "package bench;\n\nimport java.util.List;\n\n",
+    "C": "#include <stdio.h>\n\n",
+    "C++": "#include <vector>\n\n",
+}
+
+LANGUAGES = tuple(TEMPLATES)
+
+
+def make_source(language: str, lines: int, offset: int = 0) -> str:
+    """
+    Source of roughly `lines` lines (at least one template unit). Different
+    offsets give files with different function bodies.
+    """
+    template = TEMPLATES[language]
+    per_unit = template.format(i=0).count("\n")
+    count = max(1, lines // per_unit)
+    return HEADERS[language] + "".join(template.format(i=offset + i) for i in range(count))
@@ -0,0 +1,7 @@
+# command-line entry point: python docgen.py [--write | --check] <paths>
+import sys
+
+from app.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,67 @@
 import asyncio
+import json
 import logging
 import os
-from typing import List
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import tarfile
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from enum import Enum
 
-from app.schemas import GenerateResponse, FunctionDoc
-from app.docgen import (
-    extract_functions_and_classes,
-    get_source_for_fn,
-    insert_docstrings_into_source
+from app.schemas import GenerateResponse
+from app.cache import docstring_cache
+from app.incremental import changed_by_diff, missing_docstrings
+from app.jobs import JobError, create_job, get_job_status, job_runner, result_path
+from app.metrics import (
+    LLM_CONCURRENCY,
+    LLM_IN_FLIGHT,
+    LLM_QUEUED,
+    REQUESTS_CANCELLED,
+    RESPONSE_BYTES,
+    RequestTimings,
+    render_prometheus
+)
+from app.openai_client import aclose_backends, backend, inflight, llm_scheduler
+from app.pipeline import DeadlineExceeded, build_function_doc, collect_updates, iter_generated_docs
+from app.similarity import similarity_index
+from app.utils import MAX_UPLOAD_BYTES, FunctionInfo, UploadRejected, extract_code_from_file
+from app.workers import (
+    ParseTimeout,
+    changed_since_in_pool,
+    diff_in_pool,
+    insert_in_pool,
+    parse_in_pool,
+    patch_in_pool,
+    shutdown_executor,
+    start_executor
 )
-from app.openai_client import generate_docstring
-from app.utils import FunctionInfo, extract_code_from_file
 
 logger = logging.getLogger("doc_generator")
 logger.setLevel(logging.INFO)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_executor()
+    await job_runner.resume_all()
+    yield
+    await job_runner.shutdown()
+    await aclose_backends()
+    shutdown_executor()
+    if docstring_cache is not None:
+        # Batched hit/miss counts
+        await asyncio.to_thread(docstring_cache.flush)
+
+
 # APP set up
 app = FastAPI(
+    lifespan=lifespan,
     title="AI Docstring Generator",
     description="""
 Generate docstrings for code automatically using AI.
@@ -50,6 +91,81 @@ else:
 
 logger.info(f"Env: {ENV}")
 
+# Seconds of silence before /generate/stream sends a keep-alive comment
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Poll interval for /jobs/{job_id}/events
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# Seconds /generate and /generate/stream may spend documenting ("0": no limit);
+# clients can ask for a shorter deadline with the `timeout` form field
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "0"))
+
+# Request body limit for /generate and /generate/stream: the upload plus
+# the other form fields (previous_code, diff: at most 1 MiB each)
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(MAX_UPLOAD_BYTES + 2 * 1024 * 1024)))
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject oversized /generate bodies with 413 before they are buffered:
+    up front from Content-Length, or once the streamed body crosses the
+    limit (the app's own response is then replaced).
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Tuple[str, ...]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                return await self._reject(scope, receive, send)
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        logger.warning(f"Request body above {self.max_bytes} bytes rejected: {scope['path']}")
+        response = JSONResponse(
+            {"detail": f"Request body is larger than the {self.max_bytes} byte limit"}, status_code=413
+        )
+        await response(scope, receive, send)
+
+
+# Inside CORS so 413 responses carry the CORS headers
+app.add_middleware(
+    RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES, paths=("/generate", "/generate/stream")
+)
+
 # CORS setup
 app.add_middleware(
     CORSMiddleware,
@@ -59,6 +175,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class ResponseSizeMiddleware:
+    """Record Content-Length per route template (inside compression, so uncompressed)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                for name, value in message.get("headers", []):
+                    if name == b"content-length":
+                        route = getattr(scope.get("route"), "path", "unmatched")
+                        RESPONSE_BYTES.observe(int(value), path=route)
+                        break
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+app.add_middleware(ResponseSizeMiddleware)
+
+# Response compression: brotli (with gzip fallback) when brotli-asgi is
+# installed, plain gzip otherwise. Event streams are never compressed so
+# events are not held back in the compressor.
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=COMPRESSION_MIN_BYTES,
+        gzip_fallback=True,
+        excluded_handlers=[r"^/generate/stream$", r"^/jobs/[^/]+/events$", r"^/jobs/[^/]+/result$"],
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
 
 # API
 class FormatOptions(str, Enum):
@@ -71,6 +229,18 @@ class FormatOptions(str, Enum):
     doxygen = "Doxygen"
 
 
+class ModeOptions(str, Enum):
+    all = "all"            # document every function
+    missing = "missing"    # only functions without a docstring
+    changed = "changed"    # only functions changed since previous_code / diff
+
+
+class OutputOptions(str, Enum):
+    full = "full"          # whole modified source in `modified_code`
+    patch = "patch"        # line hunks against the submitted source in `patches`
+    diff = "diff"          # unified diff against the submitted source in `diff`
+
+
 class LanguageOptions(str, Enum):
     python = "Python"
     javascript = "JavaScript"
@@ -105,16 +275,31 @@ ALLOWED_FORMATS_BY_LANGUAGE = {
 }
 
 
-@app.post("/generate", response_model=GenerateResponse)
-async def generate_docs(
-    code: str = Form(None),
-    language: LanguageOptions = Form(LanguageOptions.python),
-    format: FormatOptions = Form(...),
-    file: UploadFile = File(None)
-):
-    logger.info("REQUEST RECEIVED → /generate")
+@app.get("/cache/stats")
+async def cache_stats():
+    similar = {"similar_entries": len(similarity_index) if similarity_index is not None else None}
+    if docstring_cache is None:
+        return {"enabled": False, **similar}
+    stats = await asyncio.to_thread(docstring_cache.stats)
+    return {"enabled": True, **stats, **similar}
+
+
+async def _load_request(
+    code: Optional[str],
+    language: LanguageOptions,
+    format: FormatOptions,
+    file: Optional[UploadFile],
+    timings: RequestTimings,
+) -> Tuple[str, List[FunctionInfo], List[str], bool]:
+    """
+    Validate the request, read the source and extract functions/classes.
+
+    Parsing and slicing run in the worker process pool so large files do
+    not block the event loop. The last element tells whether the source had
+    to be normalized (line numbers then no longer match the submitted code).
+    """
     logger.info(f"Language: {language}, Format: {format}, File uploaded: {bool(file)}")
-    
+
     allowed_formats = ALLOWED_FORMATS_BY_LANGUAGE.get(language, set())
 
     if format not in allowed_formats:
@@ -135,66 +320,427 @@ async def generate_docs(
         try:
             code = await extract_code_from_file(file)
             logger.info(f"File successfully read: {file.filename} ({len(code)} chars)")
+        except UploadRejected as e:
+            logger.warning(f"Upload rejected: {file.filename}: {e}")
+            raise HTTPException(status_code=e.status_code, detail=str(e))
         except Exception as e:
             logger.error(f"File read error: {e}")
             raise HTTPException(status_code=400, detail="Unable to read the uploaded file.")
 
-    source = code
-
     # Extract functions/classes
     try:
         logger.info("Extracting functions/classes from source code")
-        infos: List[FunctionInfo] = extract_functions_and_classes(language.value, source)
+        with timings.stage("parse"):
+            infos, fn_srcs, source = await parse_in_pool(language.value, code)
         logger.info(f"Extraction complete → Found {len(infos)} items")
     except SyntaxError as e:
         logger.error(f"Syntax error in source: {e}")
         raise HTTPException(status_code=400, detail=f"Syntax error in source: {e}")
+    except ParseTimeout as e:
+        raise HTTPException(status_code=413, detail=f"Source too large to parse: {e}")
+
+    return source, infos, fn_srcs, source != code
+
+
+async def _select(
+    mode: ModeOptions,
+    language: LanguageOptions,
+    infos: List[FunctionInfo],
+    fn_srcs: List[str],
+    previous_code: Optional[str],
+    diff: Optional[str],
+    timings: RequestTimings,
+) -> Tuple[List[FunctionInfo], List[str]]:
+    """Apply the incremental mode: keep only the functions that need docs."""
+    if mode == ModeOptions.all:
+        return infos, fn_srcs
+
+    if mode == ModeOptions.missing:
+        selected = missing_docstrings(infos)
+    elif diff:
+        selected = changed_by_diff(infos, diff)
+    elif previous_code is not None:
+        try:
+            with timings.stage("parse"):
+                selected = await changed_since_in_pool(language.value, infos, fn_srcs, previous_code)
+        except SyntaxError as e:
+            raise HTTPException(status_code=400, detail=f"Syntax error in previous_code: {e}")
+        except ParseTimeout as e:
+            raise HTTPException(status_code=413, detail=f"previous_code too large to parse: {e}")
+    else:
+        raise HTTPException(status_code=400, detail="Mode 'changed' requires previous_code or diff")
+
+    logger.info(f"Incremental mode '{mode.value}' → {len(selected)} of {len(infos)} functions selected")
+    return [infos[i] for i in selected], [fn_srcs[i] for i in selected]
+
+
+async def _insert(
+    source: str,
+    infos: List[FunctionInfo],
+    language: LanguageOptions,
+    timings: RequestTimings,
+    output: OutputOptions = OutputOptions.full,
+    normalized: bool = False,
+    filename: Optional[str] = None,
+) -> Dict[str, object]:
+    """
+    Apply the generated docstrings in the requested output shape:
+    {"modified_code": ...}, {"patches": [...]} or {"diff": ...}.
+    """
+    if output != OutputOptions.full and normalized:
+        # Hunks would refer to the normalized text, not the client's copy
+        logger.info(f"Source was normalized → returning full code instead of '{output.value}'")
+        output = OutputOptions.full
+
+    logger.info(f"Injecting docstrings into source code (output={output.value})")
+    updates = collect_updates(infos)
+    try:
+        with timings.stage("insert"):
+            if output == OutputOptions.patch:
+                result = {"patches": await patch_in_pool(source, updates, language.value)}
+            elif output == OutputOptions.diff:
+                result = {"diff": await diff_in_pool(source, updates, language.value, filename or "source")}
+            else:
+                result = {"modified_code": await insert_in_pool(source, updates, language.value)}
+    except ParseTimeout as e:
+        raise HTTPException(status_code=413, detail=f"Source too large to rebuild: {e}")
+    logger.info("Docstring insertion complete")
+    return result
+
+
+def _deadline(timeout: Optional[float]) -> Optional[float]:
+    """time.monotonic() deadline from the server limit and the client's `timeout`."""
+    limits = [seconds for seconds in (REQUEST_DEADLINE_SECONDS, timeout) if seconds and seconds > 0]
+    return time.monotonic() + min(limits) if limits else None
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """Return once the client has gone away (call after the body was read)."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _generate(
+    request: Request,
+    language: LanguageOptions,
+    format: FormatOptions,
+    infos: List[FunctionInfo],
+    fn_srcs: List[str],
+    batch: bool,
+    deadline: Optional[float],
+) -> None:
+    """
+    Set `generated_docstring` on every info, as iter_generated_docs yields them.
+
+    If the client disconnects first, the remaining model calls are
+    cancelled and 499 is raised. DeadlineExceeded propagates with the
+    docstrings finished so far already set.
+    """
+    async def run():
+        docs = iter_generated_docs(language.value, format.value, infos, fn_srcs, batch=batch, deadline=deadline)
+        async for idx, doctext in docs:
+            infos[idx].generated_docstring = doctext
+
+    work = asyncio.ensure_future(run())
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({work, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (work, disconnected):
+            task.cancel()
+        await asyncio.gather(work, disconnected, return_exceptions=True)
+
+    if work not in done:
+        REQUESTS_CANCELLED.inc(path="/generate", reason="disconnect")
+        logger.info("Client disconnected → remaining model calls cancelled")
+        raise HTTPException(status_code=499, detail="Client closed the request")
+    try:
+        work.result()
+    except DeadlineExceeded as e:
+        REQUESTS_CANCELLED.inc(path="/generate", reason="deadline")
+        logger.warning(f"Generation stopped: {e}")
+        raise
 
-    updates = []
-    docs_resp = []
 
-    sem = asyncio.Semaphore(2)
-    logger.info("Starting docstring generation process")
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics."""
+    stats = llm_scheduler.stats()
+    LLM_CONCURRENCY.set(stats["concurrency_limit"])
+    LLM_IN_FLIGHT.set(stats["in_flight"])
+    LLM_QUEUED.set(stats["queued"])
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
-    async def process(info : FunctionInfo):
-        nonlocal source
-        fn_src = get_source_for_fn(language, source, info)
 
-        logger.info(f"Generating docstring for function: {info.name}")
+@app.get("/llm/stats")
+async def llm_stats():
+    return {
+        "backend": backend.name,
+        "model": backend.model,
+        **llm_scheduler.stats(),
+        "coalesced": inflight.coalesced,
+    }
 
-        async with sem:
-            try:
-                parsed = await generate_docstring(
-                    function_language=language.value,
-                    function_name=info.name,
-                    function_code=fn_src,
-                    function_format=format.value
-                )
-            except Exception as e:
-                logger.error(f"Docstring generation failed for {info.name}: {e}")
-                raise
 
-        doctext = parsed.get("docstring")
-        info.generated_docstring = doctext
+@app.post("/generate", response_model=GenerateResponse)
+async def generate_docs(
+    request: Request,
+    response: Response,
+    code: str = Form(None),
+    language: LanguageOptions = Form(LanguageOptions.python),
+    format: FormatOptions = Form(...),
+    file: UploadFile = File(None),
+    batch: bool = Form(False),
+    mode: ModeOptions = Form(ModeOptions.all),
+    previous_code: str = Form(None),
+    diff: str = Form(None),
+    output: OutputOptions = Form(OutputOptions.full),
+    timeout: float = Form(None),
+    partial: bool = Form(False)
+):
+    """
+    Document every selected function and return the modified source.
+
+    `timeout` (seconds, capped by REQUEST_DEADLINE_SECONDS) bounds the
+    request: when it passes, outstanding model calls are cancelled and the
+    response is 504, or, with `partial`, the docstrings finished so far
+    with `partial: true`.
+    """
+    logger.info("REQUEST RECEIVED → /generate")
+    deadline = _deadline(timeout)
+    timings = RequestTimings()
+    source, infos, fn_srcs, normalized = await _load_request(code, language, format, file, timings)
+    infos, fn_srcs = await _select(mode, language, infos, fn_srcs, previous_code, diff, timings)
 
-        docs_resp.append(FunctionDoc(
-            name=info.name,
-            start_lineno=info.start or 1,
-            end_lineno=info.end or info.start or 1,
-            existing_docstring=info.existing_docstring,
-            generated_docstring=doctext
-        ))
-        updates.append((info.start, info.end, doctext or ""))
+    logger.info(f"Starting docstring generation process (batch={batch})")
+    incomplete = False
+    try:
+        with timings.stage("llm"):
+            await _generate(request, language, format, infos, fn_srcs, batch, deadline)
+    except DeadlineExceeded as e:
+        if not partial:
+            raise HTTPException(status_code=504, detail=f"Deadline exceeded: {e.done} of {e.total} functions documented")
+        incomplete = True
+
+    result = await _insert(
+        source, infos, language, timings, output, normalized, file.filename if file else None
+    )
+    docs_resp = [build_function_doc(info, info.generated_docstring) for info in infos]
+    if "modified_code" not in result:
+        # The hunks already carry the docstrings and the client has the source
+        for doc in docs_resp:
+            doc.existing_docstring = doc.generated_docstring = None
+
+    logger.info(f"Returning final response to client ({timings.server_timing()})")
+    response.headers["Server-Timing"] = timings.server_timing()
+    return GenerateResponse(**result, docs=docs_resp, partial=incomplete)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_docs_stream(
+    request: Request,
+    code: str = Form(None),
+    language: LanguageOptions = Form(LanguageOptions.python),
+    format: FormatOptions = Form(...),
+    file: UploadFile = File(None),
+    batch: bool = Form(False),
+    mode: ModeOptions = Form(ModeOptions.all),
+    previous_code: str = Form(None),
+    diff: str = Form(None),
+    output: OutputOptions = Form(OutputOptions.full),
+    timeout: float = Form(None),
+    partial: bool = Form(False),
+    partial_text: bool = Form(False)
+):
+    """
+    Server-Sent Events variant of /generate.
+
+    Emits `start`, then one `doc` and one `progress` event per function as
+    soon as it is documented, and finally a `result` event carrying
+    `modified_code` (or `patches` / `diff`, see `output`). Idle periods are filled with keep-alive comments so
+    proxies do not time out long jobs.
+
+    `timeout` and `partial` work as for /generate; a missed deadline ends
+    the stream with an `error` event unless `partial` is set. Model work
+    stops as soon as the client disconnects.
+
+    With `partial_text`, `text` events carry the docstring so far while
+    the model is still writing it.
+    """
+    logger.info("REQUEST RECEIVED → /generate/stream")
+    deadline = _deadline(timeout)
+    timings = RequestTimings()
+    source, infos, fn_srcs, normalized = await _load_request(code, language, format, file, timings)
+    infos, fn_srcs = await _select(mode, language, infos, fn_srcs, previous_code, diff, timings)
+
+    async def events():
+        total = len(infos)
+        yield _sse("start", {"total": total})
+
+        texts: Optional[asyncio.Queue] = asyncio.Queue() if partial_text else None
+        on_text = (lambda idx, text: texts.put_nowait((idx, text))) if texts is not None else None
+        docs = iter_generated_docs(
+            language.value, format.value, infos, fn_srcs, batch=batch, deadline=deadline, on_text=on_text
+        )
+        done = 0
+        pending = None
+        next_text = None
+        documented = set()
+        incomplete = False
+        # Without this, a disconnect is only noticed on the next write
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+        llm_started = time.perf_counter()
+        try:
+            while done < total:
+                pending = asyncio.ensure_future(docs.__anext__())
+                while not pending.done():
+                    waits = {pending, disconnected}
+                    if texts is not None:
+                        next_text = next_text or asyncio.ensure_future(texts.get())
+                        waits.add(next_text)
+                    await asyncio.wait(waits, timeout=SSE_KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                    if disconnected.done():
+                        REQUESTS_CANCELLED.inc(path="/generate/stream", reason="disconnect")
+                        logger.info("Client disconnected → remaining model calls cancelled")
+                        return
+                    if next_text is not None and next_text.done():
+                        idx, text = next_text.result()
+                        next_text = None
+                        if idx not in documented:
+                            yield _sse("text", {"index": idx, "text": text})
+                        continue
+                    if not pending.done():
+                        yield ": keep-alive\n\n"
+
+                try:
+                    idx, doctext = pending.result()
+                except DeadlineExceeded as e:
+                    REQUESTS_CANCELLED.inc(path="/generate/stream", reason="deadline")
+                    logger.warning(f"Generation stopped: {e}")
+                    if not partial:
+                        yield _sse("error", {"detail": f"Deadline exceeded: {e.done} of {e.total} functions documented"})
+                        return
+                    incomplete = True
+                    break
+                infos[idx].generated_docstring = doctext
+                documented.add(idx)
+                done += 1
+
+                yield _sse("doc", {"index": idx, **jsonable_encoder(build_function_doc(infos[idx], doctext))})
+                yield _sse("progress", {"done": done, "total": total})
+
+            timings.record("llm", time.perf_counter() - llm_started)
+            result = await _insert(
+                source, infos, language, timings, output, normalized, file.filename if file else None
+            )
+            yield _sse("result", {**result, "partial": incomplete, "timings": timings.as_dict()})
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Client went away or we are done: stop any outstanding work
+            disconnected.cancel()
+            if next_text is not None:
+                next_text.cancel()
+            if pending is not None and not pending.done():
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            await docs.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Jobs (multi-file / archive)
+@app.post("/jobs", status_code=202)
+async def create_docs_job(
+    archive: UploadFile = File(None),
+    files: List[UploadFile] = File(None),
+    format: Optional[FormatOptions] = Form(None)
+):
+    """
+    Create a background job from a zip/tar archive and/or several files.
 
-        logger.info(f"Docstring generated for {info.name} → {len(doctext or '')} chars")
+    Languages are detected from file extensions. `format` applies to every
+    language that supports it; other languages use their default format.
+    """
+    logger.info("REQUEST RECEIVED → /jobs")
 
-    # Sequential execution for safety
-    for info in infos:
-        await process(info)
+    if archive is None and not files:
+        raise HTTPException(status_code=400, detail="Please upload an archive or files")
 
-    logger.info("Injecting docstrings into source code")
-    modified = insert_docstrings_into_source(source, updates, language.value)
-    logger.info("Docstring insertion complete")
+    formats = {
+        lang.value: format.value
+        for lang, allowed in ALLOWED_FORMATS_BY_LANGUAGE.items()
+        if format in allowed
+    }
 
-    logger.info("Returning final response to client")
-    return GenerateResponse(modified_code=modified, docs=docs_resp)
+    try:
+        manifest = await asyncio.to_thread(
+            create_job,
+            archive=archive.file if archive else None,
+            files=[(f.filename, f.file) for f in files or []],
+            formats=formats,
+        )
+    except (JobError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid job input: {e}")
+
+    job_runner.start(manifest["id"])
+    return get_job_status(manifest["id"])
+
+
+@app.get("/jobs/{job_id}")
+async def docs_job_status(job_id: str):
+    status = await asyncio.to_thread(get_job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.get("/jobs/{job_id}/events")
+async def docs_job_events(job_id: str):
+    """Server-Sent Events: a `status` event on every change, then `done`."""
+    if await asyncio.to_thread(get_job_status, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            status = await asyncio.to_thread(get_job_status, job_id)
+            if status != last:
+                yield _sse("status", status)
+                last = status
+            if status["status"] in ("completed", "failed"):
+                yield _sse("done", status)
+                return
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/result")
+async def docs_job_result(job_id: str):
+    status = await asyncio.to_thread(get_job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    path = result_path(job_id)
+    if status["status"] != "completed" or path is None:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}")
+
+    return FileResponse(path, media_type="application/zip", filename=f"docs-{job_id}.zip")
@@ -0,0 +1,13 @@
+# test setup: fake model backend and throwaway cache/job directories
+import os
+import sys
+import tempfile
+
+_SCRATCH = tempfile.mkdtemp(prefix="docgen-tests-")
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:0")
+os.environ.setdefault("DOCSTRING_CACHE_PATH", os.path.join(_SCRATCH, "cache.sqlite3"))
+os.environ.setdefault("JOBS_DIR", os.path.join(_SCRATCH, "jobs"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,1304 @@
+import asyncio
+import io
+import itertools
+import json
+import os
+import time
+
+import pytest
+
+from app import cli, jobs
+from app.cache import DocstringCache
+from app.incremental import changed_by_diff, changed_since, missing_docstrings
+from app.singleflight import SingleFlight
+from app.source import SourceDocument
+from app.utils import extract_c_like_functions, extract_functions_and_classes
+from app.workers import shutdown_executor, start_executor
+
+DOCUMENTED_JS = """\
+/**
+ * Adds two numbers.
+ */
+function add(a, b) {
+  return a + b;
+}
+
+function sub(a, b) {
+  return a - b;
+}
+"""
+
+DOCUMENTED_JAVA = """\
+class B {
+    /** Doubles x. */
+    @Override
+    public static int twice(int x) { return 2 * x; }
+
+    int once(int x) { return x; }
+}
+"""
+
+
+# -------------------------------
+# Incremental selection
+# -------------------------------
+def test_missing_docstrings_skips_documented_js_function():
+    infos = extract_functions_and_classes("JavaScript", DOCUMENTED_JS)
+
+    assert [info.name for info in infos] == ["add", "sub"]
+    assert infos[0].existing_docstring == "Adds two numbers."
+    assert missing_docstrings(infos) == [1]
+
+
+def test_missing_docstrings_skips_documented_java_method():
+    infos = extract_functions_and_classes("Java", DOCUMENTED_JAVA)
+
+    assert [info.name for info in infos] == ["twice", "once"]
+    assert infos[0].existing_docstring == "Doubles x."
+    assert missing_docstrings(infos) == [1]
+
+
+def test_missing_docstrings_python():
+    source = 'def a():\n    """Doc."""\n    return 1\n\n\ndef b():\n    return 2\n'
+    infos = extract_functions_and_classes("Python", source)
+
+    assert missing_docstrings(infos) == [1]
+
+
+def test_changed_by_diff_selects_overlapping_functions():
+    source = "def a():\n    return 1\n\n\ndef b():\n    return 2\n\n\ndef c():\n    return 3\n"
+    infos = extract_functions_and_classes("Python", source)
+    diff = (
+        "--- a/x.py\n+++ b/x.py\n"
+        "@@ -5,2 +5,2 @@\n def b():\n-    return 0\n+    return 2\n"
+    )
+
+    assert changed_by_diff(infos, diff) == [1]
+
+
+def test_changed_by_diff_counts_pure_deletions():
+    source = "def a():\n    return 1\n\n\ndef b():\n    return 2\n"
+    infos = extract_functions_and_classes("Python", source)
+    diff = "@@ -1,3 +1,2 @@\n def a():\n-    x = 0\n     return 1\n"
+
+    assert changed_by_diff(infos, diff) == [0]
+
+
+JAVA_BEFORE = """\
+class C {
+    int first(int x) {
+        int y = x + 1;
+        return y;
+    }
+
+    int second(int x) {
+        return x;
+    }
+}
+"""
+
+
+def test_java_body_edit_is_selected_by_diff_and_by_previous_source():
+    after = JAVA_BEFORE.replace("x + 1", "x + 2")
+    doc = SourceDocument("Java", after)
+    infos = doc.functions
+    diff = "@@ -3,1 +3,1 @@\n-        int y = x + 1;\n+        int y = x + 2;\n"
+
+    assert [(info.start, info.end) for info in infos] == [(2, 5), (7, 9)]
+    assert changed_by_diff(infos, diff) == [0]
+    fn_srcs = [doc.segment(info) for info in infos]
+    assert changed_since("Java", infos, fn_srcs, JAVA_BEFORE) == [0]
+
+
+# -------------------------------
+# Command line
+# -------------------------------
+def _documented_tree(tmp_path):
+    (tmp_path / "a.js").write_text(DOCUMENTED_JS)
+    (tmp_path / "B.java").write_text(DOCUMENTED_JAVA)
+    return tmp_path
+
+
+def test_cli_check_reports_only_undocumented_js_and_java(tmp_path, capsys):
+    root = _documented_tree(tmp_path)
+
+    assert cli.main(["--check", "--jobs", "1", str(root)]) == 1
+
+    out = capsys.readouterr().out
+    assert "sub has no docstring" in out
+    assert "once has no docstring" in out
+    assert "add has no docstring" not in out
+    assert "twice has no docstring" not in out
+
+
+def test_cli_check_passes_on_fully_documented_js_and_java(tmp_path):
+    (tmp_path / "a.js").write_text(DOCUMENTED_JS.split("\n\n")[0] + "\n")
+    (tmp_path / "B.java").write_text(DOCUMENTED_JAVA.replace("\n    int once(int x) { return x; }\n", ""))
+
+    assert cli.main(["--check", "--jobs", "1", str(tmp_path)]) == 0
+
+
+def test_cli_write_keeps_existing_jsdoc_and_javadoc(tmp_path):
+    root = _documented_tree(tmp_path)
+
+    assert cli.main(["--write", "--jobs", "1", str(root)]) == 0
+
+    js = (root / "a.js").read_text()
+    java = (root / "B.java").read_text()
+    assert js.startswith("/**\n * Adds two numbers.\n */\nfunction add")
+    assert "sub (JSDoc docstring generated by the fake backend)" in js
+    assert "/** Doubles x. */\n    @Override" in java
+    assert java.count("/**") == 2
+    assert "once (JavaDoc docstring generated by the fake backend)" in java
+
+
+def test_cli_write_applies_only_the_printed_hunks(tmp_path, capsys):
+    source = "def keep(a):\r\n    return a\r\n\r\n\r\ndef cli_total(items):\r\n    return sum(items)\r\n"
+    (tmp_path / "m.py").write_bytes(source.encode())
+
+    assert cli.main(["--jobs", "1", str(tmp_path)]) == 0
+    out = capsys.readouterr().out
+    added = [line[1:] for line in out.splitlines() if line.startswith("+") and not line.startswith("+++")]
+    assert cli.main(["--write", "--jobs", "1", str(tmp_path)]) == 0
+
+    written = (tmp_path / "m.py").read_bytes().decode()
+    lines = written.split("\r\n")
+    assert added
+    assert [line for line in lines if line in added] == added
+    assert [line for line in lines if line not in added] == source.split("\r\n")
+
+
+def test_cli_skips_python_that_only_parses_after_normalization(tmp_path, capsys):
+    indented = "  def odd(x): return x\n"
+    (tmp_path / "n.py").write_text(indented)
+
+    cli.main(["--write", "--jobs", "1", str(tmp_path)])
+
+    assert (tmp_path / "n.py").read_text() == indented
+    assert "skipped" in capsys.readouterr().err
+
+
+# -------------------------------
+# Insertion and replacement
+# -------------------------------
+def _insert(language, source, doctext):
+    doc = SourceDocument(language, source)
+    return doc.apply_docstrings([(info.start, info.end, doctext) for info in doc.functions])
+
+
+def test_python_docstring_is_inserted():
+    source = "def f(x):\n    return x + 1\n"
+
+    assert _insert("Python", source, "Add one.") == 'def f(x):\n    """Add one."""\n    return x + 1'
+
+
+def test_python_docstring_is_replaced():
+    source = 'def f(x):\n    """\n    Old.\n    """\n    return x + 1\n'
+
+    assert _insert("Python", source, "New.") == 'def f(x):\n    """New."""\n    return x + 1'
+
+
+@pytest.mark.parametrize(
+    "language, source",
+    [
+        ("JavaScript", "function f(x) {\n  return x + 1;\n}\n"),
+        ("TypeScript", "function f(x: number): number {\n  return x + 1;\n}\n"),
+        ("C", "int f(int x) {\n    return x + 1;\n}\n"),
+        ("C++", "int f(int x) {\n    return x + 1;\n}\n"),
+    ],
+)
+def test_block_comment_is_inserted(language, source):
+    assert _insert(language, source, "/** Add one. */") == "/** Add one. */\n" + source.rstrip("\n")
+
+
+@pytest.mark.parametrize(
+    "language, source",
+    [
+        ("JavaScript", "/**\n * Old.\n */\nfunction f(x) {\n  return x + 1;\n}\n"),
+        ("TypeScript", "/// Old.\nfunction f(x: number): number {\n  return x + 1;\n}\n"),
+        ("C", "/** Old. */\nint f(int x) {\n    return x + 1;\n}\n"),
+        ("C++", "/// Old.\n/// Older.\nint f(int x) {\n    return x + 1;\n}\n"),
+    ],
+)
+def test_block_comment_is_replaced(language, source):
+    modified = _insert(language, source, "/** New. */")
+
+    assert modified.startswith("/** New. */\n")
+    assert "Old" not in modified
+    assert modified.count("/**") == 1
+
+
+def test_java_comment_goes_above_annotations():
+    source = "class A {\n    @Override\n    public int f(int x) { return x + 1; }\n}\n"
+
+    assert _insert("Java", source, "/** Add one. */") == (
+        "class A {\n    /** Add one. */\n    @Override\n    public int f(int x) { return x + 1; }\n}"
+    )
+
+
+def test_java_comment_is_replaced_above_annotations():
+    modified = _insert("Java", DOCUMENTED_JAVA, "/** New. */")
+
+    assert "Doubles" not in modified
+    assert modified.count("/** New. */") == 2
+    assert "/** New. */\n    @Override\n    public static int twice" in modified
+
+
+def test_license_header_is_not_replaced():
+    source = "/* Copyright. */\nint f(int x) {\n    return x + 1;\n}\n"
+
+    assert _insert("C", source, "/** Add one. */").startswith("/* Copyright. */\n/** Add one. */\nint f")
+
+
+@pytest.mark.parametrize(
+    "language, source",
+    [
+        (
+            "JavaScript",
+            "/** A. */\nfunction a() {\n  return 1;\n}\nx = 1; /* note */\nfunction b() {\n  return 2;\n}\n",
+        ),
+        (
+            "C",
+            "/** A. */\nint a(void) {\n    return 1;\n}\nint x = 1; /* note */\nint b(void) {\n    return 2;\n}\n",
+        ),
+    ],
+)
+def test_block_comment_after_code_is_not_a_doc_comment(language, source):
+    doc = SourceDocument(language, source)
+    infos = doc.functions
+
+    assert [info.existing_docstring for info in infos] == ["A.", None]
+
+    modified = doc.apply_docstrings([(infos[1].start, infos[1].end, "/** B. */")])
+
+    assert modified == source.replace("/* note */\n", "/* note */\n/** B. */\n").rstrip("\n")
+
+
+# -------------------------------
+# C / C++ extraction
+# -------------------------------
+C_SOURCE = """\
+#include <stdio.h>
+#define BRACE "{"
+
+/** Adds. */
+static int
+add(int a, int b)
+{
+    const char *s = "}";  // }
+    if (a) { return a + b; }
+    return b;
+}
+
+struct point { int x; int y; };
+
+namespace geo {
+class Shape {
+public:
+    /// Area of the shape.
+    double area() const { return 0; }
+    virtual ~Shape() {}
+};
+}
+
+int main(void) {
+    /* } */
+    return add(1, 2);
+}
+"""
+
+
+def test_extract_c_like_functions():
+    infos = extract_c_like_functions(C_SOURCE)
+
+    assert [(info.name, info.start, info.end) for info in infos] == [
+        ("add", 5, 11),
+        ("area", 19, 19),
+        ("~Shape", 20, 20),
+        ("main", 24, 27),
+    ]
+    assert infos[0].existing_docstring == "Adds."
+    assert infos[1].existing_docstring == "Area of the shape."
+    assert infos[3].existing_docstring is None
+
+
+def test_extract_c_like_functions_runs_unterminated_body_to_end_of_file():
+    infos = extract_c_like_functions("void f(void) {\n    if (x) {\n")
+
+    assert [(info.name, info.start, info.end) for info in infos] == [("f", 1, 3)]
+
+
+# -------------------------------
+# SingleFlight
+# -------------------------------
+def test_singleflight_coalesces_concurrent_calls():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        other = await flight.do("other", work)
+        return flight, results, other
+
+    flight, results, other = asyncio.run(scenario())
+
+    assert results == [1] * 5
+    assert flight.coalesced == 4
+    assert other == 2
+    assert calls == 2
+
+
+def test_singleflight_cancels_work_when_every_caller_left():
+    started = asyncio.Event()
+    cancelled = False
+
+    async def work():
+        nonlocal cancelled
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def scenario():
+        flight = SingleFlight()
+        callers = [asyncio.ensure_future(flight.do("key", work)) for _ in range(2)]
+        await started.wait()
+        callers[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert cancelled
+
+
+# -------------------------------
+# Docstring cache
+# -------------------------------
+def test_cache_entries_expire_after_ttl(tmp_path, monkeypatch):
+    cache = DocstringCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.put("key", "doc")
+
+    assert cache.get("key") == "doc"
+
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    cache = DocstringCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    clock = itertools.count(1000)
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    cache.put("a", "doc a")
+    cache.put("b", "doc b")
+    cache.get("a")
+    cache.put("c", "doc c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "doc a"
+    assert cache.get("c") == "doc c"
+
+
+def test_cache_evicts_by_size(tmp_path):
+    cache = DocstringCache(str(tmp_path / "cache.sqlite3"), max_bytes=10)
+    cache.put("a", "12345678")
+    cache.put("b", "12345678")
+
+    assert cache.stats()["entries"] == 1
+    assert cache.get("b") == "12345678"
+
+
+def test_cache_keeps_running_totals(tmp_path):
+    cache = DocstringCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("a", "12345")
+    cache.put("a", "1234567")
+    cache.put("b", "12")
+    cache.put("c", "123")
+
+    stats = cache.stats()
+    conn = cache._connect()
+    assert (stats["entries"], stats["bytes"]) == (2, 5)
+    assert conn.execute("SELECT COUNT(*), SUM(size) FROM docstrings").fetchone() == (2, 5)
+
+
+def test_cache_writes_lookup_stats_in_batches(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DocstringCache(path)
+    other = DocstringCache(path)
+    cache.put("a", "doc a")
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+
+    assert other.stats()["hits"] == 0
+    cache.flush()
+    assert (other.stats()["hits"], other.stats()["misses"]) == (2, 1)
+
+
+# -------------------------------
+# /generate deadlines
+# -------------------------------
+SLOW_SOURCE = """\
+def fast_total(items):
+    total = 0
+    for item in items:
+        total += item.price
+    return total
+
+
+def slow_report(orders, stream):
+    for order in orders:
+        stream.write(order.describe())
+    stream.flush()
+"""
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from app import openai_client
+
+    # First model call returns at once, every later one takes 5s
+    delays = itertools.chain([0.0], itertools.repeat(5.0))
+    monkeypatch.setattr(openai_client.backend, "sample_latency", lambda rng: next(delays))
+    # Every request has to reach the model
+    monkeypatch.setattr(openai_client, "docstring_cache", None)
+    monkeypatch.setattr(openai_client, "similarity_index", None)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _post_slow(client, **fields):
+    data = {"code": SLOW_SOURCE, "language": "Python", "format": "Google", "timeout": "0.5", **fields}
+    return client.post("/generate", data=data)
+
+
+def test_generate_deadline_returns_504(client):
+    response = _post_slow(client)
+
+    assert response.status_code == 504
+    assert response.json()["detail"] == "Deadline exceeded: 1 of 2 functions documented"
+
+
+def test_generate_deadline_with_partial_returns_finished_docstrings(client):
+    started = time.monotonic()
+    response = _post_slow(client, partial="true")
+
+    assert time.monotonic() - started < 4
+    assert response.status_code == 200
+    body = response.json()
+    assert body["partial"] is True
+    documented = [doc["name"] for doc in body["docs"] if doc["generated_docstring"]]
+    assert documented == ["fast_total"]
+    assert "fake backend" in body["modified_code"]
+
+
+# -------------------------------
+# Hedging
+# -------------------------------
+def test_hedge_delay_only_learns_from_completed_primary_calls(monkeypatch):
+    from app import openai_client
+    from app.hedging import LatencyTracker
+
+    tracker = LatencyTracker()
+    monkeypatch.setattr(tracker, "hedge_delay", lambda: 0.05)
+    monkeypatch.setattr(openai_client, "call_latency", tracker)
+    # Primary, hedge (wins), then a fast primary that finishes before the hedge delay
+    delays = iter([1.0, 0.0, 0.0])
+    monkeypatch.setattr(openai_client.backend, "sample_latency", lambda rng: next(delays))
+
+    started = time.monotonic()
+    asyncio.run(openai_client._complete("Write a docstring for hedged_one.", 64, language="python"))
+
+    assert time.monotonic() - started < 0.5
+    assert list(tracker.samples) == []
+
+    asyncio.run(openai_client._complete("Write a docstring for hedged_two.", 64, language="python"))
+
+    assert len(tracker.samples) == 1
+    assert tracker.samples[0] < 0.05
+
+
+# -------------------------------
+# Jobs
+# -------------------------------
+def test_create_job_rejects_path_collisions_and_cleans_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    files = [("a.py", io.BytesIO(b"x = 1\n")), ("a.py/b.py", io.BytesIO(b"y = 2\n"))]
+
+    with pytest.raises(jobs.JobError, match="Cannot extract a.py/b.py"):
+        jobs.create_job(files=files)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_job_documents_files_and_records_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    source = b"def job_total(items):\n    total = sum(items)\n    return total * 2\n"
+    manifest = jobs.create_job(files=[("pkg/job.py", io.BytesIO(source))])
+
+    async def run():
+        await start_executor(1)
+        try:
+            await jobs.JobRunner()._run(manifest["id"])
+        finally:
+            shutdown_executor()
+
+    asyncio.run(run())
+
+    status = jobs.get_job_status(manifest["id"])
+    assert status["status"] == "completed"
+    assert status["processed_files"] == 1
+    assert status["functions_documented"] == 1
+    output = tmp_path / manifest["id"] / "output" / "pkg" / "job.py"
+    assert "job_total (Google docstring generated by the fake backend)" in output.read_text()
+    assert jobs.result_path(manifest["id"]) is not None
+
+
+def test_resumed_job_keeps_latin1_text_and_skips_binaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    latin1 = "# café\ndef job_price(cost):\n    return cost * 2\n".encode("latin-1")
+    manifest = jobs.create_job(files=[("price.py", io.BytesIO(latin1)), ("blob.py", io.BytesIO(b"\0\1\2" * 100))])
+
+    async def run():
+        await start_executor(1)
+        runner = jobs.JobRunner()
+        try:
+            await runner.resume_all()
+            await asyncio.gather(*runner._tasks.values())
+        finally:
+            shutdown_executor()
+
+    asyncio.run(run())
+
+    status = jobs.get_job_status(manifest["id"])
+    output = tmp_path / manifest["id"] / "output"
+    assert status["status"] == "completed"
+    assert (output / "price.py").read_text(encoding="utf-8").startswith("# café\n")
+    assert not (output / "blob.py").exists()
+
+
+# -------------------------------
+# Cache keys
+# -------------------------------
+def test_callee_summaries_are_part_of_the_cache_key(monkeypatch):
+    from app import openai_client
+    from app.prompting import CalleeSummary
+
+    monkeypatch.setattr(openai_client, "docstring_cache", DocstringCache(":memory:"))
+    monkeypatch.setattr(openai_client, "similarity_index", None)
+    code = "def keyed_report(rows):\n    lines = render(rows)\n    return publish(lines)\n"
+
+    def generate(summary):
+        callees = [CalleeSummary("render", 0, summary)]
+        return openai_client.generate_docstring("python", "keyed_report", code, "Google", callees=callees)
+
+    async def scenario():
+        before = openai_client.backend.calls
+        await generate("Render rows as text lines.")
+        await generate("Render rows as text lines.")
+        await generate("Render rows as HTML.")
+        return openai_client.backend.calls - before
+
+    assert asyncio.run(scenario()) == 2
+
+
+# -------------------------------
+# Near-duplicates
+# -------------------------------
+def test_near_duplicate_with_different_callee_is_not_reused():
+    from app.similarity import SimilarityIndex
+
+    index = SimilarityIndex()
+    index.add("s", "smallest", "def smallest(values):\n    return min(values)\n", "Return the smallest value.")
+    match = index.lookup("s", "largest", "def largest(values):\n    return max(values)\n")
+    assert match is None or match.substitutions is None
+
+
+def test_near_duplicate_with_different_literal_is_not_reused():
+    from app.similarity import SimilarityIndex
+
+    index = SimilarityIndex()
+    active = "def active_users(users):\n    return [u for u in users if u.status == \"active\"]\n"
+    deleted = "def deleted_users(users):\n    return [u for u in users if u.status == \"deleted\"]\n"
+    index.add("s", "active_users", active, "Return the users whose status is active.")
+    match = index.lookup("s", "deleted_users", deleted)
+    assert match is None or match.substitutions is None
+
+
+def test_near_duplicate_reuse_renames_locals_and_skips_the_cache(monkeypatch):
+    from app import openai_client
+    from app.similarity import SimilarityIndex
+
+    cache = DocstringCache(":memory:")
+    index = SimilarityIndex()
+    monkeypatch.setattr(openai_client, "docstring_cache", cache)
+    monkeypatch.setattr(openai_client, "similarity_index", index)
+    user = "def load_user(db, user_id):\n    row = db.fetch('users', user_id)\n    return decode(row)\n"
+    order = "def load_order(db, order_id):\n    row = db.fetch('users', order_id)\n    return decode(row)\n"
+    scope = openai_client._similarity_scope("python", "Google")
+    index.add(scope, "load_user", user, "Load a user.\n\nArgs:\n    db: Database.\n    user_id: Id of the user.")
+
+    before = openai_client.backend.calls
+    result = asyncio.run(openai_client.generate_docstring("python", "load_order", order, "Google"))
+    assert openai_client.backend.calls == before
+    assert "order_id:" in result["docstring"] and "user_id" not in result["docstring"]
+    assert cache.stats()["entries"] == 0
+
+
+# -------------------------------
+# Worker pool
+# -------------------------------
+def test_timed_out_job_does_not_block_the_next_parse():
+    from app import workers
+
+    async def scenario():
+        await start_executor(1)
+        try:
+            with pytest.raises(workers.ParseTimeout):
+                await workers._run(time.sleep, 60, timeout=0.5)
+            started = time.perf_counter()
+            infos, _, _ = await workers.parse_in_pool("Python", "def f(x):\n    return x\n")
+            return infos, time.perf_counter() - started
+        finally:
+            shutdown_executor()
+
+    infos, elapsed = asyncio.run(scenario())
+    assert [info.name for info in infos] == ["f"]
+    assert elapsed < 30
+
+
+# -------------------------------
+# Concurrent generation
+# -------------------------------
+FAN_OUT_SOURCE = "".join(
+    f"def fan_{name}(rows):\n    picked = [row.{name} for row in rows]\n    return sorted(picked)\n\n\n"
+    for name in ("alpha", "beta", "gamma", "delta", "broken")
+)
+
+
+@pytest.fixture
+def app_client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from app import openai_client
+
+    monkeypatch.setattr(openai_client, "docstring_cache", None)
+    monkeypatch.setattr(openai_client, "similarity_index", None)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_generate_runs_functions_concurrently_and_survives_a_failure(app_client, monkeypatch):
+    from app import openai_client, pipeline
+
+    monkeypatch.setattr(openai_client.backend, "sample_latency", lambda rng: 0.4)
+    generate = pipeline.generate_docstring
+
+    async def flaky(**kwargs):
+        if kwargs["function_name"] == "fan_broken":
+            raise RuntimeError("model exploded")
+        return await generate(**kwargs)
+
+    monkeypatch.setattr(pipeline, "generate_docstring", flaky)
+
+    started = time.monotonic()
+    response = app_client.post("/generate", data={"code": FAN_OUT_SOURCE, "language": "Python", "format": "Google"})
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    docs = response.json()["docs"]
+    assert [doc["name"] for doc in docs] == ["fan_alpha", "fan_beta", "fan_gamma", "fan_delta", "fan_broken"]
+    assert all(doc["generated_docstring"] for doc in docs[:4])
+    assert docs[4]["generated_docstring"] is None
+    # Four model calls of 0.4s each, back to back, would take 1.6s
+    assert elapsed < 1.4
+
+
+# -------------------------------
+# Batching
+# -------------------------------
+BATCH_FUNCTIONS = [
+    (f"batch_{name}", f"def batch_{name}(rows):\n    picked = [row.{name} for row in rows]\n    return sorted(picked)\n")
+    for name in ("alpha", "beta", "gamma")
+]
+
+
+@pytest.fixture
+def uncached_llm(monkeypatch):
+    from app import openai_client
+
+    monkeypatch.setattr(openai_client, "docstring_cache", None)
+    monkeypatch.setattr(openai_client, "similarity_index", None)
+    return openai_client
+
+
+def test_pack_batches_keeps_order_within_the_token_budget():
+    from app.openai_client import pack_batches
+
+    functions = [(f"f{idx}", "x = 1\n" * 40) for idx in range(6)]
+    batches = pack_batches(functions, token_budget=200, max_functions=4)
+
+    assert [idx for batch in batches for idx in batch] == list(range(6))
+    assert len(batches) > 1
+    assert all(len(batch) <= 4 for batch in batches)
+
+
+def test_batch_documents_several_functions_with_one_call(uncached_llm):
+    before = uncached_llm.backend.calls
+    results = asyncio.run(uncached_llm.generate_docstrings_batch("python", BATCH_FUNCTIONS, "Google"))
+
+    assert uncached_llm.backend.calls - before == 1
+    assert [result["function_name"] for result in results] == [name for name, _ in BATCH_FUNCTIONS]
+    assert all(name in result["docstring"] for (name, _), result in zip(BATCH_FUNCTIONS, results))
+
+
+@pytest.mark.parametrize("batch_output, fallbacks", [
+    ("Sorry, here are your docstrings!", 3),
+    ('[{"id": 1, "docstring": "Pick the beta values."}]', 2),
+])
+def test_unparseable_batch_output_falls_back_to_single_calls(uncached_llm, monkeypatch, batch_output, fallbacks):
+    from app.metrics import FALLBACKS
+
+    complete = uncached_llm._complete
+
+    async def batch_garbage(prompt, max_tokens, system=uncached_llm.SYSTEM_PROMPT, **kwargs):
+        if system == uncached_llm.BATCH_SYSTEM_PROMPT:
+            return batch_output
+        return await complete(prompt, max_tokens, system=system, **kwargs)
+
+    monkeypatch.setattr(uncached_llm, "_complete", batch_garbage)
+    before = uncached_llm.backend.calls, FALLBACKS.value(language="python", format="Google")
+    results = asyncio.run(uncached_llm.generate_docstrings_batch("python", BATCH_FUNCTIONS, "Google"))
+
+    assert uncached_llm.backend.calls - before[0] == fallbacks
+    assert FALLBACKS.value(language="python", format="Google") - before[1] == fallbacks
+    assert all(result["docstring"] for result in results)
+    if fallbacks == 2:
+        assert results[1]["raw_docstring"] == "Pick the beta values."
+
+
+# -------------------------------
+# Server-Sent Events
+# -------------------------------
+def _sse_events(body: str):
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_generate_stream_sends_each_doc_then_the_result(app_client):
+    data = {"code": FAN_OUT_SOURCE, "language": "Python", "format": "Google"}
+    response = app_client.post("/generate/stream", data=data)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["start"] + ["doc", "progress"] * 5 + ["result"]
+    assert events[0][1] == {"total": 5}
+    assert [payload["done"] for kind, payload in events if kind == "progress"] == [1, 2, 3, 4, 5]
+    assert sorted(payload["index"] for kind, payload in events if kind == "doc") == list(range(5))
+    result = events[-1][1]
+    assert result["partial"] is False
+    assert "fan_alpha (Google docstring generated by the fake backend)" in result["modified_code"]
+
+
+def test_generate_stream_passes_partial_text_through(app_client, monkeypatch):
+    from app import openai_client
+
+    # A multi-line completion in pieces of ~4 tokens, 50ms apart
+    monkeypatch.setattr(openai_client.backend, "ramble_tokens", 20)
+    monkeypatch.setattr(openai_client.backend, "tokens_per_second", 80)
+    data = {"code": FAN_OUT_SOURCE, "language": "Python", "format": "Google", "partial_text": "true"}
+    events = _sse_events(app_client.post("/generate/stream", data=data).text)
+
+    texts = [payload for kind, payload in events if kind == "text"]
+    assert texts
+    assert all(set(payload) == {"index", "text"} for payload in texts)
+    assert events[-1][0] == "result"
+
+
+# -------------------------------
+# Scheduler
+# -------------------------------
+def test_token_bucket_waits_for_refill():
+    from app.scheduler import TokenBucket
+
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+
+    assert 0.9 < bucket.wait_time(1) <= 1.0
+    assert TokenBucket(per_minute=0).wait_time(10 ** 9) == 0.0
+
+
+def test_scheduler_halves_concurrency_on_429_and_honours_retry_after():
+    from app.llm import LLMError
+    from app.scheduler import LLMScheduler
+
+    scheduler = LLMScheduler(initial_concurrency=4)
+    attempts = []
+
+    async def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise LLMError("slow down", status_code=429, retry_after=0.2)
+        return "ok"
+
+    assert asyncio.run(scheduler.run(call)) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+    assert scheduler.throttled == 1
+    # Halved, then one additive step for the successful retry
+    assert scheduler.limit == 2.5
+
+
+def test_scheduler_does_not_retry_client_errors():
+    from app.llm import LLMError
+    from app.scheduler import LLMScheduler
+
+    scheduler = LLMScheduler()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise LLMError("bad request", status_code=400)
+
+    with pytest.raises(LLMError):
+        asyncio.run(scheduler.run(call))
+    assert len(calls) == 1
+
+
+def test_scheduler_serves_keys_round_robin():
+    from app.scheduler import LLMScheduler
+
+    scheduler = LLMScheduler(initial_concurrency=1, max_concurrency=1)
+    order = []
+
+    def call(name):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0.01)
+        return run
+
+    async def scenario():
+        big = [asyncio.ensure_future(scheduler.run(call(f"big{idx}"), key="big")) for idx in range(4)]
+        await asyncio.sleep(0)
+        small = asyncio.ensure_future(scheduler.run(call("small"), key="small"))
+        await asyncio.gather(*big, small)
+
+    asyncio.run(scenario())
+    # FIFO would run it last
+    assert order.index("small") == 2
+
+
+# -------------------------------
+# Source index
+# -------------------------------
+def test_segment_slices_functions_with_crlf_and_non_ascii_text():
+    source = "x = 'é'\r\n\r\nclass Café:\r\n    def naïve(self, ß):\r\n        return ß\r\n"
+    doc = SourceDocument("Python", source)
+
+    assert [info.name for info in doc.functions] == ["Café", "naïve"]
+    assert doc.segment(doc.functions[1]) == "def naïve(self, ß):\r\n        return ß"
+    assert doc.line_span(3, 3) == "class Café:"
+    assert doc.line_span(5, 99) == "        return ß"
+
+
+def test_patches_and_apply_docstrings_agree():
+    source = "def a(x):\n    return x\n\n\ndef b(y):\n    '''Old.'''\n    return y\n"
+    doc = SourceDocument("Python", source)
+    updates = [(info.start, info.end, f"Doc of {info.name}.") for info in doc.functions]
+
+    lines = source.splitlines()
+    for patch in reversed(doc.patches(updates)):
+        start = patch["start_line"] - 1
+        lines[start:start + patch["delete_lines"]] = patch["text"].split("\n")
+
+    assert "\n".join(lines) == doc.apply_docstrings(updates)
+    assert doc.apply_docstrings(updates).count('"""') == 4
+    assert "Old." not in doc.apply_docstrings(updates)
+
+
+# -------------------------------
+# Output modes
+# -------------------------------
+def _generate(client, output, headers=None):
+    data = {"code": FAN_OUT_SOURCE, "language": "Python", "format": "Google", "output": output}
+    return client.post("/generate", data=data, headers=headers or {})
+
+
+def test_patch_output_rebuilds_the_full_output(app_client):
+    full = _generate(app_client, "full").json()
+    patched = _generate(app_client, "patch").json()
+
+    assert "modified_code" not in patched or patched["modified_code"] is None
+    lines = FAN_OUT_SOURCE.splitlines()
+    for patch in reversed(patched["patches"]):
+        start = patch["start_line"] - 1
+        lines[start:start + patch["delete_lines"]] = patch["text"].split("\n")
+    assert "\n".join(lines) == full["modified_code"]
+    # The hunks carry the docstrings: docs only keep names and line ranges
+    assert all(doc["generated_docstring"] is None for doc in patched["docs"])
+
+
+def test_diff_output_is_a_unified_diff(app_client):
+    diff = _generate(app_client, "diff").json()["diff"]
+
+    assert diff.startswith("--- a/source\n+++ b/source\n@@ -")
+    assert sum(1 for line in diff.splitlines() if line.startswith('+    """')) == 5
+
+
+def test_large_responses_are_gzip_compressed(app_client):
+    response = _generate(app_client, "full", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers.get("content-encoding") == "gzip"
+    assert "fan_alpha" in response.json()["modified_code"]
+
+
+# -------------------------------
+# Model backends
+# -------------------------------
+def test_parse_latency_specs():
+    import random
+
+    from app.llm import parse_latency
+
+    rng = random.Random(1)
+    assert parse_latency("fixed:0.2")(rng) == 0.2
+    assert 0.1 <= parse_latency("uniform:0.1,0.5")(rng) <= 0.5
+    assert parse_latency("normal:0.3,10")(rng) >= 0.0
+    for spec in ("fixed", "uniform:1", "gamma:1,2", "fixed:fast"):
+        with pytest.raises(ValueError):
+            parse_latency(spec)
+
+
+def test_fake_backend_injects_errors_and_rate_limits():
+    from app.llm import FakeBackend, LLMError, create_backend
+
+    prompt = "Generate a Google docstring\nFunction name:\n  tally\n"
+    text = asyncio.run(FakeBackend(seed=1).complete("system", prompt, 100)).text
+    assert text == "tally (Google docstring generated by the fake backend)."
+
+    with pytest.raises(LLMError) as failed:
+        asyncio.run(FakeBackend(error_rate=1.0).complete("system", prompt, 100))
+    assert failed.value.status_code == 500
+
+    with pytest.raises(LLMError) as limited:
+        asyncio.run(FakeBackend(rate_limit_rate=1.0, retry_after=7).complete("system", prompt, 100))
+    assert (limited.value.status_code, limited.value.retry_after) == (429, 7)
+
+    assert create_backend("fake").name == "fake"
+    with pytest.raises(ValueError):
+        create_backend("nope")
+
+
+def _openai_backend(handler):
+    import httpx
+
+    from app.llm import OpenAICompatibleBackend
+
+    backend = OpenAICompatibleBackend("local", base_url="http://llm.test/v1")
+    backend._client = httpx.AsyncClient(base_url=backend.base_url, transport=httpx.MockTransport(handler))
+    return backend
+
+
+def test_openai_compatible_backend_completes_and_streams():
+    import httpx
+
+    def handler(request):
+        payload = json.loads(request.content)
+        assert request.url.path == "/v1/chat/completions"
+        assert payload["model"] == "local" and payload["stop"] == ['"""']
+        if payload.get("stream"):
+            chunks = [{"choices": [{"delta": {"content": "Sum "}}]}, {"choices": [{"delta": {"content": "rows."}}]},
+                      {"choices": [], "usage": {"prompt_tokens": 9, "completion_tokens": 2}}]
+            body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=body)
+        message = {"message": {"content": "Sum rows."}}
+        return httpx.Response(200, json={"choices": [message], "usage": {"prompt_tokens": 9, "completion_tokens": 2}})
+
+    backend = _openai_backend(handler)
+
+    async def scenario():
+        completion = await backend.complete("system", "prompt", 50, stop=['"""'])
+        pieces = [piece async for piece in backend.stream("system", "prompt", 50, stop=['"""'])]
+        await backend.aclose()
+        return completion, pieces
+
+    completion, pieces = asyncio.run(scenario())
+    assert tuple(completion) == ("Sum rows.", 9, 2)
+    assert "".join(piece.text for piece in pieces) == "Sum rows."
+    assert (pieces[-1].prompt_tokens, pieces[-1].completion_tokens) == (9, 2)
+
+
+def test_openai_compatible_backend_reports_rate_limits():
+    import httpx
+
+    from app.llm import LLMError
+
+    backend = _openai_backend(lambda request: httpx.Response(429, headers={"retry-after": "3"}, text="busy"))
+
+    with pytest.raises(LLMError) as limited:
+        asyncio.run(backend.complete("system", "prompt", 50))
+    assert (limited.value.status_code, limited.value.retry_after) == (429, 3.0)
+
+
+# -------------------------------
+# Metrics
+# -------------------------------
+def test_histogram_exposes_cumulative_buckets():
+    from app.metrics import REGISTRY, Histogram
+
+    histogram = Histogram("test_seconds", "Test histogram.", ["stage"], buckets=(0.1, 1.0))
+    REGISTRY.remove(histogram)
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage="parse")
+
+    assert histogram.expose().splitlines() == [
+        "# HELP test_seconds Test histogram.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="parse",le="0.1"} 1',
+        'test_seconds_bucket{stage="parse",le="1"} 2',
+        'test_seconds_bucket{stage="parse",le="+Inf"} 3',
+        'test_seconds_sum{stage="parse"} 5.55',
+        'test_seconds_count{stage="parse"} 3',
+    ]
+
+
+def test_generate_is_counted_in_metrics_and_server_timing(app_client):
+    from app.metrics import FUNCTIONS
+
+    before = FUNCTIONS.value(language="Python", format="Google", outcome="generated")
+    response = app_client.post("/generate", data={"code": FAN_OUT_SOURCE, "language": "Python", "format": "Google"})
+
+    assert FUNCTIONS.value(language="Python", format="Google", outcome="generated") - before == 5
+    stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert stages[:2] == ["parse", "llm"] and "insert" in stages
+
+    metrics = app_client.get("/metrics").text
+    assert 'docgen_stage_seconds_count{stage="parse"}' in metrics
+    assert "docgen_llm_call_seconds_bucket" in metrics
+    assert "docgen_response_bytes_count" in metrics
+    assert "# TYPE docgen_llm_concurrency_limit gauge" in metrics
+
+
+# -------------------------------
+# Prompt compaction
+# -------------------------------
+def _big_class():
+    body = "".join(f"        x{j} = a + b * {j}\n" for j in range(30))
+    methods = "".join(f"    @property\n    def m{i}(self, a, b=2):\n{body}        return x0\n\n" for i in range(20))
+    return "@dataclass\nclass Big(Base):\n    limit = 10\n\n" + methods
+
+
+def test_compact_source_leaves_small_code_alone():
+    from app.prompting import compact_source
+
+    code = "def small(a):\n    return a + 1\n"
+    assert compact_source("python", code, budget=100) == code
+
+
+def test_compact_source_reduces_a_class_to_its_skeleton():
+    from app.prompting import compact_source, estimate_tokens
+
+    compact = compact_source("python", _big_class(), budget=400)
+
+    assert estimate_tokens(compact) <= 400
+    assert compact.startswith("@dataclass\nclass Big(Base):\n    limit = 10\n")
+    assert "    @property\n    def m0(self, a, b=2):\n        ...\n" in compact
+    assert "x29" not in compact
+
+
+def test_compact_source_collapses_nested_blocks_in_brace_languages():
+    from app.prompting import compact_source, estimate_tokens
+
+    body = "".join(f"  if (a > {i}) {{\n    for (;;) {{ a--; }}\n    call{i}(a);\n  }}\n" for i in range(100))
+    code = "function big(a) {\n" + body + "  return a;\n}\n"
+    compact = compact_source("javascript", code, budget=300)
+
+    assert estimate_tokens(compact) <= 300
+    assert compact.startswith("function big(a) {\n  if (a > 0) {\n    // ...\n  }\n")
+    assert compact.rstrip().endswith("return a;\n}")
+
+
+def test_completion_tokens_scale_with_code_size_within_bounds():
+    from app.prompting import MAX_COMPLETION_TOKENS_PER_FUNCTION, MIN_COMPLETION_TOKENS, completion_tokens_for
+
+    small = completion_tokens_for("def f():\n    pass\n")
+    medium = completion_tokens_for("x = 1\n" * 400)
+    huge = completion_tokens_for("x = 1\n" * 100000)
+
+    assert MIN_COMPLETION_TOKENS <= small < MIN_COMPLETION_TOKENS + 8
+    assert small < medium < huge == MAX_COMPLETION_TOKENS_PER_FUNCTION
+
+
+# -------------------------------
+# Templates
+# -------------------------------
+@pytest.mark.parametrize("language, style, name, code, kind, expected", [
+    ("python", "Google", "set_name", "def set_name(self, value):\n    self._name = value\n",
+     "setter", "Set the name.\n\nArgs:\n    value: The value."),
+    ("python", "Google", "load", "def load(self, path, mode='r'):\n    return self._load(path, mode)\n",
+     "delegate", "Delegate to `self._load`.\n\nArgs:\n    path: The path.\n    mode: The mode. Defaults to 'r'."
+     "\n\nReturns:\n    The result of `self._load`."),
+    ("python", "NumPy", "__repr__", "def __repr__(self):\n    return f'X({self.a})'\n",
+     "dunder", "Return the developer-facing representation of the object.\n\nReturns\n-------\nstr\n"
+     "    The developer-facing representation of the object."),
+    ("java", "JavaDoc", "setName", "public void setName(String name) {\n    this.name = name;\n}",
+     "setter", "/**\n * Set the name.\n *\n * @param name The name.\n */"),
+])
+def test_trivial_functions_are_documented_from_templates(language, style, name, code, kind, expected):
+    from app.templates import template_docstring
+
+    templated = template_docstring(language, style, name, code)
+
+    assert (templated.kind, templated.docstring) == (kind, expected)
+
+
+def test_templates_skip_real_work_and_can_be_disabled():
+    from app.templates import template_docstring
+
+    work = "def total(self, items):\n    s = sum(items)\n    return s * 2\n"
+    getter = "def get_name(self):\n    return self._name\n"
+
+    assert template_docstring("python", "Google", "total", work) is None
+    assert template_docstring("python", "Google", "get_name", getter, max_statements=0) is None
+
+
+def test_templated_functions_make_no_model_call(uncached_llm):
+    from app.metrics import TEMPLATE_DOCSTRINGS
+
+    before = uncached_llm.backend.calls, TEMPLATE_DOCSTRINGS.value()
+    code = "def set_name(self, value):\n    self._name = value\n"
+    result = asyncio.run(uncached_llm.generate_docstring("python", "set_name", code, "Google"))
+
+    assert "Set the name." in result["docstring"]
+    assert uncached_llm.backend.calls == before[0]
+    assert TEMPLATE_DOCSTRINGS.value() - before[1] == 1
+
+
+# -------------------------------
+# Streamed completions
+# -------------------------------
+@pytest.mark.parametrize("language, text, expected", [
+    ("python", '```python\n"""Sum the rows.\n\nArgs:\n    rows: Rows.\n"""\n```\nThis docstring explains',
+     ("Sum the rows.\n\nArgs:\n    rows: Rows.", True)),
+    ("python", '"""Sum the rows.\n\nArgs:', ("Sum the rows.\n\nArgs:", False)),
+    ("javascript", "Here it is:\n/**\n * Sum the rows.\n */\nfunction", ("/**\n * Sum the rows.\n */", True)),
+    ("javascript", "/**\n * Sum the", ("/**\n * Sum the", False)),
+    ("python", "```", ("", False)),
+])
+def test_trim_docstring(language, text, expected):
+    from app.streaming import trim_docstring
+
+    assert trim_docstring(language, text) == expected
+
+
+def test_stop_sequences_keep_comment_ends():
+    from app.streaming import stop_sequences
+
+    assert '\n"""\n' in stop_sequences("Python")
+    assert all("*/" not in sequence for sequence in stop_sequences("Java"))
+
+
+def test_rambling_stream_is_closed_after_the_docstring(uncached_llm, monkeypatch):
+    from app.metrics import EARLY_STOPS
+
+    monkeypatch.setattr(uncached_llm.backend, "ramble_tokens", 400)
+    monkeypatch.setattr(uncached_llm.backend, "tokens_per_second", 400)
+    # `*/` is not a stop sequence: the client has to notice the end itself
+    code = "function rambleTotal(rows) {\n  const total = sum(rows);\n  return total * 2;\n}"
+    before = EARLY_STOPS.value()
+    started = time.monotonic()
+    result = asyncio.run(uncached_llm.generate_docstring("javascript", "rambleTotal", code, "JSDoc"))
+
+    assert result["raw_docstring"] == "/**\n * rambleTotal (JSDoc docstring generated by the fake backend).\n */"
+    assert EARLY_STOPS.value() - before == 1
+    # The whole ramble would take a second to stream
+    assert time.monotonic() - started < 0.5
+
+
+# -------------------------------
+# Uploads
+# -------------------------------
+def _read_upload(data: bytes, size=None, max_bytes=None, spooled=False):
+    import tempfile
+
+    from starlette.datastructures import UploadFile
+
+    from app.utils import MAX_UPLOAD_BYTES, extract_code_from_file
+
+    fileobj = tempfile.TemporaryFile() if spooled else io.BytesIO()
+    fileobj.write(data)
+    fileobj.seek(0)
+    upload = UploadFile(fileobj, size=size, filename="upload.py")
+    try:
+        return asyncio.run(extract_code_from_file(upload, max_bytes or MAX_UPLOAD_BYTES))
+    finally:
+        fileobj.close()
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("def café():\n    pass\n".encode("utf-8"), "def café():\n    pass\n"),
+    ("# café\n".encode("latin-1"), "# café\n"),
+    ("# café\n".encode("utf-16"), "# café\n"),
+    (b"\xef\xbb\xbfx = 1\n", "x = 1\n"),
+])
+def test_upload_encoding_is_detected(data, expected):
+    assert _read_upload(data) == expected
+
+
+def test_oversized_and_binary_uploads_are_rejected():
+    from app.utils import UploadRejected
+
+    with pytest.raises(UploadRejected) as declared:
+        _read_upload(b"x" * 10, size=10 ** 9, max_bytes=100)
+    assert declared.value.status_code == 413
+    with pytest.raises(UploadRejected) as streamed:
+        _read_upload(b"x = 1\n" * 100, max_bytes=100)
+    assert streamed.value.status_code == 413
+    with pytest.raises(UploadRejected) as binary:
+        _read_upload(b"\x7fELF\x02\x01\x01\x00" + bytes(range(256)))
+    assert binary.value.status_code == 415
+
+
+def test_large_uploads_are_decoded_from_a_memory_map(monkeypatch):
+    from app import utils
+
+    monkeypatch.setattr(utils, "UPLOAD_MMAP_BYTES", 1024)
+    monkeypatch.setattr(utils, "UPLOAD_CHUNK_BYTES", 512)
+    data = "# ünïcode\n".encode("utf-8") * 2000
+    mapped = []
+    decode = utils._decode_mapped
+    monkeypatch.setattr(utils, "_decode_mapped", lambda *args: mapped.append(1) or decode(*args))
+
+    assert _read_upload(data, size=len(data), spooled=True) == data.decode("utf-8")
+    assert _read_upload(data) == data.decode("utf-8")
+    assert len(mapped) == 2
+
+
+def test_generate_rejects_binary_upload(app_client):
+    files = {"file": ("blob.py", b"\0\1\2" * 100, "application/octet-stream")}
+    response = app_client.post("/generate", data={"language": "Python", "format": "Google"}, files=files)
+
+    assert response.status_code == 415